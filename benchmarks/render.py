@@ -0,0 +1,102 @@
+"""
+Benchmark of the theme test renderer.
+
+Renders the frames of a synthetic animated emoji with the renderer as it was before the template was cached
+(reading and decoding the full size template for every frame, and scaling the composited result down), and with the
+current renderer, and reports the frames rendered per second by both.
+
+Run from the root of the repository::
+
+    python -m benchmarks.render [--frames 120] [--size 128]
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from queuebot.cogs.queue import render
+
+
+def make_emoji(frames: int, size: int) -> Image.Image:
+    """Create an animated GIF emoji of a circle moving around."""
+    images = []
+
+    for index in range(frames):
+        image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        offset = index % (size // 2)
+        ImageDraw.Draw(image).ellipse((offset, offset, offset + size // 2, offset + size // 2), fill=(250, 200, 40))
+        images.append(image)
+
+    buffer = BytesIO()
+    images[0].save(buffer, 'gif', save_all=True, append_images=images[1:], duration=20, loop=0)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def uncached_test_frame(emoji_image: Image.Image, is_gif: bool) -> Image.Image:
+    """The renderer before the template was cached and scaled down ahead of time."""
+    max_dimension = max(emoji_image.size)
+    scalar = 128 / max_dimension
+    new_sizing = int(emoji_image.width * scalar), int(emoji_image.height * scalar)
+    placement = (128 - new_sizing[0]) >> 1, (128 - new_sizing[1]) >> 1
+
+    with Image.new('RGBA', (128, 128), (0, 0, 0, 0)) as bounding:
+        normalized = emoji_image.convert('RGBA').resize(new_sizing, Image.LANCZOS)
+        bounding.paste(normalized, placement, mask=normalized)
+
+        larger = bounding.resize((96, 96), Image.LANCZOS)
+        smaller = bounding.resize((44, 44), Image.LANCZOS)
+
+    with Image.open(render.TEMPLATE_PATH) as background_im:
+        background_im.paste(smaller, (367, 50), mask=smaller)
+        background_im.paste(larger, (129, 138), mask=larger)
+
+        background_im.paste(smaller, (369, 300), mask=smaller)
+        background_im.paste(larger, (129, 388), mask=larger)
+
+        background_im = background_im.resize((375, 250), Image.LANCZOS)
+
+        if is_gif:
+            background_im = background_im.quantize(256, Image.MEDIANCUT)
+
+        return background_im
+
+
+def frames_per_second(generate_frame, emoji_image: Image.Image) -> float:
+    emoji_image.seek(0)
+    frames = 0
+
+    start = time.perf_counter()
+    while True:
+        generate_frame(emoji_image, True)
+        frames += 1
+
+        try:
+            emoji_image.seek(emoji_image.tell() + 1)
+        except EOFError:
+            break
+
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=120, help='amount of frames of the emoji')
+    parser.add_argument('--size', type=int, default=128, help='width and height of the emoji')
+    args = parser.parse_args()
+
+    emoji_image = make_emoji(args.frames, args.size)
+    render.load_template()  # loading the template once is part of startup, not of rendering
+
+    before = frames_per_second(uncached_test_frame, emoji_image)
+    after = frames_per_second(render.generate_test_frame, emoji_image)
+
+    print(f'{args.frames} frames of {args.size}x{args.size}')
+    print(f'before: {before:8.1f} fps')
+    print(f'after:  {after:8.1f} fps ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
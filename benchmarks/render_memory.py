@@ -0,0 +1,102 @@
+"""
+Benchmark of the peak memory used while rendering a long animated theme test image.
+
+Renders a synthetic GIF in which every frame is different, once by rendering all frames before saving them with
+Pillow (as previews were rendered before), and once with the streaming encoder. Every run happens in a fresh process,
+of which the peak resident set size is reported.
+
+Run from the root of the repository::
+
+    python -m benchmarks.render_memory [--frames 600] [--size 256]
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from queuebot.cogs.queue import render
+
+
+def make_emoji(frames: int, size: int) -> bytes:
+    """Create an animated GIF emoji of a circle which changes color in every frame."""
+    buffer = BytesIO()
+
+    def images():
+        for index in range(frames):
+            image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+            offset = index % (size // 2)
+            color = (index * 7 % 256, 255 - index % 256, 40)
+            ImageDraw.Draw(image).ellipse((offset, offset, offset + size // 2, offset + size // 2), fill=color)
+            yield image
+
+    generator = images()
+    next(generator).save(buffer, 'gif', save_all=True, append_images=generator, duration=20, loop=0)
+    return buffer.getvalue()
+
+
+def render_buffered(emoji_image: Image.Image) -> bytes:
+    """Render all frames, then save them with Pillow."""
+    buffer = BytesIO()
+    frames, durations = render.render_frames(emoji_image)
+    frames[0].save(buffer, 'gif', duration=durations, save_all=True, append_images=frames[1:], loop=0)
+    return buffer.getvalue()
+
+
+def render_streaming(emoji_image: Image.Image) -> bytes:
+    buffer, _ = render.render_test_image(emoji_image)
+    return buffer.getvalue()
+
+
+MODES = {'buffered': render_buffered, 'streaming': render_streaming}
+
+
+def run(mode: str, frames: int, size: int):
+    """Render in this process, and print the peak RSS in KiB and the time taken."""
+    data = make_emoji(frames, size)
+    render.load_template()
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    with Image.open(BytesIO(data)) as emoji_image:
+        output = MODES[mode](emoji_image)
+    duration = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak, peak - baseline, duration, len(output))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=600, help='amount of frames of the emoji')
+    parser.add_argument('--size', type=int, default=256, help='width and height of the emoji')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.frames, args.size)
+        return
+
+    print(f'{args.frames} frames of {args.size}x{args.size}')
+
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.render_memory', '--mode', mode,
+             '--frames', str(args.frames), '--size', str(args.size)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+
+        peak, growth, duration, size = output.split()
+        print(
+            f'{mode:>10}: peak RSS {int(peak) / 1024:7.1f} MiB ({int(growth) / 1024:+7.1f} MiB while rendering), '
+            f'{float(duration):.2f}s, {int(size) / 1024:.0f} KiB output'
+        )
+
+
+if __name__ == '__main__':
+    main()
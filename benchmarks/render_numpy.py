@@ -0,0 +1,99 @@
+"""
+Benchmark of compositing animation frames with NumPy against compositing them with Pillow.
+
+For every frame count, renders a synthetic animated emoji in which every frame is different, once with the batched
+NumPy path and once with the Pillow path, and reports the time per frame of both. The compositing stage is also
+timed on its own, as quantizing the frames of GIF emoji takes the same time on both paths.
+
+Requires NumPy. Run from the root of the repository::
+
+    python -m benchmarks.render_numpy [--frames 1 10 60 200 600] [--size 128]
+"""
+
+import argparse
+import time
+import typing
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from queuebot.cogs.queue import render
+
+
+def make_emoji(frames: int, size: int) -> bytes:
+    """Create an animated GIF emoji of a translucent circle which moves and changes color in every frame."""
+    buffer = BytesIO()
+
+    def images():
+        for index in range(frames):
+            image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+            offset = index % (size // 2)
+            color = (index * 7 % 256, 255 - index % 256, 40)
+            ImageDraw.Draw(image).ellipse((offset, offset, offset + size // 2, offset + size // 2), fill=color)
+            yield image
+
+    generator = images()
+    next(generator).save(buffer, 'gif', save_all=True, append_images=generator, duration=20, loop=0)
+    return buffer.getvalue()
+
+
+def time_per_frame(function: typing.Callable[[], int]) -> float:
+    """Run a function which returns the amount of frames it rendered, and get the time per frame in milliseconds."""
+    start = time.perf_counter()
+    frames = function()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def render_all(data: bytes) -> int:
+    with Image.open(BytesIO(data)) as emoji_image:
+        return sum(1 for _ in render.iter_frames(emoji_image))
+
+
+def composite_all(boundings: typing.List[Image.Image]) -> int:
+    for start in range(0, len(boundings), render.BATCH_SIZE):
+        render.render_batch(boundings[start:start + render.BATCH_SIZE])
+
+    return len(boundings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, nargs='+', default=[1, 10, 60, 200, 600],
+                        help='amounts of frames of the emoji')
+    parser.add_argument('--size', type=int, default=128, help='width and height of the emoji')
+    args = parser.parse_args()
+
+    numpy = render.numpy
+    if numpy is None:
+        parser.error('NumPy is not installed')
+
+    render.warm_up()
+    render.load_template_array()
+
+    print(f'{args.size}x{args.size} emoji, time per frame (Pillow / NumPy)')
+    print(f'{"frames":>7} {"render":>27} {"compositing":>27}')
+
+    for frames in args.frames:
+        data = make_emoji(frames, args.size)
+
+        with Image.open(BytesIO(data)) as emoji_image:
+            boundings = []
+            for index in range(emoji_image.n_frames):
+                emoji_image.seek(index)
+                boundings.append(render.normalize_frame(emoji_image))
+
+        results = []
+        for function, argument in ((render_all, data), (composite_all, boundings)):
+            render.numpy = None
+            pillow = time_per_frame(lambda: function(argument))
+
+            render.numpy = numpy
+            vectorized = time_per_frame(lambda: function(argument))
+
+            results.append(f'{pillow:6.2f}ms / {vectorized:6.2f}ms {pillow / vectorized:5.2f}x')
+
+        print(f'{frames:>7} {results[0]:>27} {results[1]:>27}')
+
+
+if __name__ == '__main__':
+    main()
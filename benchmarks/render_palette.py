@@ -0,0 +1,88 @@
+"""
+Benchmark of animated previews with a palette per frame against previews with one palette for all frames.
+
+Renders synthetic animated emoji in which every frame is different, once quantizing every frame to its own palette
+(as previews were rendered before), and once with a single palette planned from a sample of the frames, which lets
+the GIF writer leave the pixels that didn't change out as transparent. Reports the render time and the size of the
+encoded preview of both.
+
+Run from the root of the repository::
+
+    python -m benchmarks.render_palette [--frames 10 60 200 600] [--size 128]
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from queuebot.cogs.queue import render
+from queuebot.cogs.queue.gif import GifWriter
+
+
+def make_emoji(frames: int, size: int) -> bytes:
+    """Create an animated GIF emoji of a circle which moves and changes color in every frame."""
+    buffer = BytesIO()
+
+    def images():
+        for index in range(frames):
+            image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+            offset = index % (size // 2)
+            color = (index * 7 % 256, 255 - index % 256, 40)
+            ImageDraw.Draw(image).ellipse((offset, offset, offset + size // 2, offset + size // 2), fill=color)
+            yield image
+
+    generator = images()
+    next(generator).save(buffer, 'gif', save_all=True, append_images=generator, duration=20, loop=0)
+    return buffer.getvalue()
+
+
+def render_per_frame(data: bytes) -> bytes:
+    """Quantize every frame to its own palette."""
+    buffer = BytesIO()
+    writer = GifWriter(buffer)
+
+    with Image.open(BytesIO(data)) as emoji_image:
+        for index, duration in enumerate(render.frame_durations(emoji_image)):
+            emoji_image.seek(index)
+            writer.write(render.generate_test_frame(emoji_image, is_gif=True), duration)
+
+    writer.close()
+    return buffer.getvalue()
+
+
+def render_shared(data: bytes) -> bytes:
+    return render.render_from_bytes(data).data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, nargs='+', default=[10, 60, 200, 600],
+                        help='amounts of frames of the emoji')
+    parser.add_argument('--size', type=int, default=128, help='width and height of the emoji')
+    args = parser.parse_args()
+
+    render.warm_up()
+
+    print(f'{args.size}x{args.size} emoji, NumPy {"enabled" if render.numpy else "disabled"}')
+    print(f'{"frames":>7} {"palette per frame":>22} {"shared palette":>22} {"speedup":>8} {"size":>6}')
+
+    for frames in args.frames:
+        data = make_emoji(frames, args.size)
+        results = []
+
+        for function in (render_per_frame, render_shared):
+            start = time.perf_counter()
+            output = function(data)
+            results.append((time.perf_counter() - start, len(output)))
+
+        (old_time, old_size), (new_time, new_size) = results
+        print(
+            f'{frames:>7} {old_time:8.2f}s {old_size / 1024:8.0f} KiB {new_time:8.2f}s {new_size / 1024:8.0f} KiB '
+            f'{old_time / new_time:7.1f}x {new_size / old_size:6.0%}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+-- Lookup table from message IDs to the suggestion they belong to, so that reactions and edits don't need to scan
+-- the suggestions table.
+
+CREATE TABLE IF NOT EXISTS suggestion_messages (
+    -- id of the message
+    message_id BIGINT PRIMARY KEY,
+
+    -- idx of the suggestion this message belongs to
+    suggestion_idx INT NOT NULL REFERENCES suggestions ON DELETE CASCADE,
+
+    -- which channel the message is in
+    kind TEXT NOT NULL CHECK (kind IN ('suggestions', 'council', 'public'))
+);
+
+CREATE INDEX IF NOT EXISTS suggestion_messages_suggestion_idx ON suggestion_messages (suggestion_idx);
+
+INSERT INTO suggestion_messages (message_id, suggestion_idx, kind)
+SELECT suggestions_message_id, idx, 'suggestions' FROM suggestions WHERE suggestions_message_id IS NOT NULL
+UNION ALL
+SELECT council_message_id, idx, 'council' FROM suggestions WHERE council_message_id IS NOT NULL
+UNION ALL
+SELECT public_message_id, idx, 'public' FROM suggestions WHERE public_message_id IS NOT NULL
+ON CONFLICT (message_id) DO NOTHING;
@@ -0,0 +1,4 @@
+-- Difference hash of the first frame of a suggested emoji, as a signed 64-bit integer, used to find suggestions
+-- that look like earlier ones.
+
+ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS perceptual_hash BIGINT;
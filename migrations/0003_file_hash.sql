@@ -0,0 +1,6 @@
+-- SHA-256 of suggested emoji files, so that exact resubmissions can be rejected before anything is done with them.
+-- Existing suggestions are left without one, as only Discord's re-encoded copy of their file is left.
+
+ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS file_hash TEXT;
+
+CREATE INDEX IF NOT EXISTS suggestions_file_hash ON suggestions (file_hash);
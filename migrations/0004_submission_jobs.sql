@@ -0,0 +1,12 @@
+-- Messages in the suggestions channel which haven't been processed yet, so that submissions which were queued or in
+-- progress during a restart are picked up again.
+
+CREATE TABLE IF NOT EXISTS submission_jobs (
+    message_id BIGINT PRIMARY KEY,
+    channel_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    queued_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    attempts INT NOT NULL DEFAULT 0,
+    emoji_id BIGINT,
+    done TEXT[] NOT NULL DEFAULT '{}'
+);
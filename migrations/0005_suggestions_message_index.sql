@@ -0,0 +1,4 @@
+-- Finding the newest suggestions channel message and checking which messages already have a suggestion, for catching
+-- up with the suggestions channel.
+
+CREATE INDEX IF NOT EXISTS suggestions_suggestions_message_id ON suggestions (suggestions_message_id);
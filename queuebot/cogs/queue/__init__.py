@@ -1,24 +1,41 @@
 import asyncio
+import collections
+import contextlib
 import functools
-import hashlib
 import inspect
-import io
 import logging
 import re
+import typing
 from io import BytesIO
-from os import path
 
 import aiohttp
 import discord
 from discord import raw_models
 from discord.ext import commands
-from PIL import Image
 
+from queuebot import queries
 from queuebot.checks import is_council, is_maker_or_cooldown
 from queuebot.cog import Cog
+from queuebot.cogs.queue.backfill import HashBackfill
+from queuebot.cogs.queue.cache import SuggestionCache
+from queuebot.cogs.queue.catch_up import CatchUpReport, CatchUpScanner
 from queuebot.cogs.queue.converters import PartialSuggestionConverter, PublicQueueOrEmojiConverter
+from queuebot.cogs.queue.download import DownloadTooLarge, download
+from queuebot.cogs.queue.pipeline import Pipeline
+from queuebot.cogs.queue.preview_cache import PreviewCache
+from queuebot.cogs.queue.probe import MAX_EMOJI_SIZE, ProbeError, probe
+from queuebot.cogs.queue.reconciliation import ReconciliationReport, VoteReconciler
+from queuebot.cogs.queue.render import Preview
+from queuebot.cogs.queue.render_service import RenderService
+from queuebot.cogs.queue.scheduler import Priority, QueueFull, RenderScheduler
+from queuebot.cogs.queue.similarity import SimilarityIndex, dhash, to_column
+from queuebot.cogs.queue.slots import EmojiSlotAllocator
+from queuebot.cogs.queue.submissions import SubmissionJob, SubmissionQueue
 from queuebot.cogs.queue.suggestion import Suggestion
+from queuebot.cogs.queue.votes import VoteBuffer
+from queuebot.utils import Histogram, Timer
 from queuebot.utils.formatting import Table, name_id
+from queuebot.utils.locks import KeyedLock
 from queuebot.utils.messages import *  # noqa: ignore=F401
 
 # Matches the full string or the name of a custom emoji (since replacements for those might be posted).
@@ -34,6 +51,9 @@ clean_emoji_name = functools.partial(INVALID_EMOJI_NAME_RE.sub, "_")
 COMPACT_VS_JOINER = " \N{SQUARED VS} "
 VERBOSE_VS_JOINER = "\n\N{EM SPACE}\N{SQUARED VS}\n"
 
+# Steps of processing a submission which have to succeed for council to be able to vote on it.
+CRITICAL_SUBMISSION_STEPS = ('council queue message', 'vote reactions')
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,10 +65,88 @@ class BlobQueue(Cog):
 
         Suggestion.db = bot.db
         Suggestion.bot = bot
+        Suggestion.cache = SuggestionCache(
+            max_size=self.config.suggestion_cache_size,
+            max_missing=self.config.missing_message_cache_size,
+        )
 
-        self.voting_lock = asyncio.Lock()
+        # Votes are processed under a lock per suggestion, so that a busy suggestion doesn't hold up the rest of the
+        # queue. Reactions are first ordered by a lock per message while we figure out which suggestion they're for.
+        self.message_locks = KeyedLock()
+        self.voting_locks = KeyedLock()
         self.vs_lock = asyncio.Lock()
 
+        # Approval queue votes are only tallied, so they are written to the database in batches.
+        self.vote_buffer = VoteBuffer(bot.db, delay=self.config.vote_flush_delay)
+
+        # Corrects votes which happened while we weren't around.
+        self.reconciler = VoteReconciler(
+            bot,
+            locks=self.voting_locks,
+            buffer=self.vote_buffer,
+            concurrency=self.config.reconcile_concurrency,
+        )
+
+        #: How many message edits were skipped because of the channel they were in.
+        self.edits_skipped = 0
+
+        #: How long suggestions took to process, from taking their message off the queue to responding to the
+        #: submitter, and which steps failed after creating them.
+        self.submission_times = Histogram()
+        self.submission_failures = collections.Counter()
+
+        # Theme test images are rendered in worker processes, and cached by the emoji they were rendered from. Only a
+        # few are rendered at once, the rest wait in a queue in which submissions go before tests.
+        self.scheduler = RenderScheduler(
+            concurrency=self.config.render_concurrency,
+            max_queued=self.config.render_queue_size,
+        )
+        self.renderer = RenderService(
+            workers=self.config.render_workers,
+            memory_limit=self.config.render_memory_limit * 1024 * 1024,
+        )
+        self.previews = PreviewCache(
+            max_memory=self.config.preview_cache_memory * 1024 * 1024,
+            directory=self.config.preview_cache_directory,
+            max_disk=self.config.preview_cache_disk * 1024 * 1024,
+        )
+
+        # Emoji slots in the buffer guilds, which hold the emoji of suggestions while they're in the queues.
+        self.slots = EmojiSlotAllocator(bot)
+
+        # Perceptual hashes of all suggestions, to point out new suggestions which look like earlier ones.
+        self.similarity = SimilarityIndex(max_distance=self.config.similarity_threshold)
+
+        # Fills in the hashes of suggestions which were made before they were stored.
+        self.backfill = HashBackfill(bot, similarity=self.similarity, concurrency=self.config.backfill_concurrency)
+
+        # Messages in the suggestions channel are processed by a few workers, with users taking turns. The queue is
+        # kept in the database, so that submissions which were in progress during a restart aren't lost.
+        self.submissions = SubmissionQueue(
+            bot.db,
+            self.process_submission,
+            workers=self.config.submission_workers,
+            max_attempts=self.config.submission_attempts,
+        )
+
+        # Queues the messages which were posted in the suggestions channel while we weren't around.
+        self.catch_up = CatchUpScanner(bot, submissions=self.submissions)
+
+    async def cog_load(self):
+        await self.renderer.start()
+        await self.similarity.load(self.bot.db)
+        await self.submissions.start()
+
+    async def cog_unload(self):
+        await self.submissions.close()
+        await self.vote_buffer.close()
+        self.renderer.close()
+
+    @property
+    def suggestion_channel_ids(self) -> typing.Set[int]:
+        """The IDs of the channels which can hold messages belonging to a suggestion."""
+        return {self.config.suggestions_channel, self.config.council_queue, self.config.approval_queue}
+
     def is_vote(self, emoji: discord.PartialEmoji, channel_id: int) -> bool:
         """Determine if an emoji and channel ID are related to the suggestion flow.
 
@@ -64,8 +162,31 @@ class BlobQueue(Cog):
 
         return channel_id in [self.config.council_queue, self.config.approval_queue]
 
-    async def handle_suggestion_message(self, message: discord.Message):
-        """Handle a new message being posted in the suggestions channel."""
+    async def process_submission(self, job: SubmissionJob):
+        """Process a queued message from the suggestions channel."""
+        await self.bot.wait_until_ready()
+
+        message = job.message
+        if message is None:
+            try:
+                message = await self.bot.get_channel(job.channel_id).fetch_message(job.message_id)
+            except discord.NotFound:
+                logger.info('Queued submission %d was deleted before it was processed.', job.message_id)
+                return
+
+        with Timer() as timer:
+            suggestion = await self.handle_suggestion_message(message, job)
+
+        if suggestion is not None:
+            self.submission_times.add(timer.duration)
+
+    async def handle_suggestion_message(self, message: discord.Message,
+                                        job: SubmissionJob) -> typing.Optional[Suggestion]:
+        """
+        Handle a new message being posted in the suggestions channel, returning the suggestion if it was made.
+
+        If the job was started before, what it got done is reused rather than done again.
+        """
 
         async def respond(response: str) -> discord.Message:
             """A helper function that sends a DM to the user, falling back to
@@ -90,26 +211,71 @@ class BlobQueue(Cog):
             await respond(BAD_SUGGESTION_MSG)
             return
 
-        # Save the emoji image data to an in-memory buffer to upload later, in the logging channel.
-        buffer = io.BytesIO()
-        await attachment.save(buffer)
-        buffer.seek(0)
+        # Files which can't become an emoji are rejected before they use up an emoji slot, or even get downloaded.
+        if attachment.size > MAX_EMOJI_SIZE:
+            await message.delete()
+            logger.info(f"A suggestion by {message.author.id} was rejected because it was too large.")
+            await respond(SUGGESTION_TOO_LARGE)
+            return
 
-        animated = attachment.filename.lower().endswith('.gif')
+        # The file is hashed while it's downloaded, and the download is cut off if the file is larger than it claimed.
+        try:
+            emoji_bytes, file_hash = await download(self.bot.session, attachment.url)
+        except DownloadTooLarge as error:
+            await message.delete()
+            logger.info(f"A suggestion by {message.author.id} was rejected because {error}.")
+            await respond(SUGGESTION_TOO_LARGE)
+            return
 
         try:
-            guild = await self.get_buffer_guild(animated=animated)
-        except discord.HTTPException:
+            emoji_probe = probe(emoji_bytes)
+        except ProbeError as error:
             await message.delete()
+            logger.info(f"A suggestion by {message.author.id} was rejected because {error}.")
+            await respond(BAD_SUGGESTION_MSG)
+            return
 
-            await self.bot.log(
-                "\N{WARNING SIGN} I couldn't process a suggestion because due "
-                "to having no free emoji or guild slots."
+        # Exact resubmissions of a queued or denied emoji are turned away before anything is created for them.
+        duplicate = await Suggestion.get_duplicate(file_hash)
+
+        # an earlier attempt at processing this message might have gotten as far as creating its suggestion
+        suggestion = duplicate if duplicate is not None and duplicate.suggestions_message_id == message.id else None
+
+        async def reject_duplicate(duplicate: Suggestion):
+            await message.delete()
+            logger.info(
+                f"A suggestion by {message.author.id} was rejected because it is the same file as {duplicate!r}."
             )
+            await respond(SUGGESTION_DUPLICATE.format(
+                suggestion=f'{duplicate.idx} (:{duplicate.emoji_name}:)',
+                state='denied' if duplicate.is_denied else 'still in the queue',
+            ))
 
-            await message.author.send(BOT_BROKEN_MSG)
+        if duplicate is not None and suggestion is None:
+            await reject_duplicate(duplicate)
             return
 
+        if suggestion is not None:
+            emoji = suggestion.emoji or discord.PartialEmoji(
+                name=clean_emoji_name(suggestion.emoji_name), id=suggestion.emoji_id, animated=suggestion.is_animated
+            )
+        else:
+            emoji = self.bot.get_emoji(job.emoji_id) if job.emoji_id is not None else None
+
+        if emoji is None:
+            try:
+                reservation = await self.slots.reserve(animated=emoji_probe.animated)
+            except discord.HTTPException:
+                await message.delete()
+
+                await self.bot.log(
+                    "\N{WARNING SIGN} I couldn't process a suggestion because due "
+                    "to having no free emoji or guild slots."
+                )
+
+                await message.author.send(BOT_BROKEN_MSG)
+                return
+
         # use the messages content or the filename, removing the .png or .jpg extension
         match = NAME_RE.search(message.content)
         if match is not None:
@@ -131,101 +297,156 @@ class BlobQueue(Cog):
             message.content, name, note,
         )
 
-        buffer_content = buffer.read()
+        async def render() -> typing.Optional[Preview]:
+            try:
+                return await self.get_preview(emoji_bytes, key=file_hash)
+            except OSError as error:
+                logger.warning('Failed to render the theme test image of the emoji: %s', error)
+                return None
 
-        if len(buffer_content) > 261888:
-            await message.delete()
-            logger.info(f"A suggestion by {message.author.id} was rejected because it was too large.")
-            await respond(SUGGESTION_TOO_LARGE)
-            return
+        async def hash_emoji() -> typing.Tuple[typing.Optional[int], typing.List[typing.Tuple[int, Suggestion]]]:
+            try:
+                perceptual_hash = await asyncio.get_running_loop().run_in_executor(None, dhash, emoji_bytes)
+            except OSError as error:
+                logger.warning('Failed to hash the emoji: %s', error)
+                return None, []
 
-        emoji = await guild.create_custom_emoji(
-            name=clean_emoji_name(name), image=buffer_content, reason='new blob suggestion'
-        )
+            return perceptual_hash, await self.find_similar(perceptual_hash)
 
-        logger.info(f'Created new emoji by name {name} in guild {guild.id}.')
+        async def upload() -> discord.Emoji:
+            if emoji is not None:
+                return emoji
 
-        buffer.seek(0)  # seek back again for test image rendering
+            with reservation:
+                created = await reservation.guild.create_custom_emoji(
+                    name=clean_emoji_name(name), image=emoji_bytes, reason='new blob suggestion'
+                )
+                self.slots.created(created)
 
-        try:
-            emoji_im = Image.open(buffer)
-            width, height = emoji_im.size
-        except OSError as error:
-            queue_file = None  # fallback
-            width, height = None, None
-            logger.warning('Failed to open the emoji as an image: %s', error)
+            logger.info(f'Created new emoji by name {name} in guild {created.guild_id}.')
+
+            await job.set_emoji(created.id)
+            return created
+
+        # The theme test image and the hash don't need the emoji, so they're made while it's being uploaded.
+        emoji, preview, (perceptual_hash, similar) = await asyncio.gather(upload(), render(), hash_emoji())
+
+        if suggestion is not None:
+            logger.info('Resuming the processing of %r.', suggestion)
         else:
-            queue_file = await self.bot.loop.run_in_executor(None, self.test_backend, emoji_im)
+            try:
+                suggestion = await Suggestion.create(
+                    user_id=message.author.id,
+                    emoji_id=emoji.id,
+                    emoji_name=name,
+                    submission_time=message.created_at,
+                    suggestions_message_id=message.id,
+                    emoji_animated=emoji_probe.animated,
+                    note=note,
+                    perceptual_hash=to_column(perceptual_hash) if perceptual_hash is not None else None,
+                    file_hash=file_hash,
+                )
+            except Suggestion.Duplicate as error:
+                # the same file was suggested while this one was being processed
+                await emoji.delete(reason='duplicate blob suggestion')
+                self.slots.deleted(emoji)
+                await reject_duplicate(error.suggestion)
+                return
 
-        animated = queue_file.filename.endswith(".gif")
+            if perceptual_hash is not None:
+                self.similarity.add(suggestion.idx, perceptual_hash)
 
-        suggestion_id = await self.db.fetchval(
-            """
-            INSERT INTO suggestions (
-                user_id,
-                emoji_id,
-                emoji_name,
-                submission_time,
-                suggestions_message_id,
-                emoji_animated,
-                note
-            )
-            VALUES (
-                $1, $2, $3, $4 AT TIME ZONE 'UTC', $5, $6, $7
-            )
-            RETURNING idx
-            """,
-            message.author.id,
-            emoji.id,
-            name,
-            message.created_at,
-            message.id,
-            animated,
-            note,
-        )
+        suggestion_id = suggestion.idx
 
         embed = discord.Embed(title=f'Suggestion {suggestion_id}', description=f'{note}\nBy {message.author.mention}')
 
-        queue = self.bot.get_channel(self.config.council_queue)
-        msg = await queue.send(emoji, file=queue_file, embed=embed)
+        if similar:
+            embed.add_field(name='Looks like', value='\n'.join(
+                f'#{earlier.idx} :{earlier.emoji_name}: ({earlier.outcome}, '
+                f'{distance} bits apart)'
+                for distance, earlier in similar
+            ))
+            embed.colour = discord.Colour.orange()
+
+        async def send_to_queue() -> discord.Message:
+            queue = self.bot.get_channel(self.config.council_queue)
+
+            if suggestion.council_message_id is not None:
+                return await queue.fetch_message(suggestion.council_message_id)
+
+            queue_file = discord.File(filename=preview.filename, fp=BytesIO(preview.data)) if preview else None
+            queue_message = await queue.send(emoji, file=queue_file, embed=embed)
+
+            # stored right away, so that the message isn't sent again if the job is resumed
+            await suggestion.set_council_message(queue_message.id)
+            return queue_message
+
+        async def add_vote_reactions(queue_message: discord.Message):
+            # one after the other, so that they're always in the same order
+            await queue_message.add_reaction(self.config.approve_emoji)
+            await queue_message.add_reaction(self.config.deny_emoji)
+
+        async def send_to_log():
+            # Log all suggestions to a special channel to keep original files and have history for moderation purposes.
+            msg = f"""
+            **Submission {suggestion_id}** - `{name_id(message.author)}` {message.author.mention}
+
+            **Name:** {name}
+            **Note:** {note}
+            **File:** `{attachment.filename}`, height: {emoji_probe.height}, width: {emoji_probe.width}
+            **Frames:** {emoji_probe.frames}
+            **Hash:** `{file_hash}`
+            """
 
-        await msg.add_reaction(self.config.approve_emoji)
-        await msg.add_reaction(self.config.deny_emoji)
+            channel = self.bot.get_channel(self.config.suggestions_log)
+            file = discord.File(BytesIO(emoji_bytes), filename=attachment.filename)
+            await channel.send(inspect.cleandoc(msg), file=file)
 
-        await self.db.execute('UPDATE suggestions SET council_message_id = $1 WHERE idx = $2', msg.id, suggestion_id)
+        # Everything else only needs the suggestion to exist, except for what's done with the council queue message.
+        # Steps which would show up twice if they were repeated are skipped when they were done by an earlier attempt.
+        pipeline = Pipeline()
+        pipeline.add('council queue message', send_to_queue)
+        pipeline.add('vote reactions', add_vote_reactions, after=['council queue message'])
+        pipeline.add('suggestions log', job.once('suggestions log', send_to_log))
+        pipeline.add('received reaction', message.add_reaction, '\N{EYES}')
+        pipeline.add('response', job.once('response', respond), SUGGESTION_RECEIVED.format(suggestion=emoji))
 
-        # Log all suggestions to a special channel to keep original files and have history for moderation purposes.
+        failures = await pipeline.wait()
 
-        # Calculate the SHA256 hash of the emoji image.
-        buffer.seek(0)
-        file_hash = hashlib.sha256(buffer.read()).hexdigest()
-        buffer.seek(0)
+        if failures:
+            self.submission_failures.update(failures.keys())
 
-        msg = f"""
-        **Submission {suggestion_id}** - `{name_id(message.author)}` {message.author.mention}
+            for step, error in failures.items():
+                logger.warning('Failed to process the %s of suggestion %d.', step, suggestion_id, exc_info=error)
 
-        **Name:** {name}
-        **Note:** {note}
-        **File:** `{attachment.filename}`, height: {height}, width: {width}
-        **Hash:** `{file_hash}`
-        """
+            await self.bot.log(
+                f"\N{WARNING SIGN} Suggestion {suggestion_id} was created, but some steps failed: " + ', '.join(
+                    f'{step} (`{type(error).__name__}: {error}`)' for step, error in failures.items()
+                )
+            )
 
-        channel = self.bot.get_channel(self.config.suggestions_log)
-        await channel.send(inspect.cleandoc(msg), file=discord.File(buffer, filename=attachment.filename))
+            # Council can't vote on the suggestion without these, so the submission has to be tried again. The other
+            # steps are only nice to have.
+            for step in CRITICAL_SUBMISSION_STEPS:
+                if step in failures:
+                    raise failures[step]
 
-        await message.add_reaction('\N{EYES}')
-        await respond(SUGGESTION_RECEIVED.format(suggestion=emoji))
+        return suggestion
 
     @Cog.listener()
     async def on_message(self, message: discord.Message):
         if message.channel.id != self.config.suggestions_channel or message.author == self.bot.user:
             return
 
-        await self.handle_suggestion_message(message)
+        await self.submissions.put(message)
 
     @Cog.listener()
     async def on_raw_message_edit(self, payload: raw_models.RawMessageUpdateEvent):
         """Detect edits to a suggestion's message and updates the note accordingly."""
+        if payload.channel_id not in self.suggestion_channel_ids:
+            self.edits_skipped += 1
+            return
+
         try:
             content = payload.data['content']
         except KeyError:
@@ -252,8 +473,27 @@ class BlobQueue(Cog):
 
         logger.debug('Received raw reaction payload: %s', payload)
 
-        async with self.voting_lock:
+        if payload.channel_id == self.config.approval_queue:
             suggestion = await Suggestion.get_from_message(payload.message_id)
+            approval = payload.emoji.id == self.config.approve_emoji_id
+
+            # buffered votes are only held off while their suggestion's votes are being reconciled
+            async with self.voting_locks(suggestion.idx):
+                if not self.reconciler.counted(suggestion.idx, payload.user_id, approval, vote_type):
+                    self.vote_buffer.add(suggestion.idx, approval, vote_type.delta)
+            return
+
+        async with contextlib.AsyncExitStack() as stack:
+            async with self.message_locks(payload.message_id):
+                suggestion = await Suggestion.get_from_message(payload.message_id)
+
+                # take the suggestion's lock before letting go of the message's one to keep votes in order
+                await stack.enter_async_context(self.voting_locks(suggestion.idx))
+
+            approval = payload.emoji.id == self.config.approve_emoji_id
+            if self.reconciler.counted(suggestion.idx, payload.user_id, approval, vote_type):
+                return
+
             await suggestion.process_vote(
                 payload.emoji,
                 vote_type,
@@ -261,6 +501,59 @@ class BlobQueue(Cog):
                 payload.user_id,
             )
 
+    @Cog.listener()
+    async def on_ready(self):
+        if self.config.catch_up_on_ready:
+            await self.catch_up_submissions()
+
+        if self.config.reconcile_on_ready:
+            await self.reconcile_votes()
+
+    async def catch_up_submissions(self) -> CatchUpReport:
+        """Queue the messages in the suggestions channel which were posted while we weren't connected."""
+        report = await self.catch_up.run()
+
+        if report.queued:
+            await self.bot.log(f'\N{INBOX TRAY} Suggestions channel catch-up {report}.')
+
+        return report
+
+    @commands.command(name='catch_up')
+    @commands.is_owner()
+    async def catch_up_command(self, ctx):
+        """Queues the messages in the suggestions channel which were missed."""
+        async with ctx.typing():
+            report = await self.catch_up_submissions()
+
+        await ctx.send(f'{ctx.bot.tick()} Suggestions channel catch-up {report}.')
+
+    async def reconcile_votes(self) -> ReconciliationReport:
+        """Correct the votes of all queued suggestions from the reactions on their messages."""
+        report = await self.reconciler.run()
+
+        if report.changed:
+            await self.bot.log(f'\N{BALLOT BOX WITH BALLOT} Vote reconciliation {report}.')
+
+        return report
+
+    @commands.command()
+    @commands.is_owner()
+    async def reconcile(self, ctx):
+        """Corrects vote tallies from the reactions on queue messages."""
+        async with ctx.typing():
+            report = await self.reconcile_votes()
+
+        await ctx.send(f'{ctx.bot.tick()} Vote reconciliation {report}.')
+
+    @commands.command()
+    @commands.is_owner()
+    async def backfill_hashes(self, ctx):
+        """Fills in the perceptual hashes of older suggestions."""
+        async with ctx.typing():
+            report = await self.backfill.run()
+
+        await ctx.send(f'{ctx.bot.tick()} Hash backfill {report}.')
+
     @Cog.listener()
     async def on_raw_reaction_add(self, payload: raw_models.RawReactionActionEvent):
         await self.process_raw_reaction(payload, Suggestion.VoteType.CAST)
@@ -269,60 +562,93 @@ class BlobQueue(Cog):
     async def on_raw_reaction_remove(self, payload: raw_models.RawReactionActionEvent):
         await self.process_raw_reaction(payload, Suggestion.VoteType.REVOKE)
 
-    def has_emoji_slots(self, guild: discord.Guild, animated) -> bool:
-        """Retuern whether a guild has emoji slots we can use."""
+    async def find_similar(self, perceptual_hash: int, *, limit: int = 5) -> typing.List[typing.Tuple[int, Suggestion]]:
+        """
+        Find the approved, denied or revoked suggestions which look like an emoji with the given perceptual hash, as
+        (distance in bits, suggestion) pairs, closest first.
+        """
+        matches = self.similarity.search(perceptual_hash)
+        suggestions = await Suggestion.get_many([suggestion_id for _, suggestion_id in matches])
 
-        return guild.owner_id == self.bot.user.id and sum(x.animated == animated for x in guild.emojis) < 50
+        similar = []
 
-    async def get_buffer_guild(self, animated) -> discord.Guild:
-        """
-        Get a guild the bot can upload a temporary emoji to.
+        for distance, suggestion_id in matches:
+            suggestion = suggestions.get(suggestion_id)
 
-        This either returns or creates a new guild the bot owns,
-        and has fewer than 50 of the designated type of emoji slots free.
+            if suggestion is not None and suggestion.outcome is not None:
+                similar.append((distance, suggestion))
 
-        Parameters
-        ----------
-        animated : bool
-            Whether the buffer guild needs a static or animated emoji slot.
+            if len(similar) >= limit:
+                break
 
-        Raises
-        ------
-        HTTPException
-            The bot is in more than 10 guilds total while creating a new guild.
-        """
+        return similar
 
-        guild = discord.utils.find(functools.partial(self.has_emoji_slots, animated=animated), self.bot.guilds)
+    @Cog.listener()
+    async def on_guild_emojis_update(self, guild: discord.Guild, _before, after: typing.Sequence[discord.Emoji]):
+        self.slots.update(guild, after)
 
-        if guild is not None:
-            return guild
+    @Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self.slots.update(guild)
 
-        logger.info('Creating new buffer emoji guild...')
-        return await self.bot.create_guild('BlobQueue Emoji Buffer')
+    @Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.slots.remove(guild)
 
     @commands.command()
     @commands.is_owner()
     async def buffer_info(self, ctx):
         """Shows information about buffer guilds."""
 
-        try:
-            static = await self.get_buffer_guild(animated=False)
-        except discord.HTTPException:
-            static = None
-
-        try:
-            animated = await self.get_buffer_guild(animated=True)
-        except discord.HTTPException:
-            animated = None
-
-        def describe(guild, animated_):
+        def describe(animated):
+            guild = self.slots.find(animated)
             if guild is None:
                 return 'No suitable guild found'
 
-            count = sum(x.animated == animated_ for x in guild.emojis)
-            return f'{count}/50 emoji'
+            return f'{self.slots.used(guild.id, animated)}/{guild.emoji_limit} emoji'
+
+        await ctx.send(f'Static buffer: {describe(False)}, animated buffer: {describe(True)}')
+
+    def collect_stats(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        """Collect the runtime statistics of the queue, grouped by component."""
+        return {
+            'Vote locks': self.voting_locks.stats,
+            'Suggestion cache': Suggestion.cache.stats,
+            'Message edits': {'skipped by channel': str(self.edits_skipped)},
+            'Submission queue': self.submissions.stats,
+            'Buffer guilds': self.slots.stats,
+            'Submissions': {
+                'processed': str(self.submission_times.count),
+                'time': self.submission_times.summary,
+                'histogram': str(self.submission_times),
+                'failed steps': ', '.join(
+                    f'{step}: {count}' for step, count in self.submission_failures.most_common()
+                ) or 'none',
+            },
+            'Approval queue votes': self.vote_buffer.stats,
+            'Render queue': self.scheduler.stats,
+            'Rendering': self.renderer.stats,
+            'Preview cache': self.previews.stats,
+            'Similarity index': self.similarity.stats,
+            'Statements': queries.stats(),
+        }
 
-        await ctx.send(f'Static buffer: {describe(static, False)}, animated buffer: {describe(animated, True)}')
+    @commands.command()
+    @commands.is_owner()
+    async def queue_stats(self, ctx):
+        """Shows runtime statistics of the queue."""
+
+        table = Table('Component', 'Metric', 'Value')
+        for component, stats in self.collect_stats().items():
+            for metric, value in stats.items():
+                table.add_row(component, metric, value)
+
+        paginator = commands.Paginator()
+        for line in (await table.render(ctx.bot.loop)).split('\n'):
+            paginator.add_line(line)
+
+        for page in paginator.pages:
+            await ctx.send(page)
 
     @commands.command(aliases=['accept'])
     @is_council()
@@ -393,13 +719,18 @@ class BlobQueue(Cog):
                     emoji_url = str(this_emoji[2])
                     animated = emoji_url.endswith('.gif')
 
-                    buffer_guild = await self.get_buffer_guild(animated=animated)
                     emoji_name = clean_emoji_name(f"{this_emoji[3][0:30]}_{index+1}")
 
                     async with self.bot.session.get(emoji_url) as resp:
-                        temp_emotes.append(await buffer_guild.create_custom_emoji(
-                            name=emoji_name, image=await resp.read(), reason='temp blob for vs'
-                        ))
+                        image = await resp.read()
+
+                    with await self.slots.reserve(animated=animated) as reservation:
+                        temp_emoji = await reservation.guild.create_custom_emoji(
+                            name=emoji_name, image=image, reason='temp blob for vs'
+                        )
+                        self.slots.created(temp_emoji)
+
+                    temp_emotes.append(temp_emoji)
 
             if self.config.verbose_vs:
                 emote_sequence = VERBOSE_VS_JOINER.join(
@@ -418,6 +749,7 @@ class BlobQueue(Cog):
             if not decision:
                 for temp_emoji in temp_emotes:
                     await temp_emoji.delete()
+                    self.slots.deleted(temp_emoji)
                 return
 
             queue = self.bot.get_channel(self.config.approval_queue)
@@ -426,13 +758,19 @@ class BlobQueue(Cog):
             for index, this_emoji in enumerate(temp_emotes, 1):
                 await vs_message.add_reaction(f"{index}\N{COMBINING ENCLOSING KEYCAP}")
                 await this_emoji.delete()
+                self.slots.deleted(this_emoji)
 
             merge_list = []
 
+            # make sure the votes we report are up to date
+            await self.vote_buffer.flush()
+
             for this_emoji in emoji:
                 suggestion = this_emoji[0]
                 if not suggestion:
                     continue
+
+                suggestion = await Suggestion.get_from_id(suggestion.idx)
                 merge_list.append(f"#{suggestion.idx} had {suggestion.upvotes} upvotes, "
                                   f"{suggestion.downvotes} downvotes.")
                 await suggestion.remove_from_public_queue()
@@ -457,13 +795,7 @@ class BlobQueue(Cog):
             await ctx.message.delete()
 
         # fetch submissions made by this user that hasn't reached a verdict
-        submissions = await ctx.bot.db.fetch(
-            """
-            SELECT * FROM suggestions
-            WHERE user_id = $1 AND council_approved IS NULL
-            """,
-            ctx.author.id
-        )
+        submissions = await queries.PENDING_SUGGESTIONS_BY_USER.fetch(ctx.bot.db, ctx.author.id)
 
         async def cannot_dm():
             await ctx.send(f"{ctx.author.mention}: I can't DM you, please adjust your settings.", delete_after=5.0)
@@ -514,7 +846,7 @@ class BlobQueue(Cog):
             chosen = submissions[index - 1]
             break
 
-        suggestion = Suggestion(chosen)
+        suggestion = await Suggestion.get_from_id(chosen['idx'])
         await suggestion.deny(
             who=ctx.author.id,
             reason='Manually revoked',
@@ -534,64 +866,25 @@ class BlobQueue(Cog):
         embed.set_image(url=suggestion.emoji_url)
         await ctx.send(embed=embed)
 
-    @staticmethod
-    def generate_test_frame(emoji_image: Image.Image, is_gif: bool) -> Image.Image:
-        max_dimension = max(emoji_image.size)
-        scalar = 128 / max_dimension
-        new_sizing = int(emoji_image.width * scalar), int(emoji_image.height * scalar)
-        placement = (128 - new_sizing[0]) >> 1, (128 - new_sizing[1]) >> 1
-
-        with Image.new("RGBA", (128, 128), (0, 0, 0, 0)) as bounding:
-            normalized = emoji_image.convert("RGBA").resize(new_sizing, Image.ANTIALIAS)
-            bounding.paste(normalized, placement, mask=normalized)
-
-            larger = bounding.resize((96, 96), Image.ANTIALIAS)
-            smaller = bounding.resize((44, 44), Image.ANTIALIAS)
-
-        with Image.open(path.join(path.dirname(__file__), "test_base.png")) as background_im:
-
-            background_im.paste(smaller, (367, 50), mask=smaller)
-            background_im.paste(larger, (129, 138), mask=larger)
-
-            background_im.paste(smaller, (369, 300), mask=smaller)
-            background_im.paste(larger, (129, 388), mask=larger)
-
-            background_im = background_im.resize((375, 250), Image.ANTIALIAS)
-
-            if is_gif:
-                background_im = background_im.quantize(256, Image.MEDIANCUT)
-
-            return background_im
-
-    def test_backend(self, emoji_image: Image.Image):
-        """Produce theme testing image for a given emoji."""
-        logger.info("Producing a test image...")
-        buffer = BytesIO()
-
-        frame_listing = []
-        duration_listing = []
-
-        for _ in range(600):  # never render more than 600 frames
-            frame_listing.append(self.generate_test_frame(emoji_image, emoji_image.format == "GIF"))
-            duration_listing.append(emoji_image.info.get("duration"))
+    async def get_preview(self, emoji_bytes: bytes, *, key: str = None, source: str = None,
+                          priority: Priority = Priority.SUBMISSION,
+                          on_queued: typing.Callable[[int], typing.Awaitable] = None) -> Preview:
+        """
+        Produce theme testing image for a given emoji, or take it from the cache.
 
-            try:
-                emoji_image.seek(emoji_image.tell() + 1)
-            except EOFError:
-                break
+        The cache key is the SHA-256 of the emoji, which can be passed as ``key`` if it's known already.
+        Renders wait for their turn in the render queue, see :class:`RenderScheduler`. An emoji which is already being
+        rendered isn't rendered again, the render is waited for instead.
+        """
+        if key is None:
+            key = self.previews.key(emoji_bytes)
 
-        initial_frame = frame_listing.pop(0)
+        async def render() -> Preview:
+            async with self.scheduler(priority, on_queued=on_queued):
+                logger.info("Producing a test image...")
+                return await self.renderer.render(emoji_bytes)
 
-        if frame_listing:
-            initial_frame.save(
-                buffer, "gif", duration=duration_listing, save_all=True, append_images=frame_listing, loop=0
-            )
-            buffer.seek(0)
-            return discord.File(filename="test.gif", fp=buffer)
-        else:
-            initial_frame.save(buffer, "png")
-            buffer.seek(0)
-            return discord.File(filename="test.png", fp=buffer)
+        return await self.previews.get_or_render(key, render, source=source)
 
     @commands.command()
     @is_maker_or_cooldown(1, 60, commands.BucketType.user)
@@ -617,46 +910,56 @@ class BlobQueue(Cog):
         embed = discord.Embed(description=f"By {ctx.author.mention}")
 
         async with ctx.channel.typing():
-
-            # Download the image.
-            try:
-                async with ctx.bot.session.get(suggestion[1]) as resp:
-                    emoji_bytes = await resp.read()
-            except aiohttp.ClientError as err:
-                await ctx.send(f"{red_tick} Failed to download the emoji: `{err}`")
-                return
-
-            emoji_bio = BytesIO(emoji_bytes)
-
-            try:
-                emoji_im = Image.open(emoji_bio)
-            except OSError:
-                await ctx.send(f"{red_tick} Unable to identify the file type of the emoji.")
-                return
-
-            if emoji_im.height != emoji_im.width:
+            source = str(suggestion[1])
+
+            # Emoji which were tested before don't need to be downloaded again.
+            preview = await self.previews.get_by_source(source)
+
+            if preview is None:
+                # Download the image.
+                try:
+                    async with ctx.bot.session.get(source) as resp:
+                        emoji_bytes = await resp.read()
+                except aiohttp.ClientError as err:
+                    await ctx.send(f"{red_tick} Failed to download the emoji: `{err}`")
+                    return
+
+                async def on_queued(position: int):
+                    await ctx.send(f"\N{HOURGLASS} Your test is number {position} in the queue, hang on.")
+
+                try:
+                    preview = await self.get_preview(
+                        emoji_bytes, source=source, priority=Priority.TEST, on_queued=on_queued
+                    )
+                except QueueFull:
+                    await ctx.send(f"{red_tick} Too many emoji are being tested right now, please try again later.")
+                    return
+                except OSError:
+                    await ctx.send(f"{red_tick} Unable to identify the file type of the emoji.")
+                    return
+
+            if preview.height != preview.width:
                 embed.description = (
                     f"The resolution of this blob is not a square (where the height is equal to the width). There "
                     f"are spots on Discord where non-square emoji are displayed incorrectly.\n\n{embed.description}"
                 )
                 embed.colour = discord.Colour.orange()
 
-            if emoji_im.height < 128 or emoji_im.width < 128:
+            if preview.height < 128 or preview.width < 128:
                 embed.description = (
                     f"The resolution of this blob is smaller than 128x128. "
                     f"Emoji smaller than 128x128 may look low-resolution compared to others.\n\n{embed.description}"
                 )
                 embed.colour = discord.Colour.red()
 
-            if emoji_im.format == "JPEG":
+            if preview.format == "JPEG":
                 embed.description = (
                     f"The tested blob is a JPEG, the JPEG format is not ideal for emoji "
                     f"due to it being a lossy image format. Please use PNGs when possible.\n\n{embed.description}"
                 )
                 embed.colour = discord.Colour.red()
 
-            file = await self.bot.loop.run_in_executor(None, self.test_backend, emoji_im)
-            await ctx.send(file=file, embed=embed)
+            await ctx.send(file=discord.File(filename=preview.filename, fp=BytesIO(preview.data)), embed=embed)
 
     @commands.command(aliases=['sg'])
     @is_council()
@@ -667,11 +970,7 @@ class BlobQueue(Cog):
             await ctx.send(f'{ctx.bot.tick(False)} {limit} suggestions is too much. (200 max)')
             return
 
-        suggestions = [Suggestion(record) for record in await self.db.fetch("""
-            SELECT * FROM suggestions
-            ORDER BY idx DESC
-            LIMIT $1
-        """, limit)]
+        suggestions = [Suggestion(record) for record in await queries.RECENT_SUGGESTIONS.fetch(self.db, limit)]
 
         table = Table('#', 'Name', 'Submitted By', 'Points', 'Status')
         for suggestion in suggestions:
@@ -706,12 +1005,7 @@ class BlobQueue(Cog):
     async def vote_info(self, ctx, which: int):
         """Views voting info by suggestion or user ID"""
 
-        vote_records = await self.db.fetch("""
-            SELECT * FROM council_votes
-            WHERE $1::BIGINT IN (suggestion_index::BIGINT, user_id) AND TRUE IN (has_approved, has_denied)
-            ORDER BY vote_time DESC
-            LIMIT 20
-        """, which)
+        vote_records = await queries.COUNCIL_VOTES.fetch(self.db, which)
 
         table = Table('#', 'User', 'Vote', 'When')
         for record in vote_records:
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import typing
+
+import aiohttp
+
+from queuebot import queries
+from queuebot.cogs.queue.download import DownloadTooLarge, download
+from queuebot.cogs.queue.similarity import SimilarityIndex, dhash, to_column
+from queuebot.cogs.queue.suggestion import Suggestion
+from queuebot.utils import Timer
+
+log = logging.getLogger(__name__)
+
+#: Amount of suggestions whose hashes are written in a single statement.
+BATCH_SIZE = 100
+
+
+class BackfillReport:
+    """The perceptual hashes filled in by a backfill."""
+
+    def __init__(self):
+        self.checked: int = 0
+        self.hashed: int = 0
+        self.failed: int = 0
+        self.timer = Timer()
+
+    def __str__(self):
+        return (
+            f'checked {self.checked} suggestions in {self.timer}, hashed {self.hashed}, '
+            f'failed to download or read {self.failed}'
+        )
+
+
+class HashBackfill:
+    """
+    Fills in the perceptual hashes of suggestions which were made before those were stored.
+
+    The hashes are computed from the emoji of the suggestion as served by Discord's CDN, which keeps serving emoji
+    after they have been deleted. Suggestions whose emoji can't be downloaded or read are skipped, and tried again by
+    the next backfill.
+
+    File hashes aren't filled in: Discord re-encodes emoji, so the CDN's copy is a different file than the one which
+    was suggested, and a resubmission of that file would never match it.
+    """
+
+    def __init__(self, bot, *, similarity: SimilarityIndex, concurrency: int = 5):
+        self.bot = bot
+        self.similarity = similarity
+
+        # limits how many emoji are downloaded at once
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> BackfillReport:
+        """Hash all suggestions which are missing a perceptual hash."""
+        report = BackfillReport()
+
+        async with self._lock:
+            with report.timer:
+                last_idx = 0
+
+                while True:
+                    records = await queries.MISSING_HASHES.fetch(self.bot.db, last_idx, BATCH_SIZE)
+                    if not records:
+                        break
+
+                    last_idx = records[-1]['idx']
+                    await self.backfill([Suggestion(record) for record in records], report)
+
+        log.info('Hash backfill: %s.', report)
+        return report
+
+    async def backfill(self, suggestions: typing.List[Suggestion], report: BackfillReport):
+        """Hash a batch of suggestions, and write their hashes."""
+        report.checked += len(suggestions)
+
+        hashes = await asyncio.gather(*[self.hash(suggestion, report) for suggestion in suggestions])
+        hashed = [(suggestion, result) for suggestion, result in zip(suggestions, hashes) if result is not None]
+
+        if not hashed:
+            return
+
+        await queries.SET_HASHES.execute(
+            self.bot.db,
+            [suggestion.idx for suggestion, _ in hashed],
+            [to_column(perceptual_hash) for _, perceptual_hash in hashed],
+        )
+
+        report.hashed += len(hashed)
+
+        for suggestion, perceptual_hash in hashed:
+            self.similarity.add(suggestion.idx, perceptual_hash)
+
+            # cached copies don't have their hashes yet
+            Suggestion.cache.discard(suggestion.idx)
+
+    async def hash(self, suggestion: Suggestion, report: BackfillReport) -> typing.Optional[int]:
+        """Download the emoji of a suggestion, and compute its perceptual hash."""
+        try:
+            async with self._semaphore:
+                data, _ = await download(self.bot.session, suggestion.emoji_url)
+
+            perceptual_hash = await asyncio.get_running_loop().run_in_executor(None, dhash, data)
+        except (aiohttp.ClientError, DownloadTooLarge, OSError) as error:
+            log.warning('Failed to hash the emoji of %s: %s', suggestion, error)
+            report.failed += 1
+            return None
+
+        return perceptual_hash
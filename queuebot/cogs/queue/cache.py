@@ -0,0 +1,136 @@
+import collections
+import typing
+
+#: Columns of a suggestion that hold the ID of a message belonging to the suggestion.
+MESSAGE_COLUMNS = ('suggestions_message_id', 'council_message_id', 'public_message_id')
+
+
+class SuggestionCache:
+    """
+    A bounded LRU cache of suggestions, keyed by their idx and by the IDs of their messages.
+
+    Suggestions are copied when they are put into or taken out of the cache, so that changes to a suggestion don't
+    leak into the cache. The cache is kept up to date by the :class:`Suggestion` methods which modify a suggestion.
+
+    The cache also remembers a bounded amount of message IDs which are known to not belong to any suggestion,
+    until a suggestion using one of them is cached.
+    """
+
+    def __init__(self, max_size: int = 512, max_missing: int = 4096):
+        self.max_size = max_size
+        self.max_missing = max_missing
+
+        self._suggestions: typing.OrderedDict[int, typing.Any] = collections.OrderedDict()
+
+        # message id -> suggestion idx
+        self._messages: typing.Dict[int, int] = {}
+
+        # message ids that don't belong to a suggestion, in LRU order
+        self._missing: typing.OrderedDict[int, None] = collections.OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.missing_hits: int = 0
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    def __contains__(self, idx):
+        return idx in self._suggestions
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this cache."""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+
+        return {
+            'size': f'{len(self)}/{self.max_size}',
+            'hits': f'{self.hits} ({rate:.1%})',
+            'misses': str(self.misses),
+            'evictions': str(self.evictions),
+            'known missing': f'{len(self._missing)}/{self.max_missing}',
+            'known missing hits': str(self.missing_hits),
+        }
+
+    def get(self, idx: int):
+        """Get a suggestion by its idx, if it is cached."""
+        suggestion = self._suggestions.get(idx)
+
+        if suggestion is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._suggestions.move_to_end(idx)
+        return suggestion.copy()
+
+    def get_by_message(self, message_id: int):
+        """Get a suggestion by the ID of one of its messages, if it is cached."""
+        idx = self._messages.get(message_id)
+
+        if idx is None:
+            self.misses += 1
+            return None
+
+        return self.get(idx)
+
+    def is_missing(self, message_id: int) -> bool:
+        """Return whether a message is known to not belong to any suggestion."""
+        if message_id not in self._missing:
+            return False
+
+        self.missing_hits += 1
+        self._missing.move_to_end(message_id)
+        return True
+
+    def mark_missing(self, message_id: int):
+        """Remember that a message doesn't belong to any suggestion."""
+        if message_id in self._messages:
+            return  # the suggestion was created while it was being looked up
+
+        self._missing[message_id] = None
+        self._missing.move_to_end(message_id)
+
+        while len(self._missing) > self.max_missing:
+            self._missing.popitem(last=False)
+
+    def put(self, suggestion):
+        """Cache the most recent state of a suggestion, replacing the previous one."""
+        idx = suggestion.idx
+
+        self._forget_messages(idx)
+        self._suggestions[idx] = suggestion.copy()
+        self._suggestions.move_to_end(idx)
+
+        for column in MESSAGE_COLUMNS:
+            message_id = getattr(suggestion, column)
+            if message_id is not None:
+                self._messages[message_id] = idx
+                self._missing.pop(message_id, None)
+
+        while len(self._suggestions) > self.max_size:
+            self.discard(next(iter(self._suggestions)))
+            self.evictions += 1
+
+    def discard(self, idx: int):
+        """Remove a suggestion from the cache, if it is cached."""
+        self._forget_messages(idx)
+        self._suggestions.pop(idx, None)
+
+    def clear(self):
+        """Remove everything from the cache."""
+        self._suggestions.clear()
+        self._messages.clear()
+        self._missing.clear()
+
+    def _forget_messages(self, idx: int):
+        suggestion = self._suggestions.get(idx)
+        if suggestion is None:
+            return
+
+        for column in MESSAGE_COLUMNS:
+            message_id = getattr(suggestion, column)
+            if message_id is not None and self._messages.get(message_id) == idx:
+                del self._messages[message_id]
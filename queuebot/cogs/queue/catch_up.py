@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import typing
+
+import discord
+
+from queuebot import queries
+from queuebot.cogs.queue.submissions import SubmissionQueue
+from queuebot.utils import Timer
+
+log = logging.getLogger(__name__)
+
+#: Amount of messages that are checked against the database at once. Discord returns history in pages of this size.
+BATCH_SIZE = 100
+
+
+class CatchUpReport:
+    """The messages found by a catch-up."""
+
+    def __init__(self):
+        self.messages: int = 0
+        self.known: int = 0
+        self.queued: int = 0
+        self.timer = Timer()
+
+    def __str__(self):
+        return (
+            f'checked {self.messages} messages in {self.timer}, {self.known} were processed already, '
+            f'queued {self.queued}'
+        )
+
+
+class CatchUpScanner:
+    """
+    Finds the messages which were posted in the suggestions channel while the bot wasn't connected.
+
+    Only new messages are processed as they come in, so anything posted while the bot is down is missed. This pages
+    through the history of the suggestions channel after the newest message which has a suggestion, and queues the
+    messages which have neither a suggestion nor a submission job in the :class:`SubmissionQueue`, where they're
+    processed like any other message.
+    """
+
+    def __init__(self, bot, *, submissions: SubmissionQueue):
+        self.bot = bot
+        self.submissions = submissions
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> CatchUpReport:
+        """Queue the messages in the suggestions channel which were missed."""
+        report = CatchUpReport()
+
+        async with self._lock:
+            with report.timer:
+                channel = self.bot.get_channel(self.bot.config.suggestions_channel)
+                newest = await queries.NEWEST_SUGGESTIONS_MESSAGE.fetchval(self.bot.db)
+
+                # without a suggestion to start from, the whole channel would be processed again
+                if channel is not None and newest is not None:
+                    history = channel.history(limit=None, after=discord.Object(id=newest), oldest_first=True)
+                    batch = []
+
+                    async for message in history:
+                        if message.author.id == self.bot.user.id:
+                            continue
+
+                        batch.append(message)
+                        if len(batch) >= BATCH_SIZE:
+                            await self.catch_up(batch, report)
+                            batch = []
+
+                    if batch:
+                        await self.catch_up(batch, report)
+
+        log.info('Suggestions channel catch-up: %s.', report)
+        return report
+
+    async def catch_up(self, messages: typing.List[discord.Message], report: CatchUpReport):
+        """Queue the messages of a batch which weren't processed yet, oldest first."""
+        report.messages += len(messages)
+
+        records = await queries.KNOWN_SUGGESTIONS_MESSAGES.fetch(self.bot.db, [message.id for message in messages])
+        known = {record['message_id'] for record in records}
+
+        report.known += len(known)
+
+        for message in messages:
+            if message.id not in known and await self.submissions.put(message):
+                report.queued += 1
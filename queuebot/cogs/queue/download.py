@@ -0,0 +1,62 @@
+"""
+Downloading of emoji files.
+
+Files are streamed in chunks which are hashed as they come in, and the download is aborted as soon as it's larger than
+allowed. The chunks are joined into a single immutable bytes object once, which everything else shares: Pillow reads
+it through a :class:`io.BytesIO`, which uses the bytes without copying them as long as nothing is written to it.
+"""
+
+__all__ = ['Download', 'DownloadTooLarge', 'download']
+
+import hashlib
+import typing
+
+import aiohttp
+
+from queuebot.cogs.queue.probe import MAX_EMOJI_SIZE
+
+#: Bytes read from the response at once.
+CHUNK_SIZE = 16384
+
+
+class DownloadTooLarge(Exception):
+    """Raised when a file is larger than the download limit."""
+
+
+class Download(typing.NamedTuple):
+    """A downloaded file, with its SHA-256 in hex."""
+
+    data: bytes
+    sha256: str
+
+
+async def download(session: aiohttp.ClientSession, url: str, *,
+                   limit: typing.Optional[int] = MAX_EMOJI_SIZE) -> Download:
+    """
+    Download a file, hashing it while it's being downloaded.
+
+    Raises
+    ------
+    DownloadTooLarge
+        The file is larger than ``limit`` bytes. The rest of it isn't downloaded.
+    aiohttp.ClientError
+        The file couldn't be downloaded.
+    """
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+
+    async with session.get(url, raise_for_status=True) as resp:
+        if limit is not None and resp.content_length is not None and resp.content_length > limit:
+            raise DownloadTooLarge(f'the file is too large ({resp.content_length} bytes)')
+
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+
+            if limit is not None and size > limit:
+                raise DownloadTooLarge(f'the file is too large (over {limit} bytes)')
+
+            hasher.update(chunk)
+            chunks.append(chunk)
+
+    return Download(b''.join(chunks), hasher.hexdigest())
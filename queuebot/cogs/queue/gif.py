@@ -0,0 +1,78 @@
+__all__ = ['GifWriter']
+
+import typing
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+
+class GifWriter:
+    """
+    Writes an animated GIF one frame at a time.
+
+    Unlike saving with ``save_all``, which holds on to every frame until all of them have been written, only the
+    previous frame is kept, to find the part of the next frame that changed.
+
+    Frames which share the palette of the first frame use the global color table of the GIF. If that palette has
+    fewer than 256 colors, the next index is used to mark the pixels of such frames which didn't change as
+    transparent, which compresses much better. Any other frame carries its own palette.
+    """
+
+    def __init__(self, fp: typing.BinaryIO, *, loop: int = 0):
+        self.fp = fp
+        self.loop = loop
+        self.frames: int = 0
+
+        self._previous: typing.Optional[Image.Image] = None
+        self._palette: typing.Optional[typing.List[int]] = None
+
+    def write(self, frame: Image.Image, duration: int):
+        """Write a frame, which is shown for ``duration`` milliseconds."""
+        if frame.mode not in ('P', 'L'):
+            frame = frame.quantize(256, Image.MEDIANCUT)
+
+        palette = frame.getpalette()
+
+        if self._previous is None:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': duration})
+            self.fp.writelines(header)
+            self._palette = palette
+
+            self.fp.writelines(GifImagePlugin.getdata(frame, (0, 0), duration=duration, disposal=1))
+        elif palette == self._palette:
+            self._write_shared(frame, duration)
+        else:
+            # only the part that changed is written, on top of the previous frame
+            bbox = ImageChops.difference(frame.convert('RGB'), self._previous.convert('RGB')).getbbox()
+            bbox = bbox or (0, 0, 1, 1)
+
+            self.fp.writelines(GifImagePlugin.getdata(
+                frame.crop(bbox), bbox[:2], duration=duration, disposal=1, include_color_table=True,
+            ))
+
+        self._previous = frame
+        self.frames += 1
+
+    def _write_shared(self, frame: Image.Image, duration: int):
+        # both frames use the same palette, so their indices differ exactly where their colors do
+        difference = ImageChops.difference(frame, self._previous)
+        bbox = difference.getbbox() or (0, 0, 1, 1)
+        changed = frame.crop(bbox)
+
+        transparency = len(self._palette) // 3 if self._palette is not None else 256
+        if transparency >= 256:
+            self.fp.writelines(GifImagePlugin.getdata(changed, bbox[:2], duration=duration, disposal=1))
+            return
+
+        # the difference is read as raw indices, rather than as the colors its palette maps them to
+        unchanged = Image.frombytes('L', changed.size, difference.crop(bbox).tobytes())
+        changed.paste(transparency, mask=unchanged.point(lambda value: 255 if value == 0 else 0))
+
+        self.fp.writelines(GifImagePlugin.getdata(
+            changed, bbox[:2], duration=duration, disposal=1, transparency=transparency,
+        ))
+
+    def close(self):
+        """Finish the GIF."""
+        self.fp.write(b';')
+        self._previous = None
+        self._palette = None
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import typing
+
+log = logging.getLogger(__name__)
+
+
+class Skipped(Exception):
+    """Raised in place of running a step when a step it depends on has failed."""
+
+
+class Pipeline:
+    """
+    Runs the steps of a task concurrently, each as soon as the steps it depends on are done.
+
+    A failing step doesn't stop the others, only the steps which depend on it are skipped. The failures are collected
+    by :meth:`wait`, so that the caller can report them once everything else is done.
+
+    Usage::
+
+        pipeline = Pipeline()
+        pipeline.add('send', channel.send, 'Hi!')
+        pipeline.add('react', lambda message: message.add_reaction('\N{WAVING HAND SIGN}'), after=['send'])
+        failures = await pipeline.wait()
+    """
+
+    def __init__(self):
+        self._steps: typing.Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, function: typing.Callable[..., typing.Awaitable], *args,
+            after: typing.Sequence[str] = ()) -> asyncio.Task:
+        """
+        Start a step.
+
+        The step is called with ``args``, followed by the results of the steps it runs ``after`` in that order.
+        """
+        dependencies = [(dependency, self._steps[dependency]) for dependency in after]
+
+        async def run():
+            results = []
+
+            for dependency, task in dependencies:
+                try:
+                    results.append(await task)
+                except Exception:
+                    raise Skipped(f'{name} needs {dependency}')
+
+            return await function(*args, *results)
+
+        task = self._steps[name] = asyncio.ensure_future(run())
+        return task
+
+    async def wait(self) -> typing.Dict[str, Exception]:
+        """Wait for all steps to finish, and return the exception each failed step raised, by name."""
+        results = await asyncio.gather(*self._steps.values(), return_exceptions=True)
+
+        failures = {}
+
+        for name, result in zip(self._steps, results):
+            if isinstance(result, Skipped):
+                log.debug('Step %s was skipped: %s', name, result)
+            elif isinstance(result, Exception):
+                failures[name] = result
+
+        return failures
@@ -0,0 +1,267 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import typing
+
+from queuebot.cogs.queue.render import Preview
+
+log = logging.getLogger(__name__)
+
+
+class PreviewCache:
+    """
+    A cache of rendered theme test images, keyed by the SHA-256 of the emoji they were rendered from.
+
+    Previews are kept in memory up to ``max_memory`` bytes, least recently used first out. When a ``directory`` is
+    given, previews are also written to it up to ``max_disk`` bytes, so they survive restarts and memory evictions.
+
+    The cache also remembers which emoji was downloaded from which URL, so that testing the same URL again doesn't
+    need to download it.
+    """
+
+    def __init__(self, *, max_memory: int = 32 * 1024 * 1024, directory: typing.Optional[str] = None,
+                 max_disk: int = 256 * 1024 * 1024, max_sources: int = 1024):
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.max_sources = max_sources
+        self.directory = directory
+
+        self._memory: typing.OrderedDict[str, Preview] = collections.OrderedDict()
+        self.memory_size: int = 0
+
+        # key -> (file name, size), in LRU order
+        self._disk: typing.OrderedDict[str, typing.Tuple[str, int]] = collections.OrderedDict()
+        self.disk_size: int = 0
+
+        # keys of the previews whose files are being written
+        self._writing: typing.Set[str] = set()
+
+        # key -> render of a missed preview, shared by everyone who misses it while it runs
+        self._rendering: typing.Dict[str, asyncio.Future] = {}
+
+        # source URL -> key, in LRU order
+        self._sources: typing.OrderedDict[str, str] = collections.OrderedDict()
+
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        if directory is not None:
+            self._load_directory()
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        """The key of the preview of an emoji."""
+        return hashlib.sha256(data).hexdigest()
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this cache."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        rate = (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+        stats = {
+            'memory': f'{len(self._memory)} previews, {self.memory_size / 1024:.0f}/{self.max_memory / 1024:.0f} KiB',
+            'hits': f'{self.memory_hits} memory, {self.disk_hits} disk ({rate:.1%})',
+            'misses': str(self.misses),
+            'evictions': str(self.evictions),
+            'known sources': f'{len(self._sources)}/{self.max_sources}',
+        }
+
+        if self.directory is not None:
+            stats['disk'] = f'{len(self._disk)} previews, {self.disk_size / 1024:.0f}/{self.max_disk / 1024:.0f} KiB'
+
+        return stats
+
+    async def get(self, key: str) -> typing.Optional[Preview]:
+        """Get a preview by its key, if it is cached."""
+        preview = self._memory.get(key)
+
+        if preview is not None:
+            self.memory_hits += 1
+            self._memory.move_to_end(key)
+            return preview
+
+        if key in self._disk and key not in self._writing:
+            filename, _ = self._disk[key]
+
+            try:
+                preview = await asyncio.get_running_loop().run_in_executor(None, self._read, filename)
+            except (OSError, ValueError):
+                log.exception('Failed to read cached preview %s:', filename)
+                self._forget_file(key)
+            else:
+                self.disk_hits += 1
+                self._disk.move_to_end(key)
+                self._remember(key, preview)
+                return preview
+
+        self.misses += 1
+        return None
+
+    async def get_by_source(self, source: str) -> typing.Optional[Preview]:
+        """Get the preview of the emoji at a URL, if it was rendered before."""
+        key = self._sources.get(source)
+
+        if key is None:
+            return None
+
+        self._sources.move_to_end(source)
+        return await self.get(key)
+
+    async def get_or_render(self, key: str, render: typing.Callable[[], typing.Awaitable[Preview]], *,
+                            source: typing.Optional[str] = None) -> Preview:
+        """
+        Get a preview by its key, or render and cache it if it isn't cached.
+
+        Misses of a preview which is already being rendered wait for that render instead of starting their own, so
+        every preview is only rendered (and written) once.
+        """
+        preview = await self.get(key)
+
+        if preview is None:
+            rendering = self._rendering.get(key)
+
+            if rendering is None:
+                rendering = self._rendering[key] = asyncio.ensure_future(self._render(key, render))
+
+            # the render isn't cancelled for the others when one of them gives up
+            preview = await asyncio.shield(rendering)
+
+        await self.put(key, preview, source=source)
+        return preview
+
+    async def _render(self, key: str, render: typing.Callable[[], typing.Awaitable[Preview]]) -> Preview:
+        try:
+            preview = await render()
+            await self.put(key, preview)
+            return preview
+        finally:
+            del self._rendering[key]
+
+    async def put(self, key: str, preview: Preview, *, source: typing.Optional[str] = None):
+        """Cache a preview, and remember where the emoji was downloaded from."""
+        if source is not None:
+            self._sources[source] = key
+            self._sources.move_to_end(source)
+
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+
+        if key in self._memory or key in self._disk or key in self._writing:
+            return
+
+        self._remember(key, preview)
+
+        if self.directory is None:
+            return
+
+        # The file is taken before it's written, so that putting the same preview again while it's being written
+        # neither writes it twice nor counts it twice.
+        filename = self._filename(key, preview)
+        self._disk[key] = filename, len(preview.data)
+        self.disk_size += len(preview.data)
+        self._writing.add(key)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, filename, preview)
+        except OSError:
+            log.exception('Failed to write preview %s to disk:', key)
+
+            if key in self._disk:
+                self._forget_file(key)
+            return
+        finally:
+            self._writing.discard(key)
+
+        if key not in self._disk:
+            # evicted by other previews while it was being written
+            self._delete(filename)
+            return
+
+        self._trim_disk()
+
+    def _remember(self, key: str, preview: Preview):
+        if len(preview.data) > self.max_memory:
+            return
+
+        self._memory[key] = preview
+        self.memory_size += len(preview.data)
+
+        while self.memory_size > self.max_memory:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_size -= len(evicted.data)
+            self.evictions += 1
+
+    # Files are named <key>.<width>x<height>.<format>.<extension>, so a preview can be read back from its file alone.
+
+    def _load_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+
+            if entry.name.endswith('.tmp'):
+                os.remove(entry.path)  # left behind by a crash while writing
+                continue
+
+            key, _, _ = entry.name.partition('.')
+            stat = entry.stat()
+            entries.append((stat.st_mtime, key, entry.name, stat.st_size))
+
+        for _, key, filename, size in sorted(entries):
+            self._disk[key] = filename, size
+            self.disk_size += size
+
+        log.info('Found %d cached previews (%d bytes) in %s.', len(self._disk), self.disk_size, self.directory)
+
+        # the limit might have been lowered since they were cached
+        self._trim_disk()
+
+    def _trim_disk(self):
+        while self.disk_size > self.max_disk and len(self._disk) > 1:
+            self._forget_file(next(iter(self._disk)), delete=True)
+
+    def _forget_file(self, key: str, *, delete: bool = False):
+        filename, size = self._disk.pop(key)
+        self.disk_size -= size
+
+        # files which are still being written are deleted once they have been
+        if delete and key not in self._writing:
+            self._delete(filename)
+
+    def _delete(self, filename: str):
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except OSError:
+            log.exception('Failed to delete cached preview %s:', filename)
+
+    def _read(self, filename: str) -> Preview:
+        path = os.path.join(self.directory, filename)
+
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        os.utime(path)  # keeps the least recently used order across restarts
+
+        _, size, image_format, extension = filename.split('.')
+        width, height = map(int, size.split('x'))
+        return Preview(data, extension, width, height, image_format or None)
+
+    @staticmethod
+    def _filename(key: str, preview: Preview) -> str:
+        return f'{key}.{preview.width}x{preview.height}.{preview.format or ""}.{preview.extension}'
+
+    def _write(self, filename: str, preview: Preview):
+        path = os.path.join(self.directory, filename)
+
+        # written under a temporary name first, so that a crash never leaves a partial preview behind
+        with open(path + '.tmp', 'wb') as file:
+            file.write(preview.data)
+
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,61 @@
+"""
+Probing of suggested emoji, to find out what they are without decoding them.
+
+Pillow only reads the header of an image when opening it, and the frames of a GIF can be counted without decoding
+them, so probing an emoji is cheap compared to rendering it. Suggestions are probed before anything is done with
+them, so that files which can't become an emoji are rejected without using any emoji slots.
+"""
+
+__all__ = ['MAX_EMOJI_SIZE', 'FORMATS', 'Probe', 'ProbeError', 'probe']
+
+import typing
+from io import BytesIO
+
+from PIL import Image
+
+#: The largest file Discord accepts as an emoji, in bytes.
+MAX_EMOJI_SIZE = 261888
+
+#: The image formats (as named by Pillow) which Discord accepts as an emoji.
+FORMATS = frozenset({'PNG', 'JPEG', 'GIF'})
+
+
+class ProbeError(Exception):
+    """Raised when a file can't be an emoji."""
+
+
+class Probe(typing.NamedTuple):
+    """What an emoji is, read from its header."""
+
+    format: str
+    width: int
+    height: int
+    #: The amount of frames, 1 for static images.
+    frames: int
+
+    @property
+    def animated(self) -> bool:
+        """Whether Discord treats this as an animated emoji."""
+        return self.format == 'GIF'
+
+
+def probe(data: bytes) -> Probe:
+    """
+    Probe an emoji, without decoding its pixels.
+
+    Raises
+    ------
+    ProbeError
+        The file is too large, isn't an image, or is in a format that Discord doesn't accept.
+    """
+    if len(data) > MAX_EMOJI_SIZE:
+        raise ProbeError(f'the file is too large ({len(data)} bytes)')
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format not in FORMATS:
+                raise ProbeError(f'{image.format} images are not accepted')
+
+            return Probe(image.format, image.width, image.height, getattr(image, 'n_frames', 1))
+    except (OSError, EOFError, SyntaxError, ValueError, Image.DecompressionBombError) as error:
+        raise ProbeError('the file is not a readable image') from error
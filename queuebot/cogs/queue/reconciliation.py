@@ -0,0 +1,277 @@
+import asyncio
+import contextlib
+import logging
+import typing
+
+import discord
+
+from queuebot import queries
+from queuebot.cogs.queue.suggestion import Suggestion
+from queuebot.cogs.queue.votes import VoteBuffer
+from queuebot.utils import KeyedLock, Timer
+
+log = logging.getLogger(__name__)
+
+#: Amount of queue messages that are corrected in a single transaction.
+BATCH_SIZE = 100
+
+
+class ReconciliationReport:
+    """The changes made by a vote reconciliation."""
+
+    def __init__(self):
+        self.messages: int = 0
+        self.suggestions: int = 0
+        self.drift: int = 0
+        self.council_votes: int = 0
+        self.verdicts: int = 0
+        self.already_counted: int = 0
+        self.timer = Timer()
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.drift or self.council_votes)
+
+    def __str__(self):
+        return (
+            f'checked {self.messages} messages in {self.timer}, corrected {self.drift} votes on '
+            f'{self.suggestions} suggestions and {self.council_votes} council votes, reached {self.verdicts} verdicts, '
+            f'ignored {self.already_counted} live votes which were already counted'
+        )
+
+
+class VoteReconciler:
+    """
+    Corrects the vote tallies of suggestions from the reactions on their queue messages.
+
+    Votes are only tracked by listening to reactions, so any reaction that happens while the bot isn't connected is
+    missed. This walks the council and approval queues, counts the reactions on every suggestion message, and writes
+    the correct tallies (and council votes) to the database, one transaction per batch of messages.
+
+    Live votes on the suggestions of a batch wait until it has been written. Discord might have had some of their
+    reactions already when they were counted, so the users who were counted are kept until those votes have been
+    processed, and :meth:`counted` tells which votes were counted already.
+    """
+
+    def __init__(self, bot, *, locks: KeyedLock, buffer: VoteBuffer, concurrency: int = 5):
+        self.bot = bot
+        self.locks = locks
+        self.buffer = buffer
+
+        # limits how many reaction user lists are fetched at once
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+
+        # suggestion idx -> whether the vote is an approval -> IDs of the users who voted, as counted
+        self._voters: typing.Dict[int, typing.Dict[bool, typing.Set[int]]] = {}
+        self._report: typing.Optional[ReconciliationReport] = None
+
+    @property
+    def config(self):
+        return self.bot.config
+
+    async def run(self) -> ReconciliationReport:
+        """Reconcile the votes of all suggestions in the council and approval queue."""
+        report = ReconciliationReport()
+
+        async with self._lock:
+            self._report = report
+
+            with report.timer:
+                await self.buffer.flush()
+
+                for channel_id in (self.config.council_queue, self.config.approval_queue):
+                    channel = self.bot.get_channel(channel_id)
+                    if channel is None:
+                        continue
+
+                    batch = []
+                    async for message in channel.history(limit=None):
+                        if message.author.id != self.bot.user.id:
+                            continue
+
+                        batch.append(message)
+                        if len(batch) >= BATCH_SIZE:
+                            await self.reconcile(batch, report)
+                            batch = []
+
+                    if batch:
+                        await self.reconcile(batch, report)
+
+        self._report = None
+        log.info('Vote reconciliation: %s.', report)
+        return report
+
+    def counted(self, idx: int, user_id: int, approval: bool, vote_type: Suggestion.VoteType) -> bool:
+        """
+        Return whether a live vote was already counted by the reconciliation of its suggestion, in which case it
+        shouldn't be processed. Has to be called with the lock of the suggestion held.
+
+        Votes which weren't counted are remembered, so that a reaction which is added and removed again while the
+        votes of its suggestion are being reconciled is processed both times.
+        """
+        voters = self._voters.get(idx)
+        if voters is None:
+            return False
+
+        voters = voters[approval]
+
+        if (user_id in voters) == (vote_type is Suggestion.VoteType.CAST):
+            if self._report is not None:
+                self._report.already_counted += 1
+            return True
+
+        if vote_type is Suggestion.VoteType.CAST:
+            voters.add(user_id)
+        else:
+            voters.discard(user_id)
+
+        return False
+
+    async def reconcile(self, messages: typing.List[discord.Message], report: ReconciliationReport):
+        """Reconcile the votes of the suggestions belonging to a batch of queue messages."""
+        report.messages += len(messages)
+
+        records = await queries.GET_QUEUE_MESSAGES.fetch(self.bot.db, [message.id for message in messages])
+
+        by_message = {record['message_id']: record for record in records}
+        messages = [message for message in messages if message.id in by_message]
+
+        indexes = sorted({record['idx'] for record in records})
+
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # hold off live votes on these suggestions until they have been corrected
+                for idx in indexes:
+                    await stack.enter_async_context(self.locks(idx))
+
+                # Public queue votes which came in since the messages were read are written first, and the votes are
+                # only counted after that. Live votes wait for the locks, so none of them can come in between counting
+                # and writing the tallies.
+                await self.buffer.flush()
+
+                tallies = await asyncio.gather(*[self.count_votes(message) for message in messages])
+
+                updated = await self.write(
+                    [(by_message[message.id], *tally) for message, tally in zip(messages, tallies)],
+                    report,
+                )
+
+                for message, (_, _, approvers, deniers) in zip(messages, tallies):
+                    self._voters[by_message[message.id]['idx']] = {True: approvers, False: deniers}
+
+                for suggestion in updated:
+                    if suggestion.council_approved is not None or suggestion.council_message_id is None:
+                        continue
+
+                    if await self.conclude(suggestion):
+                        report.verdicts += 1
+        finally:
+            # The live votes which waited for the locks are processed before we get them again, and later votes can't
+            # have been counted.
+            for idx in indexes:
+                if idx in self._voters:
+                    async with self.locks(idx):
+                        self._voters.pop(idx, None)
+
+    async def count_votes(self, message: discord.Message):
+        """
+        Count the votes on a queue message.
+
+        Returns the amount of upvotes and downvotes, and the sets of users who voted. The reactions added by the bot
+        itself aren't counted.
+
+        The users who reacted are fetched rather than taken from ``message``, which can be long out of date by the
+        time its batch is reconciled.
+        """
+        approvers, deniers = set(), set()
+        upvotes = downvotes = 0
+
+        for reaction in message.reactions:
+            emoji_id = getattr(reaction.emoji, 'id', None)
+
+            if emoji_id not in (self.config.approve_emoji_id, self.config.deny_emoji_id):
+                continue
+
+            approval = emoji_id == self.config.approve_emoji_id
+
+            async with self._semaphore:
+                users = {user.id async for user in reaction.users(limit=None)}
+
+            users.discard(self.bot.user.id)
+            count = len(users)
+            (approvers if approval else deniers).update(users)
+
+            if approval:
+                upvotes = count
+            else:
+                downvotes = count
+
+        return upvotes, downvotes, approvers, deniers
+
+    async def write(self, tallies, report: ReconciliationReport) -> typing.List[Suggestion]:
+        """Write the correct tallies and council votes of a batch of suggestions in a single transaction."""
+        council = [tally for tally in tallies if tally[0]['kind'] == 'council']
+
+        vote_indexes, vote_users, vote_approved, vote_denied = [], [], [], []
+        for record, _, _, approvers, deniers in council:
+            for user_id in approvers | deniers:
+                vote_indexes.append(record['idx'])
+                vote_users.append(user_id)
+                vote_approved.append(user_id in approvers)
+                vote_denied.append(user_id in deniers)
+
+        async with self.bot.db.acquire() as conn:
+            async with conn.transaction():
+                updated = await queries.SET_TALLIES.fetch(
+                    conn,
+                    [record['idx'] for record, *_ in tallies],
+                    [upvotes for _, upvotes, *_ in tallies],
+                    [downvotes for _, _, downvotes, *_ in tallies],
+                )
+
+                revoked = await queries.REVOKE_MISSING_COUNCIL_VOTES.execute(
+                    conn,
+                    [record['idx'] for record, *_ in council],
+                    vote_indexes,
+                    vote_users,
+                )
+
+                cast = await queries.SET_COUNCIL_VOTES.execute(
+                    conn,
+                    vote_indexes,
+                    vote_users,
+                    vote_approved,
+                    vote_denied,
+                )
+
+        previous = {record['idx']: record for record, *_ in tallies}
+        updated = [Suggestion(record) for record in updated]
+
+        for suggestion in updated:
+            before = previous[suggestion.idx]
+            report.drift += abs(suggestion.upvotes - before['upvotes'])
+            report.drift += abs(suggestion.downvotes - before['downvotes'])
+            Suggestion.cache.put(suggestion)
+
+        report.suggestions += len(updated)
+        report.council_votes += int(revoked.split()[-1]) + int(cast.split()[-1])
+
+        return updated
+
+    async def conclude(self, suggestion: Suggestion) -> bool:
+        """Run the verdict for a council queue suggestion, if one is due. Returns whether there was one."""
+        upvotes, downvotes = suggestion.upvotes, suggestion.downvotes
+
+        if upvotes + downvotes < self.config.required_votes:
+            return False
+
+        if abs(upvotes - downvotes) < self.config.required_difference:
+            return False
+
+        try:
+            await suggestion.check_council_votes()
+        except Exception:
+            log.exception('Failed to conclude %s during vote reconciliation:', suggestion)
+
+        return True
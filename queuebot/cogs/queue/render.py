@@ -0,0 +1,451 @@
+"""
+Rendering of theme test images, which show how an emoji looks on the light and dark theme of Discord.
+
+The template is loaded and scaled down to the output size once. Every frame of an emoji is then scaled straight to
+the size it is shown at in the scaled down template, and pasted onto a copy of it.
+
+Identical frames of an animated emoji are only rendered once, and runs of them are merged into a single frame.
+Animations which are longer than the frame budget are resampled by time, so the preview still covers all of it.
+Animated previews are encoded as their frames are rendered, rather than after all of them have been. All of their
+frames share one palette, so that the parts of a frame which didn't change can be left out of the GIF.
+
+When NumPy is installed, frames are scaled and composited onto the template in batches, as array operations on all
+frames of the batch at once. Without it, every frame is scaled and pasted onto the template by Pillow.
+"""
+
+__all__ = ['Preview', 'generate_test_frame', 'iter_frames', 'render_frames', 'render_test_image', 'render_from_bytes',
+           'warm_up']
+
+import bisect
+import collections
+import functools
+import hashlib
+import itertools
+import logging
+import typing
+from io import BytesIO
+from os import path
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from queuebot.cogs.queue.gif import GifWriter
+
+log = logging.getLogger(__name__)
+
+TEMPLATE_PATH = path.join(path.dirname(__file__), 'test_base.png')
+
+#: The size of the rendered image. The template is twice this size.
+OUTPUT_SIZE = (375, 250)
+
+#: The sizes of the large (message) and small (inline) emoji in the output.
+LARGE_SIZE = 48
+SMALL_SIZE = 22
+
+#: Where the emoji are placed in the output, as (size, position) pairs. Both themes have one of each.
+PLACEMENTS = (
+    (SMALL_SIZE, (183, 25)),
+    (LARGE_SIZE, (64, 69)),
+    (SMALL_SIZE, (184, 150)),
+    (LARGE_SIZE, (64, 194)),
+)
+
+#: The maximum amount of frames in the rendered image of an animated emoji.
+MAX_FRAMES = 600
+
+#: The maximum amount of emoji pixels that are rendered. Animated emoji with larger frames get fewer frames.
+MAX_PIXELS = 600 * 256 * 256
+
+#: The default amount of memory that rendered frames which may be reused can take up, in bytes.
+MEMORY_LIMIT = 16 * 1024 * 1024
+
+#: The maximum amount of frames that are composited at once when NumPy is available.
+BATCH_SIZE = 8
+
+#: The amount of colors in the palette of animated previews, and the amount of frames it is computed from.
+PALETTE_COLORS = 255
+PALETTE_SAMPLES = 8
+
+
+class Preview(typing.NamedTuple):
+    """A rendered theme test image, and what it was rendered from."""
+
+    #: The encoded image.
+    data: bytes
+    #: The file extension of the encoded image, ``png`` or ``gif``.
+    extension: str
+
+    #: The size and format of the emoji it was rendered from.
+    width: int
+    height: int
+    format: typing.Optional[str]
+
+    @property
+    def filename(self) -> str:
+        return f'test.{self.extension}'
+
+
+@functools.lru_cache(maxsize=None)
+def load_template() -> Image.Image:
+    """Load the template, scaled down to the output size. This must not be modified, paste onto a copy of it."""
+    with Image.open(TEMPLATE_PATH) as template:
+        return template.resize(OUTPUT_SIZE, Image.LANCZOS)
+
+
+def normalize_frame(emoji_image: Image.Image) -> Image.Image:
+    """Scale the current frame of an emoji to fit a transparent 128x128 square, centered."""
+    max_dimension = max(emoji_image.size)
+    scalar = 128 / max_dimension
+    new_sizing = int(emoji_image.width * scalar), int(emoji_image.height * scalar)
+    placement = (128 - new_sizing[0]) >> 1, (128 - new_sizing[1]) >> 1
+
+    bounding = Image.new('RGBA', (128, 128), (0, 0, 0, 0))
+    normalized = emoji_image.convert('RGBA').resize(new_sizing, Image.LANCZOS)
+    bounding.paste(normalized, placement, mask=normalized)
+
+    return bounding
+
+
+def composite_frame(bounding: Image.Image) -> Image.Image:
+    """Render a normalized emoji frame onto the template."""
+    sizes = {size: bounding.resize((size, size), Image.LANCZOS) for size in (LARGE_SIZE, SMALL_SIZE)}
+
+    frame = load_template().copy()
+
+    for size, position in PLACEMENTS:
+        frame.paste(sizes[size], position, mask=sizes[size])
+
+    return frame
+
+
+def generate_test_frame(emoji_image: Image.Image, is_gif: bool) -> Image.Image:
+    """Render the current frame of an emoji onto the template, with its own palette if it is a frame of a GIF."""
+    with normalize_frame(emoji_image) as bounding:
+        frame = composite_frame(bounding)
+
+    if is_gif:
+        frame = frame.quantize(256, Image.MEDIANCUT)
+
+    return frame
+
+
+@functools.lru_cache(maxsize=None)
+def load_template_array() -> 'numpy.ndarray':
+    """The template as a read-only array of shape (height, width, 3)."""
+    array = numpy.array(load_template().convert('RGB'))
+    array.flags.writeable = False
+    return array
+
+
+@functools.lru_cache(maxsize=None)
+def lanczos_weights(source: int, size: int) -> 'numpy.ndarray':
+    """
+    The weights of a Lanczos resize from ``source`` to ``size`` pixels along one axis, as a (size, source) matrix.
+
+    These are the weights Pillow uses to scale down with :data:`Image.LANCZOS`.
+    """
+    scale = source / size
+    centers = (numpy.arange(size) + 0.5) * scale
+    distance = ((numpy.arange(source) + 0.5)[numpy.newaxis] - centers[:, numpy.newaxis]) / scale
+
+    weights = numpy.sinc(distance) * numpy.sinc(distance / 3) * (numpy.abs(distance) < 3)
+    return (weights / weights.sum(axis=1, keepdims=True)).astype(numpy.float32)
+
+
+def composite_frames(boundings: typing.List[Image.Image]) -> typing.List[Image.Image]:
+    """
+    Render a batch of normalized emoji frames onto the template with NumPy.
+
+    All frames of the batch are scaled and alpha composited onto their places in the template at once, as array
+    operations. This produces the same frames as :func:`composite_frame`, give or take rounding.
+    """
+    # (frames, 128, 128, 4), with premultiplied alpha like Pillow scales with
+    emoji = numpy.stack([numpy.asarray(bounding.convert('RGBa')) for bounding in boundings]).astype(numpy.float32)
+
+    frames = numpy.repeat(load_template_array()[numpy.newaxis], len(boundings), axis=0)
+
+    for size in (LARGE_SIZE, SMALL_SIZE):
+        weights = lanczos_weights(128, size)
+
+        # scaled along the height, then along the width
+        scaled = numpy.matmul(weights, emoji.reshape(len(boundings), 128, 128 * 4)).reshape(-1, size, 128, 4)
+        scaled = numpy.clip(numpy.matmul(weights, scaled), 0, 255)
+
+        colors, transparency = scaled[..., :3], 1 - scaled[..., 3:] / 255
+
+        for placement_size, (x, y) in PLACEMENTS:
+            if placement_size != size:
+                continue
+
+            background = frames[:, y:y + size, x:x + size]
+            background[...] = numpy.rint(numpy.minimum(colors + background * transparency, 255))
+
+    return [Image.fromarray(frame, 'RGB') for frame in frames]
+
+
+def stack_frames(frames: typing.List[Image.Image]) -> Image.Image:
+    """Stack rendered frames on top of each other, so that Pillow can process all of them in a single call."""
+    width, height = OUTPUT_SIZE
+    sheet = Image.new(frames[0].mode, (width, height * len(frames)))
+
+    for index, frame in enumerate(frames):
+        sheet.paste(frame, (0, height * index))
+
+    return sheet
+
+
+def plan_palette(frames: typing.List[Image.Image]) -> Image.Image:
+    """
+    Compute a single palette for all frames of an animated preview, from a sample of its rendered frames.
+
+    Returns an image to map frames to the palette with. The palette has :data:`PALETTE_COLORS` colors, which leaves
+    the last index of a GIF color table free to mark unchanged pixels as transparent.
+    """
+    colors = stack_frames(frames).quantize(PALETTE_COLORS, Image.MEDIANCUT).getpalette()
+
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(colors[:PALETTE_COLORS * 3])
+    return palette
+
+
+def map_to_palette(frames: typing.List[Image.Image], palette: Image.Image) -> typing.List[Image.Image]:
+    """Map rendered frames to a palette from :func:`plan_palette`, all at once."""
+    if len(frames) == 1:
+        return [frames[0].quantize(palette=palette, dither=Image.NONE)]
+
+    # not dithered, so that pixels which didn't change between frames are mapped to the same index
+    mapped = stack_frames(frames).quantize(palette=palette, dither=Image.NONE)
+    width, height = OUTPUT_SIZE
+
+    return [mapped.crop((0, height * index, width, height * (index + 1))) for index in range(len(frames))]
+
+
+def render_batch(boundings: typing.List[Image.Image], palette: typing.Optional[Image.Image] = None
+                 ) -> typing.List[Image.Image]:
+    """
+    Render normalized emoji frames onto the template, all at once if NumPy is available. With a palette from
+    :func:`plan_palette`, the rendered frames are mapped to it.
+    """
+    if numpy is None:
+        frames = [composite_frame(bounding) for bounding in boundings]
+    else:
+        frames = composite_frames(boundings)
+
+    if palette is None:
+        return frames
+
+    return map_to_palette(frames, palette)
+
+
+def frame_durations(emoji_image: Image.Image) -> typing.List[int]:
+    """Get the duration of every frame of an emoji, in milliseconds."""
+    durations = []
+
+    emoji_image.seek(0)
+    while True:
+        durations.append(emoji_image.info.get('duration') or 0)
+
+        try:
+            emoji_image.seek(emoji_image.tell() + 1)
+        except EOFError:
+            break
+
+    return durations
+
+
+def sample_frames(durations: typing.List[int], budget: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Pick the frames to render from the durations of all frames of an emoji, as (frame index, duration) pairs.
+
+    If there are more frames than the budget allows, the animation is sampled at even intervals, showing whichever
+    frame is visible at that point in time, so the rendered animation has the same length.
+    """
+    if len(durations) <= budget:
+        return list(enumerate(durations))
+
+    total = sum(durations)
+    if not total:
+        step = len(durations) / budget
+        return [(int(sample * step), 0) for sample in range(budget)]
+
+    # the point in time at which every frame ends
+    ends = list(itertools.accumulate(durations))
+    interval = total / budget
+
+    return [
+        (bisect.bisect_right(ends, sample * interval), round((sample + 1) * interval) - round(sample * interval))
+        for sample in range(budget)
+    ]
+
+
+def iter_frames(emoji_image: Image.Image, *,
+                memory_limit: int = MEMORY_LIMIT) -> typing.Iterator[typing.Tuple[Image.Image, int]]:
+    """
+    Render the frames of an emoji one at a time, as (rendered frame, duration) pairs.
+
+    A frame is only produced once the next different frame has been found, so that its duration includes the
+    identical frames after it. Rendered frames are kept to be reused by identical frames later on, up to
+    ``memory_limit`` bytes of them.
+
+    With NumPy, up to :data:`BATCH_SIZE` different frames are rendered at once. Until then, only their normalized
+    128x128 emoji frames are kept, whatever the size of the emoji.
+
+    Frames of GIF emoji are all mapped to one palette, planned from up to :data:`PALETTE_SAMPLES` frames spread over
+    the animation before the first frame is produced.
+    """
+    is_gif = emoji_image.format == 'GIF'
+    budget = max(1, min(MAX_FRAMES, MAX_PIXELS // (emoji_image.width * emoji_image.height)))
+    samples = sample_frames(frame_durations(emoji_image), budget)
+    batch_size = 1 if numpy is None else BATCH_SIZE
+
+    palette = None
+    if is_gif:
+        indices = sorted({index for index, _ in samples})
+        step = -(-len(indices) // PALETTE_SAMPLES)
+
+        boundings = []
+        for index in indices[::step]:
+            emoji_image.seek(index)
+            boundings.append(normalize_frame(emoji_image))
+
+        palette = plan_palette(render_batch(boundings))
+
+    # digest of an emoji frame -> rendered frame, in LRU order
+    rendered: typing.OrderedDict[bytes, Image.Image] = collections.OrderedDict()
+    rendered_size = 0
+    renders = 0
+
+    # digest of an emoji frame -> normalized emoji frame, waiting to be rendered
+    queued: typing.Dict[bytes, Image.Image] = {}
+
+    # runs of identical frames which haven't been produced yet, as [rendered frame, duration, digest]. The rendered
+    # frame is None until its batch has been rendered, and the last run may still become longer.
+    runs: typing.Deque[list] = collections.deque()
+    previous_index = None
+
+    def render_queued():
+        nonlocal rendered_size, renders
+
+        batch = dict(zip(queued, render_batch(list(queued.values()), palette)))
+        queued.clear()
+        renders += len(batch)
+
+        for run in runs:
+            if run[0] is None:
+                run[0] = batch[run[2]]
+
+        for digest, frame in batch.items():
+            rendered[digest] = frame
+            rendered_size += frame_size(frame)
+
+        while rendered_size > memory_limit and len(rendered) > 1:
+            _, evicted = rendered.popitem(last=False)
+            rendered_size -= frame_size(evicted)
+
+    emoji_image.seek(0)
+    for index, duration in samples:
+        if index == previous_index:
+            # a frame that is visible for longer than the sampling interval
+            runs[-1][1] += duration
+            continue
+
+        previous_index = index
+        emoji_image.seek(index)
+
+        frame = emoji_image.convert('RGBA')
+        digest = hashlib.blake2b(frame.tobytes(), digest_size=16).digest()
+
+        if runs and runs[-1][2] == digest:
+            runs[-1][1] += duration
+            continue
+
+        if digest in rendered:
+            rendered.move_to_end(digest)
+            runs.append([rendered[digest], duration, digest])
+        else:
+            if digest not in queued:
+                queued[digest] = normalize_frame(frame)
+
+            runs.append([None, duration, digest])
+
+            if len(queued) >= batch_size:
+                render_queued()
+
+        while len(runs) > 1 and runs[0][0] is not None:
+            complete, complete_duration, _ = runs.popleft()
+            yield complete, complete_duration
+
+    if queued:
+        render_queued()
+
+    for complete, complete_duration, _ in runs:
+        yield complete, complete_duration
+
+    log.debug('Rendered %d frames from %d samples.', renders, len(samples))
+
+
+def frame_size(frame: Image.Image) -> int:
+    """The approximate amount of memory used by a frame, in bytes."""
+    return frame.width * frame.height * len(frame.getbands())
+
+
+def render_frames(emoji_image: Image.Image) -> typing.Tuple[typing.List[Image.Image], typing.List[int]]:
+    """Render all frames of an emoji. Returns the rendered frames and their durations."""
+    frames, durations = [], []
+
+    for frame, duration in iter_frames(emoji_image):
+        frames.append(frame)
+        durations.append(duration)
+
+    return frames, durations
+
+
+def render_test_image(emoji_image: Image.Image, *, memory_limit: int = MEMORY_LIMIT) -> typing.Tuple[BytesIO, str]:
+    """
+    Render the theme test image of an emoji. Returns the encoded image and its file extension.
+
+    Animated images are encoded while they are being rendered, so that only a few frames are in memory at once.
+    """
+    buffer = BytesIO()
+
+    frames = iter_frames(emoji_image, memory_limit=memory_limit)
+    initial_frame, initial_duration = next(frames)
+    second = next(frames, None)
+
+    if second is not None:
+        writer = GifWriter(buffer, loop=0)
+        writer.write(initial_frame, initial_duration)
+        writer.write(*second)
+
+        for frame, duration in frames:
+            writer.write(frame, duration)
+
+        writer.close()
+        extension = 'gif'
+    else:
+        initial_frame.save(buffer, 'png')
+        extension = 'png'
+
+    buffer.seek(0)
+    return buffer, extension
+
+
+def render_from_bytes(data: bytes, *, memory_limit: int = MEMORY_LIMIT) -> Preview:
+    """Render the theme test image of an encoded emoji."""
+    with Image.open(BytesIO(data)) as emoji_image:
+        width, height, image_format = emoji_image.width, emoji_image.height, emoji_image.format
+        buffer, extension = render_test_image(emoji_image, memory_limit=memory_limit)
+
+    return Preview(buffer.getvalue(), extension, width, height, image_format)
+
+
+def warm_up():
+    """Prepare a process for rendering."""
+    load_template()
+
+    if numpy is not None:
+        load_template_array()
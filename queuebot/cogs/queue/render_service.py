@@ -0,0 +1,142 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import typing
+from concurrent.futures.process import BrokenProcessPool
+
+from queuebot.cogs.queue import render
+from queuebot.utils import Timer
+
+log = logging.getLogger(__name__)
+
+
+class RenderService:
+    """
+    Renders theme test images in a pool of worker processes.
+
+    Rendering is CPU bound and mostly holds the GIL, so rendering in threads slows down the event loop and makes
+    concurrent renders wait on each other. Jobs are sent to the workers as the bytes of the emoji, and come back as
+    the bytes of the encoded image.
+
+    If the pool breaks (a worker was killed, for example), the job is rendered in a thread instead and a new pool is
+    started for the next jobs. With ``workers`` set to 0, everything is rendered in a thread.
+
+    Every job keeps at most ``memory_limit`` bytes of rendered frames in memory to be reused.
+    """
+
+    def __init__(self, *, workers: int = 2, memory_limit: int = render.MEMORY_LIMIT):
+        self.workers = workers
+        self.memory_limit = memory_limit
+        self._executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+        self.jobs: int = 0
+        self.failures: int = 0
+        self.fallbacks: int = 0
+        self.restarts: int = 0
+        self.in_flight: int = 0
+        self.peak_in_flight: int = 0
+        self.render_time: float = 0.0
+        self.longest_render: float = 0.0
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this service."""
+        average = self.render_time / self.jobs if self.jobs else 0.0
+
+        return {
+            'workers': str(self.workers) if self._executor else f'{self.workers} (not running)',
+            'jobs': str(self.jobs),
+            'failed jobs': str(self.failures),
+            'rendered in process': str(self.fallbacks),
+            'pool restarts': str(self.restarts),
+            'queue depth': f'{max(0, self.in_flight - self.workers)} now, {self.in_flight} in flight, '
+                           f'{self.peak_in_flight} peak',
+            'job time': f'{average * 1000:.2f}ms avg, {self.longest_render * 1000:.2f}ms max',
+        }
+
+    def _start_pool(self):
+        # workers are spawned rather than forked, as forking a process running an event loop isn't safe
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=render.warm_up,
+        )
+
+    async def start(self):
+        """Start the worker processes, and wait until they are ready to render."""
+        if self.workers < 1:
+            return
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            with Timer() as timer:
+                self._start_pool()
+
+                # workers are warmed up by the initializer of the pool before they run their first job
+                await asyncio.gather(*[loop.run_in_executor(self._executor, os.getpid) for _ in range(self.workers)])
+        except (BrokenProcessPool, OSError):
+            log.exception('Failed to start the render workers, rendering in process instead:')
+            self.close()
+        else:
+            log.info('Started %d render workers in %s.', self.workers, timer)
+
+    def close(self):
+        """Stop the worker processes, abandoning jobs which haven't started yet."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, data: bytes) -> render.Preview:
+        """Render the theme test image of an emoji."""
+        loop = asyncio.get_running_loop()
+        job = functools.partial(render.render_from_bytes, data, memory_limit=self.memory_limit)
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        timer = Timer()
+
+        try:
+            with timer:
+                executor = self._executor
+
+                if executor is None:
+                    self.fallbacks += 1
+                    return await loop.run_in_executor(None, job)
+
+                try:
+                    return await loop.run_in_executor(executor, job)
+                except BrokenProcessPool:
+                    log.exception('The render pool broke, rendering in process:')
+
+                    # jobs which were running at the same time all see the same broken pool
+                    if executor is self._executor:
+                        self._restart()
+
+                    self.fallbacks += 1
+                    return await loop.run_in_executor(None, job)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.jobs += 1
+            self.render_time += timer.duration
+            self.longest_render = max(self.longest_render, timer.duration)
+
+    def _restart(self):
+        broken, self._executor = self._executor, None
+
+        if broken is not None:
+            broken.shutdown(wait=False)
+
+        try:
+            self._start_pool()
+        except OSError:
+            log.exception('Failed to restart the render pool, rendering in process from now on:')
+        else:
+            self.restarts += 1
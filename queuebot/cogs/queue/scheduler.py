@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import enum
+import heapq
+import itertools
+import logging
+import typing
+
+from queuebot.utils import Histogram, Timer
+
+log = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    """How urgent a render is. Lower values go first."""
+
+    #: The theme test image of a new suggestion, for the council queue.
+    SUBMISSION = 0
+
+    #: A theme test image requested with the test command.
+    TEST = 1
+
+
+class QueueFull(Exception):
+    """Raised when a render can't be queued because too many are waiting already."""
+
+
+class RenderScheduler:
+    """
+    Limits how many theme test images are rendered at once.
+
+    Renders which can't start right away wait in a queue, submissions ahead of tests and in order otherwise. Tests
+    are turned away with :class:`QueueFull` once ``max_queued`` renders are waiting, submissions are always queued.
+
+    Usage::
+
+        async with scheduler(Priority.TEST, on_queued=tell_user):
+            ...
+    """
+
+    def __init__(self, *, concurrency: int = 2, max_queued: int = 20):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+
+        self.running: int = 0
+
+        # heap of (priority, order, future), the future is resolved once the render may start
+        self._waiting: typing.List[typing.Tuple[Priority, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+        self.scheduled: int = 0
+        self.queued: int = 0
+        self.rejected: int = 0
+        self.peak_waiting: int = 0
+
+        #: How long renders waited to start, and how long they ran for.
+        self.wait_times = Histogram()
+        self.run_times = Histogram()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this scheduler."""
+        return {
+            'running': f'{self.running}/{self.concurrency}',
+            'waiting': f'{self.waiting}/{self.max_queued} now, {self.peak_waiting} peak',
+            'renders': f'{self.scheduled} ({self.queued} queued, {self.rejected} rejected)',
+            'wait time': self.wait_times.summary,
+            'wait histogram': str(self.wait_times),
+            'run time': self.run_times.summary,
+            'run histogram': str(self.run_times),
+        }
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, priority: Priority, *,
+                       on_queued: typing.Optional[typing.Callable[[int], typing.Awaitable]] = None):
+        """
+        Wait until a render may start.
+
+        If the render has to wait, ``on_queued`` is awaited with its position in the queue, starting at 1. The render
+        goes ahead even if ``on_queued`` fails.
+
+        Raises
+        ------
+        QueueFull
+            The render is a test, and too many renders are waiting already.
+        """
+        with Timer() as wait:
+            await self._acquire(priority, on_queued)
+
+        self.wait_times.add(wait.duration)
+
+        try:
+            with Timer() as run:
+                yield
+        finally:
+            self.run_times.add(run.duration)
+            self._release()
+
+    async def _acquire(self, priority: Priority, on_queued):
+        if self.running < self.concurrency and not self._waiting:
+            self.running += 1
+            self.scheduled += 1
+            return
+
+        if priority is not Priority.SUBMISSION and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull(f'{self.waiting} renders are waiting already')
+
+        entry = priority, next(self._order), asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, entry)
+
+        self.scheduled += 1
+        self.queued += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+        try:
+            if on_queued is not None:
+                try:
+                    await on_queued(sum(1 for other in self._waiting if other < entry) + 1)
+                except Exception:
+                    log.exception('Failed to tell that a render is queued:')
+
+            await entry[2]
+        except BaseException:
+            if entry[2].done() and not entry[2].cancelled():
+                # the slot was handed to us already, pass it on
+                self._release()
+            else:
+                entry[2].cancel()
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+
+            raise
+
+    def _release(self):
+        # the slot is handed straight to the next render, so it can't be taken by a render which didn't wait
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.running -= 1
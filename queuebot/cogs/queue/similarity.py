@@ -0,0 +1,103 @@
+"""
+Finding suggestions which look like earlier ones.
+
+Every suggestion gets a difference hash (dHash) of its first frame: the image is shrunk to 9x8 grayscale pixels, and
+every bit of the 64-bit hash tells whether a pixel is brighter than its right neighbour. Small edits to an emoji
+change only a few bits, so near duplicates are found by looking for hashes within a few bits of each other.
+"""
+
+__all__ = ['dhash', 'to_column', 'SimilarityIndex']
+
+import logging
+import typing
+from io import BytesIO
+
+from PIL import Image
+
+from queuebot import queries
+from queuebot.utils import BKTree, Timer
+
+log = logging.getLogger(__name__)
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def dhash(data: bytes) -> int:
+    """Compute the difference hash of the first frame of an encoded emoji."""
+    with Image.open(BytesIO(data)) as image:
+        image.seek(0)
+        frame = image.convert('RGBA')
+
+    # transparent pixels can have any color, so they're made white first
+    with Image.new('RGBA', frame.size, (255, 255, 255, 255)) as background:
+        gray = Image.alpha_composite(background, frame).convert('L').resize((9, 8), Image.LANCZOS)
+
+    pixels = list(gray.getdata())
+    value = 0
+
+    for row in range(8):
+        for column in range(8):
+            value = value << 1 | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+
+    return value
+
+
+def to_column(value: int) -> int:
+    """Convert a hash to the signed 64-bit integer stored in the database."""
+    return value - (1 << HASH_BITS) if value >> (HASH_BITS - 1) else value
+
+
+class SimilarityIndex:
+    """
+    The perceptual hashes of all suggestions, held in a :class:`BKTree` to find near duplicates of new suggestions
+    without scanning every suggestion.
+    """
+
+    def __init__(self, *, max_distance: int = 10):
+        self.max_distance = max_distance
+        self._tree: BKTree[int] = BKTree()
+
+        self.lookups: int = 0
+        self.matches: int = 0
+        self.lookup_time: float = 0.0
+        self.load_time: float = 0.0
+
+    def __len__(self):
+        return len(self._tree)
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this index."""
+        average = self.lookup_time / self.lookups if self.lookups else 0.0
+
+        return {
+            'hashes': str(len(self)),
+            'lookups': f'{self.lookups} ({self.matches} with matches)',
+            'lookup time': f'{average * 1000:.3f}ms avg',
+            'load time': f'{self.load_time * 1000:.2f}ms',
+            'max distance': f'{self.max_distance} bits',
+        }
+
+    async def load(self, db):
+        """Load the hashes of all suggestions which have one."""
+        with Timer() as timer:
+            for record in await queries.PERCEPTUAL_HASHES.fetch(db):
+                self.add(record['idx'], record['perceptual_hash'])
+
+        self.load_time = timer.duration
+        log.info('Loaded %d perceptual hashes in %s.', len(self), timer)
+
+    def add(self, suggestion_id: int, value: int):
+        """Add the hash of a suggestion. Hashes may be given as stored in the database."""
+        self._tree.add(value & HASH_MASK, suggestion_id)
+
+    def search(self, value: int) -> typing.List[typing.Tuple[int, int]]:
+        """Find suggestions that look like an emoji with the given hash, as (distance, suggestion ID), closest first."""
+        with Timer() as timer:
+            matches = self._tree.search(value & HASH_MASK, self.max_distance)
+
+        self.lookups += 1
+        self.matches += bool(matches)
+        self.lookup_time += timer.duration
+        return matches
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import typing
+
+import discord
+
+log = logging.getLogger(__name__)
+
+#: The name of guilds created to hold emoji.
+BUFFER_GUILD_NAME = 'BlobQueue Emoji Buffer'
+
+
+class Reservation:
+    """
+    An emoji slot in a buffer guild, held until the emoji has been created in it.
+
+    The slot is given back when the reservation is left, so the allocator has to be told about the emoji that was
+    created before then::
+
+        with await allocator.reserve(animated=False) as reservation:
+            emoji = await reservation.guild.create_custom_emoji(...)
+            allocator.created(emoji)
+    """
+
+    def __init__(self, allocator: 'EmojiSlotAllocator', guild: discord.Guild, animated: bool):
+        self.allocator = allocator
+        self.guild = guild
+        self.animated = animated
+        self._released = False
+
+    def release(self):
+        """Give back the slot. Does nothing if it was given back already."""
+        if not self._released:
+            self._released = True
+            self.allocator._release(self)
+
+    def __enter__(self) -> 'Reservation':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class EmojiSlotAllocator:
+    """
+    Hands out emoji slots in the buffer guilds, the guilds owned by the bot which hold emoji in the queues.
+
+    The static and animated emoji of every buffer guild are tracked as they're created and deleted, and the guilds
+    which have free slots are kept apart, so that a guild with a free slot is found without counting emoji. Slots are
+    reserved until the emoji is created, so that concurrent uploads never go for the same last slot. A new buffer
+    guild is created when all of them are full.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        # guild ID -> guild, of all buffer guilds
+        self._guilds: typing.Dict[int, discord.Guild] = {}
+
+        # guild ID -> emoji ID -> whether it's animated, so that an emoji isn't counted twice when it's both created
+        # by us and seen in an emoji update
+        self._emoji: typing.Dict[int, typing.Dict[int, bool]] = {}
+
+        # guild ID -> amount of emoji, and of reserved slots, static and animated
+        self._counts: typing.Dict[int, typing.List[int]] = {}
+        self._reserved: typing.Dict[int, typing.List[int]] = {}
+
+        # animated -> IDs of the guilds with a free slot of that kind, in the order they got one
+        self._free: typing.Dict[bool, typing.Dict[int, None]] = {False: {}, True: {}}
+
+        self._loaded = False
+        self._creating = asyncio.Lock()
+
+        self.reservations: int = 0
+        self.guilds_created: int = 0
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of the buffer guilds."""
+        return {
+            'guilds': f'{len(self._guilds)} ({self.guilds_created} created)',
+            'free slots': f'{self.free_slots(False)} static, {self.free_slots(True)} animated',
+            'reserved slots': str(sum(sum(reserved) for reserved in self._reserved.values())),
+            'reservations': str(self.reservations),
+        }
+
+    def is_buffer_guild(self, guild: discord.Guild) -> bool:
+        return guild.owner_id == self.bot.user.id
+
+    def used(self, guild_id: int, animated: bool) -> int:
+        """The amount of emoji of a kind in a buffer guild, including reserved slots."""
+        return self._counts[guild_id][animated] + self._reserved[guild_id][animated]
+
+    def free_slots(self, animated: bool) -> int:
+        """The amount of free slots of a kind over all buffer guilds."""
+        return sum(
+            self._guilds[guild_id].emoji_limit - self.used(guild_id, animated) for guild_id in self._free[animated]
+        )
+
+    def load(self):
+        """Track the buffer guilds among the guilds the bot is in."""
+        for guild in self.bot.guilds:
+            self.update(guild)
+
+        self._loaded = True
+
+    def update(self, guild: discord.Guild, emojis: typing.Sequence[discord.Emoji] = None):
+        """Start tracking a guild, or replace what is known about its emoji."""
+        if not self.is_buffer_guild(guild):
+            return
+
+        emoji_ids = {emoji.id: emoji.animated for emoji in (guild.emojis if emojis is None else emojis)}
+        animated = sum(emoji_ids.values())
+
+        self._guilds[guild.id] = guild
+        self._emoji[guild.id] = emoji_ids
+        self._counts[guild.id] = [len(emoji_ids) - animated, animated]
+        self._reserved.setdefault(guild.id, [0, 0])
+        self._refresh(guild.id)
+
+    def remove(self, guild: discord.Guild):
+        """Stop tracking a guild."""
+        self._guilds.pop(guild.id, None)
+        self._emoji.pop(guild.id, None)
+        self._counts.pop(guild.id, None)
+        self._reserved.pop(guild.id, None)
+
+        for free in self._free.values():
+            free.pop(guild.id, None)
+
+    def created(self, emoji: discord.Emoji):
+        """Count an emoji that was created in a buffer guild."""
+        emoji_ids = self._emoji.get(emoji.guild_id)
+
+        if emoji_ids is not None and emoji.id not in emoji_ids:
+            emoji_ids[emoji.id] = emoji.animated
+            self._counts[emoji.guild_id][emoji.animated] += 1
+            self._refresh(emoji.guild_id)
+
+    def deleted(self, emoji: discord.Emoji):
+        """Stop counting an emoji that was deleted from a buffer guild."""
+        emoji_ids = self._emoji.get(emoji.guild_id)
+
+        if emoji_ids is not None and emoji.id in emoji_ids:
+            self._counts[emoji.guild_id][emoji_ids.pop(emoji.id)] -= 1
+            self._refresh(emoji.guild_id)
+
+    def find(self, animated: bool) -> typing.Optional[discord.Guild]:
+        """A buffer guild with a free slot of a kind, without reserving it."""
+        if not self._loaded:
+            self.load()
+
+        for guild_id in self._free[animated]:
+            return self._guilds[guild_id]
+
+        return None
+
+    async def reserve(self, *, animated: bool) -> Reservation:
+        """
+        Reserve a slot for an emoji, creating a new buffer guild if all of them are full.
+
+        Raises
+        ------
+        HTTPException
+            The bot is in too many guilds to create another one.
+        """
+        guild = self.find(animated)
+
+        if guild is None:
+            async with self._creating:
+                # another upload might have created a guild while we waited
+                guild = self.find(animated)
+
+                if guild is None:
+                    log.info('Creating new buffer emoji guild...')
+                    guild = await self.bot.create_guild(name=BUFFER_GUILD_NAME)
+                    self.guilds_created += 1
+                    self.update(guild, [])
+
+        self._reserved[guild.id][animated] += 1
+        self.reservations += 1
+        self._refresh(guild.id)
+        return Reservation(self, guild, animated)
+
+    def _release(self, reservation: Reservation):
+        reserved = self._reserved.get(reservation.guild.id)
+
+        if reserved is not None:
+            reserved[reservation.animated] -= 1
+            self._refresh(reservation.guild.id)
+
+    def _refresh(self, guild_id: int):
+        limit = self._guilds[guild_id].emoji_limit
+
+        for animated, free in self._free.items():
+            if self.used(guild_id, animated) < limit:
+                free.setdefault(guild_id)
+            else:
+                free.pop(guild_id, None)
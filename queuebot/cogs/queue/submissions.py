@@ -0,0 +1,265 @@
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+import discord
+
+from queuebot import queries
+from queuebot.utils import Histogram, Timer
+
+log = logging.getLogger(__name__)
+
+#: Seconds over which the throughput of the queue is measured.
+THROUGHPUT_WINDOW = 60.0
+
+
+class SubmissionJob:
+    """A message in the suggestions channel which is waiting to be processed, or being processed."""
+
+    def __init__(self, db, record: typing.Mapping, *, message: discord.Message = None):
+        self.db = db
+
+        self.message_id: int = record['message_id']
+        self.channel_id: int = record['channel_id']
+        self.user_id: int = record['user_id']
+        self.attempts: int = record['attempts']
+
+        #: The emoji uploaded for this message by an earlier attempt.
+        self.emoji_id: typing.Optional[int] = record['emoji_id']
+
+        #: The steps done by earlier attempts.
+        self.done: typing.Set[str] = set(record['done'])
+
+        #: The message, if it was received rather than loaded from the database.
+        self.message: typing.Optional[discord.Message] = message
+
+        # when this job was (re)queued, to measure how long it waited
+        self.queued_at: float = time.monotonic()
+
+    def __repr__(self):
+        return f'<SubmissionJob message_id={self.message_id} user_id={self.user_id} attempts={self.attempts}>'
+
+    async def set_emoji(self, emoji_id: int):
+        """Remember the emoji uploaded for this message, so that it's reused by later attempts."""
+        await queries.SET_SUBMISSION_EMOJI.execute(self.db, self.message_id, emoji_id)
+        self.emoji_id = emoji_id
+
+    def once(self, step: str, function: typing.Callable[..., typing.Awaitable]) -> typing.Callable:
+        """Wrap a step so that it's skipped if an earlier attempt did it, and remembered once it's done."""
+
+        async def run(*args):
+            if step in self.done:
+                return None
+
+            result = await function(*args)
+
+            await queries.SUBMISSION_STEP_DONE.execute(self.db, self.message_id, step)
+            self.done.add(step)
+            return result
+
+        return run
+
+
+class SubmissionQueue:
+    """
+    Processes the messages posted in the suggestions channel with a fixed amount of workers.
+
+    Messages are stored in the database as soon as they're queued, and removed once they're processed. Messages which
+    were queued or being processed when the bot stopped are queued again by :meth:`start`, and processing them starts
+    over. The handler has to make sure that what's done already isn't done again, see :class:`SubmissionJob`.
+
+    Users take turns: every user with queued messages gets one processed before anyone gets another one, and only one
+    message per user is processed at a time. A message which fails to be processed is tried again after
+    ``retry_delay`` seconds, until it has been tried ``max_attempts`` times.
+    """
+
+    def __init__(self, db, handler: typing.Callable[[SubmissionJob], typing.Awaitable], *, workers: int = 3,
+                 max_attempts: int = 3, retry_delay: float = 30.0):
+        self.db = db
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        # user ID -> their queued jobs, in order
+        self._queued: typing.Dict[int, typing.Deque[SubmissionJob]] = {}
+
+        # users with queued jobs and no job being processed, in the order they get their turn
+        self._turns: typing.Deque[int] = collections.deque()
+        self._busy: typing.Set[int] = set()
+        self._ready = asyncio.Condition()
+
+        self._tasks: typing.List[asyncio.Task] = []
+
+        # message ID -> job, of all jobs which are queued or being processed
+        self._jobs: typing.Dict[int, SubmissionJob] = {}
+
+        self.queued: int = 0
+        self.resumed: int = 0
+        self.processed: int = 0
+        self.failures: int = 0
+        self.dropped: int = 0
+        self.peak_depth: int = 0
+
+        #: How long jobs waited to be processed, and how long processing them took.
+        self.wait_times = Histogram()
+        self.run_times = Histogram()
+
+        # times at which recent jobs were done, to measure throughput
+        self._done_times: typing.Deque[float] = collections.deque()
+
+    @property
+    def depth(self) -> int:
+        """The amount of queued jobs, not counting those being processed."""
+        return sum(len(jobs) for jobs in self._queued.values())
+
+    @property
+    def throughput(self) -> float:
+        """The amount of jobs processed per minute, over the last minute."""
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW
+
+        while self._done_times and self._done_times[0] < cutoff:
+            self._done_times.popleft()
+
+        return len(self._done_times) * 60 / THROUGHPUT_WINDOW
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this queue."""
+        return {
+            'depth': f'{self.depth} now, {self.peak_depth} peak',
+            'processing': f'{len(self._busy)}/{self.workers}',
+            'jobs': f'{self.queued} queued, {self.resumed} resumed',
+            'processed': f'{self.processed} ({self.throughput:.1f}/min)',
+            'failures': f'{self.failures} ({self.dropped} given up on)',
+            'wait time': self.wait_times.summary,
+            'run time': self.run_times.summary,
+        }
+
+    async def start(self):
+        """Queue the jobs which weren't done when the bot stopped, and start the workers."""
+        for record in await queries.SUBMISSION_JOBS.fetch(self.db):
+            if record['message_id'] in self._jobs:
+                continue  # queued while the bot was starting
+
+            job = SubmissionJob(self.db, record)
+
+            if job.attempts >= self.max_attempts:
+                log.warning('Giving up on %r, it was tried too many times.', job)
+                await self._drop(job)
+                continue
+
+            self.resumed += 1
+            self._jobs[job.message_id] = job
+            await self._queue(job)
+
+        if self.resumed:
+            log.info('Resuming %d submissions.', self.resumed)
+
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers. Jobs being processed are resumed by the next :meth:`start`."""
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, message: discord.Message) -> bool:
+        """Queue a message, returning whether it wasn't queued already."""
+        record = await queries.QUEUE_SUBMISSION.fetchrow(self.db, message.id, message.channel.id, message.author.id)
+
+        if record is None:
+            return False
+
+        job = self._jobs[message.id] = SubmissionJob(self.db, record, message=message)
+
+        self.queued += 1
+        await self._queue(job)
+        return True
+
+    async def _queue(self, job: SubmissionJob):
+        job.queued_at = time.monotonic()
+
+        async with self._ready:
+            jobs = self._queued.setdefault(job.user_id, collections.deque())
+            jobs.append(job)
+
+            # users already waiting for their turn keep their place
+            if len(jobs) == 1 and job.user_id not in self._busy:
+                self._turns.append(job.user_id)
+
+            self.peak_depth = max(self.peak_depth, self.depth)
+            self._ready.notify()
+
+    async def _next(self) -> SubmissionJob:
+        async with self._ready:
+            await self._ready.wait_for(lambda: self._turns)
+
+            user_id = self._turns.popleft()
+            jobs = self._queued[user_id]
+            job = jobs.popleft()
+
+            if not jobs:
+                del self._queued[user_id]
+
+            self._busy.add(user_id)
+            return job
+
+    async def _finish(self, user_id: int):
+        async with self._ready:
+            self._busy.discard(user_id)
+
+            # the user goes to the back of the line
+            if user_id in self._queued:
+                self._turns.append(user_id)
+                self._ready.notify()
+
+    async def _work(self):
+        while True:
+            job = await self._next()
+
+            try:
+                await self._process(job)
+            except Exception:
+                # the job is still in the database, so it's picked up again by the next start
+                log.exception('Failed to give up on %r:', job)
+            finally:
+                await asyncio.shield(self._finish(job.user_id))
+
+    async def _process(self, job: SubmissionJob):
+        self.wait_times.add(time.monotonic() - job.queued_at)
+
+        try:
+            job.attempts = await queries.START_SUBMISSION.fetchval(self.db, job.message_id)
+
+            with Timer() as timer:
+                await self.handler(job)
+
+            self.run_times.add(timer.duration)
+            await queries.FINISH_SUBMISSION.execute(self.db, job.message_id)
+        except Exception:
+            self.failures += 1
+            log.exception('Failed to process %r:', job)
+
+            if job.attempts >= self.max_attempts:
+                await self._drop(job)
+            else:
+                asyncio.get_running_loop().call_later(
+                    self.retry_delay, lambda: asyncio.ensure_future(self._queue(job))
+                )
+
+            return
+
+        del self._jobs[job.message_id]
+        self.processed += 1
+        self._done_times.append(time.monotonic())
+
+    async def _drop(self, job: SubmissionJob):
+        self.dropped += 1
+        self._jobs.pop(job.message_id, None)
+        await queries.FINISH_SUBMISSION.execute(self.db, job.message_id)
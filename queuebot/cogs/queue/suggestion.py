@@ -1,10 +1,14 @@
 import datetime
 import enum
 import logging
+import typing
 
 import discord
 from discord.ext import commands
 
+from queuebot import queries
+from queuebot.cogs.queue.cache import SuggestionCache
+from queuebot.queries import COLUMNS
 from queuebot.utils import (COUNCIL_QUEUE_MSG_NOT_FOUND, SUBMITTER_NOT_FOUND, SUGGESTION_APPROVED, SUGGESTION_DENIED,
                             UPLOADED_EMOJI_NOT_FOUND, name_id)
 
@@ -14,12 +18,17 @@ log = logging.getLogger(__name__)
 class Suggestion:
     """A suggestion in a queue."""
 
+    __slots__ = COLUMNS
+
     #: The asyncpg pool.
     db = None
 
     #: The Discord bot instance.
     bot = None
 
+    #: Cache of recently used suggestions.
+    cache = SuggestionCache()
+
     class NotFound(Exception):
         """An exception thrown when a suggestion was not found."""
 
@@ -32,25 +41,79 @@ class Suggestion:
         def operator(self):
             return '+' if self is self.CAST else '-'
 
+        @property
+        def delta(self):
+            return 1 if self is self.CAST else -1
+
     class OperationError(Exception):
         pass
 
-    def __init__(self, record):
-        self.record = record
+    class Duplicate(Exception):
+        """An exception thrown when a suggestion is created for the same file as a pending or denied suggestion."""
+
+        def __init__(self, suggestion: 'Suggestion'):
+            super().__init__(f'The file was already suggested in {suggestion!r}.')
+            self.suggestion = suggestion
+
+    def __init__(self, record: typing.Mapping):
+        self._decode(record)
 
     def __repr__(self):
-        return '<Suggestion idx={0[idx]} user_id={0[user_id]} upvotes={0[upvotes]} downvotes={0[downvotes]}>' \
-            .format(self.record)
+        return f'<Suggestion idx={self.idx} user_id={self.user_id} upvotes={self.upvotes} downvotes={self.downvotes}>'
 
     def __eq__(self, other):
         return self.idx == other.idx
 
-    def __getattr__(self, name):
-        # allow fetching record columns by attribute access
-        try:
-            return self.record[name]
-        except KeyError:
-            raise AttributeError(name)
+    def _decode(self, record: typing.Mapping):
+        """Set the state of this suggestion from a database record. Columns missing from the record are set to None."""
+        get = record.get
+
+        self.idx: int = get('idx')
+        self.user_id: int = get('user_id')
+
+        self.council_message_id: typing.Optional[int] = get('council_message_id')
+        self.public_message_id: typing.Optional[int] = get('public_message_id')
+        self.suggestions_message_id: typing.Optional[int] = get('suggestions_message_id')
+
+        self.emoji_id: int = get('emoji_id')
+        self.emoji_name: str = get('emoji_name')
+        self.emoji_animated: typing.Optional[bool] = get('emoji_animated')
+
+        self.note: typing.Optional[str] = get('note')
+
+        self.upvotes: int = get('upvotes')
+        self.downvotes: int = get('downvotes')
+
+        self.submission_time: typing.Optional[datetime.datetime] = get('submission_time')
+        self.validation_time: typing.Optional[datetime.datetime] = get('validation_time')
+
+        self.council_approved: typing.Optional[bool] = get('council_approved')
+        self.forced_reason: typing.Optional[str] = get('forced_reason')
+        self.forced_by: typing.Optional[int] = get('forced_by')
+        self.revoked: typing.Optional[bool] = get('revoked')
+
+        # the dHash of the emoji, as a signed 64-bit integer
+        self.perceptual_hash: typing.Optional[int] = get('perceptual_hash')
+
+        # the SHA-256 of the emoji file, in hex
+        self.file_hash: typing.Optional[str] = get('file_hash')
+
+    def _update(self, record: typing.Mapping):
+        """Replace the state of this suggestion with a newer record, and cache it."""
+        self._decode(record)
+        self.cache.put(self)
+
+    def copy(self, **changes) -> 'Suggestion':
+        """Return a copy of this suggestion, with the given columns changed."""
+        suggestion = object.__new__(type(self))
+
+        for column in COLUMNS:
+            setattr(suggestion, column, getattr(self, column))
+
+        for column, value in changes.items():
+            setattr(suggestion, column, value)
+
+        return suggestion
 
     @property
     def is_in_public_queue(self):
@@ -60,6 +123,17 @@ class Suggestion:
     def is_denied(self):
         return self.council_approved is False  # do not accept None
 
+    @property
+    def outcome(self) -> typing.Optional[str]:
+        """How the suggestion left the council queue: approved, denied or revoked. None while it's still in there."""
+        if self.is_in_public_queue:
+            return 'approved'
+
+        if self.is_denied:
+            return 'revoked' if self.revoked else 'denied'
+
+        return None
+
     @property
     def is_animated(self):
         return self.emoji_animated is True
@@ -154,6 +228,8 @@ class Suggestion:
         Internally, the upvotes/downvotes column in the database is updated, and a vote check occurs.
         This method is also called for public queue votes, but we do not check those votes, only tally them.
 
+        Updating the tally, recording the council vote and checking the result happen in a single round trip.
+
         Parameters
         ----------
         vote_emoji : discord.PartialEmoji
@@ -170,38 +246,25 @@ class Suggestion:
             self, vote_emoji, vote_type.operator, message_id, who
         )
 
-        # Calculate the column to modify depending on which emoji was reacted with.
         approval = vote_emoji.id == self.bot.config.approve_emoji_id
-        vote_target = 'upvotes' if approval else 'downvotes'
-
-        await self.db.execute(
-            f"""
-            UPDATE suggestions
-            SET {vote_target} = {vote_target} {vote_type.operator} 1
-            WHERE idx = $1
-            """,
-            self.idx
+
+        record = await queries.PROCESS_VOTE.fetchrow(
+            self.db,
+            self.idx, approval, vote_type.delta, who, vote_type is vote_type.CAST,
+            self.bot.config.required_votes, self.bot.config.required_difference,
         )
-        await self.update_inplace()
 
-        if self.public_message_id is not None:
-            # don't keep track of individual votes for suggestions in the public
-            # queue.
-            return
+        if not record:
+            raise self.NotFound('Suggestion not found.')
 
-        column = "has_approved" if approval else "has_denied"
-        await self.db.execute(
-            f"""
-            INSERT INTO council_votes (suggestion_index, user_id, {column}) VALUES
-            ($1, $2, $3::BOOLEAN)
-            ON CONFLICT (suggestion_index, user_id)
-            DO UPDATE SET
-            {column} = $3::BOOLEAN
-            """,
-            self.idx, who, vote_type == vote_type.CAST
-        )
+        self._update(record)
+        log.debug('Applied vote to suggestion, verdict: %s. %s', record['verdict'], self)
 
-        await self.check_council_votes()
+        # The conclusion logic is identical to check_council_votes, but evaluated by Postgres.
+        if record['verdict'] == 'approve':
+            await self.move_to_public_queue()
+        elif record['verdict'] == 'deny':
+            await self.deny()
 
     async def delete_from_council_queue(self):
         """Deletes the voting message for this suggestion from the council queue."""
@@ -214,15 +277,10 @@ class Suggestion:
             await council_message.delete()
         except discord.HTTPException as error:
             await self.bot.log(COUNCIL_QUEUE_MSG_NOT_FOUND.format(
-                suggestion=self.record, error=error))
+                suggestion=self, error=error))
 
         # Set this suggestion's council queue message ID to null.
-        await self.db.execute("""
-            UPDATE suggestions
-            SET council_message_id = NULL
-            WHERE idx = $1
-        """, self.idx)
-        await self.update_inplace()
+        self._update(await queries.UNLINK_COUNCIL_MESSAGE.fetchrow(self.db, self.idx))
 
     async def move_to_public_queue(self, *, who=None, reason=None):
         """
@@ -255,10 +313,10 @@ class Suggestion:
         emoji = self.bot.get_emoji(self.emoji_id)
 
         if not user:
-            await self.bot.log(SUBMITTER_NOT_FOUND.format(action='move to approval queue', suggestion=self.record))
+            await self.bot.log(SUBMITTER_NOT_FOUND.format(action='move to approval queue', suggestion=self))
 
         if not emoji:
-            await self.bot.log(UPLOADED_EMOJI_NOT_FOUND.format(action='move to approval queue', suggestion=self.record))
+            await self.bot.log(UPLOADED_EMOJI_NOT_FOUND.format(action='move to approval queue', suggestion=self))
             return
 
         changelog = self.bot.get_channel(self.bot.config.council_changelog)
@@ -274,19 +332,8 @@ class Suggestion:
                 msg = await queue.send(emoji)
 
                 # then update the entry, including resetting the votes
-                await conn.execute(
-                    """
-                    UPDATE suggestions
-                    SET public_message_id = $1,
-                    council_approved = TRUE,
-                    forced_reason = $2,
-                    forced_by = $3,
-                    validation_time = $4,
-                    upvotes = 0,
-                    downvotes = 0
-                    WHERE idx = $5
-                    """,
-                    msg.id, reason, who, datetime.datetime.utcnow(), self.idx
+                await queries.MOVE_TO_PUBLIC_QUEUE.execute(
+                    conn, msg.id, reason, who, datetime.datetime.utcnow(), self.idx
                 )
 
                 # delete from suggestions channel
@@ -351,27 +398,16 @@ class Suggestion:
         emoji = self.bot.get_emoji(self.emoji_id)
 
         if not emoji:
-            await self.bot.log(UPLOADED_EMOJI_NOT_FOUND.format(action='deny', suggestion=self.record))
+            await self.bot.log(UPLOADED_EMOJI_NOT_FOUND.format(action='deny', suggestion=self))
             # this is NOT an operation error
             raise RuntimeError("Error denying emoji: the uploaded emoji was not found.")
 
         if not user:
-            await self.bot.log(SUBMITTER_NOT_FOUND.format(action='deny', suggestion=self.record))
-
-        await self.db.execute(
-            """
-            UPDATE suggestions
-            SET council_approved = FALSE,
-            forced_reason = $1,
-            forced_by = $2,
-            validation_time = $3,
-            revoked = $4::BOOLEAN
-            WHERE idx = $5
-            """,
-            reason, who, datetime.datetime.utcnow(), revoke, self.idx
-        )
+            await self.bot.log(SUBMITTER_NOT_FOUND.format(action='deny', suggestion=self))
 
-        await self.update_inplace()
+        self._update(await queries.DENY_SUGGESTION.fetchrow(
+            self.db, reason, who, datetime.datetime.utcnow(), revoke, self.idx
+        ))
 
         changelog = self.bot.get_channel(self.bot.config.council_changelog)
 
@@ -432,16 +468,13 @@ class Suggestion:
 
     async def update_inplace(self):
         """Updat the internal state of this suggestion from Postgres."""
-        self.record = await self.db.fetchrow(
-            'SELECT * FROM suggestions WHERE idx = $1',
-            self.idx,
-        )
+        self._update(await queries.GET_SUGGESTION.fetchrow(self.db, self.idx))
         log.debug('Updated suggestion inplace. %s', self)
 
     async def update_note(self, note):
         """Update the suggestion note and council queue message if it exists."""
 
-        await self.db.execute('UPDATE suggestions SET note = $1 WHERE idx = $2', note, self.idx)
+        self._update(await queries.UPDATE_NOTE.fetchrow(self.db, note, self.idx))
 
         if self.is_in_public_queue:
             return
@@ -449,25 +482,103 @@ class Suggestion:
         channel = self.bot.get_channel(self.bot.config.council_queue)
         message = await channel.fetch_message(self.council_message_id)
 
-        embed = discord.Embed(title=f'Suggestion {self.idx}', description=f'{note}\nBy <@!{self.user_id}>')
+        # keeps the fields of the embed, like the suggestions it looks similar to
+        embed = message.embeds[0] if message.embeds else discord.Embed(title=f'Suggestion {self.idx}')
+        embed.description = f'{note}\nBy <@!{self.user_id}>'
         await message.edit(embed=embed)
 
+    async def set_council_message(self, message_id: int):
+        """Set the message in the council queue that is used to vote on this suggestion."""
+        self._update(await queries.SET_COUNCIL_MESSAGE.fetchrow(self.db, message_id, self.idx))
+
+    @classmethod
+    async def create(cls, *, user_id: int, emoji_id: int, emoji_name: str, submission_time: datetime.datetime,
+                     suggestions_message_id: int, emoji_animated: bool, note: str = None,
+                     perceptual_hash: int = None, file_hash: str = None) -> 'Suggestion':
+        """
+        Create a new suggestion from a message in the suggestions channel.
+
+        Suggestions of the same file are created one at a time, so that the file is checked against every suggestion
+        created before it. Raises :class:`Suggestion.Duplicate` if it's the same file as a pending or denied (but not
+        revoked) suggestion.
+        """
+
+        async with cls.db.acquire() as conn:
+            async with conn.transaction():
+                if file_hash is not None:
+                    # held until the suggestion has been committed
+                    await queries.LOCK_FILE_HASH.execute(conn, file_hash)
+
+                    duplicate = await queries.GET_DUPLICATE_SUGGESTION.fetchrow(conn, file_hash)
+                    if duplicate:
+                        raise cls.Duplicate(cls(duplicate))
+
+                record = await queries.CREATE_SUGGESTION.fetchrow(
+                    conn,
+                    user_id,
+                    emoji_id,
+                    emoji_name,
+                    submission_time,
+                    suggestions_message_id,
+                    emoji_animated,
+                    note,
+                    perceptual_hash,
+                    file_hash,
+                )
+
+        suggestion = cls(record)
+        cls.cache.put(suggestion)
+        return suggestion
+
     @classmethod
     async def get_from_id(cls, suggestion_id: int) -> 'Suggestion':
         """Fetch a Suggestion from ID. Raises if not found."""
 
-        record = await cls.db.fetchrow(
-            """
-            SELECT * FROM suggestions
-            WHERE idx = $1
-            """,
-            suggestion_id
-        )
+        suggestion = cls.cache.get(suggestion_id)
+        if suggestion is not None:
+            return suggestion
+
+        record = await queries.GET_SUGGESTION.fetchrow(cls.db, suggestion_id)
 
         if not record:
             raise cls.NotFound('Suggestion not found.')
 
-        return cls(record)
+        suggestion = cls(record)
+        cls.cache.put(suggestion)
+        return suggestion
+
+    @classmethod
+    async def get_many(cls, suggestion_ids: typing.Sequence[int]) -> typing.Dict[int, 'Suggestion']:
+        """Fetch Suggestions by their IDs, those which aren't cached in a single query. Missing ones are left out."""
+        suggestions = {}
+
+        for suggestion_id in suggestion_ids:
+            suggestion = cls.cache.get(suggestion_id)
+            if suggestion is not None:
+                suggestions[suggestion_id] = suggestion
+
+        missing = [suggestion_id for suggestion_id in suggestion_ids if suggestion_id not in suggestions]
+        if not missing:
+            return suggestions
+
+        for record in await queries.GET_SUGGESTIONS.fetch(cls.db, missing):
+            suggestion = cls(record)
+            cls.cache.put(suggestion)
+            suggestions[suggestion.idx] = suggestion
+
+        return suggestions
+
+    @classmethod
+    async def get_duplicate(cls, file_hash: str) -> typing.Optional['Suggestion']:
+        """Fetch the latest pending or denied (but not revoked) suggestion of the same file, if there is one."""
+        record = await queries.GET_DUPLICATE_SUGGESTION.fetchrow(cls.db, file_hash)
+
+        if not record:
+            return None
+
+        suggestion = cls(record)
+        cls.cache.put(suggestion)
+        return suggestion
 
     @classmethod
     async def get_from_message(cls, message_id: int) -> 'Suggestion':
@@ -477,18 +588,22 @@ class Suggestion:
         Raises if not found.
         """
 
-        record = await cls.db.fetchrow(
-            """
-            SELECT * FROM suggestions
-            WHERE suggestions_message_id = $1 OR council_message_id = $1 OR public_message_id = $1
-            """,
-            message_id,
-        )
+        suggestion = cls.cache.get_by_message(message_id)
+        if suggestion is not None:
+            return suggestion
+
+        if cls.cache.is_missing(message_id):
+            raise cls.NotFound('Suggestion not found.')
+
+        record = await queries.GET_SUGGESTION_BY_MESSAGE.fetchrow(cls.db, message_id)
 
         if not record:
+            cls.cache.mark_missing(message_id)
             raise cls.NotFound('Suggestion not found.')
 
-        return cls(record)
+        suggestion = cls(record)
+        cls.cache.put(suggestion)
+        return suggestion
 
     @classmethod
     async def convert(cls, _ctx, argument: str):
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import typing
+
+from queuebot import queries
+from queuebot.cogs.queue.suggestion import Suggestion
+from queuebot.utils import Timer
+
+log = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """
+    Collects votes on suggestions and writes them to the database in batches.
+
+    Votes are added to the buffer as they come in, and written in a single statement once the buffer has been
+    collecting for ``delay`` seconds. Votes which cancel each other out within that window never reach the database.
+
+    This is only meant for votes which are tallied, but don't need to be checked (the approval queue).
+    """
+
+    def __init__(self, db, *, delay: float = 2.0):
+        self.db = db
+        self.delay = delay
+
+        # suggestion idx -> [upvotes, downvotes] which haven't been written yet
+        self._pending: typing.Dict[int, typing.List[int]] = {}
+        self._flush_task: typing.Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.votes: int = 0
+        self.flushes: int = 0
+        self.flushed_suggestions: int = 0
+        self.largest_batch: int = 0
+        self.flush_time: float = 0.0
+        self.longest_flush: float = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def stats(self) -> typing.Dict[str, str]:
+        """Human-friendly statistics of this buffer."""
+        average_batch = self.flushed_suggestions / self.flushes if self.flushes else 0.0
+        average_flush = self.flush_time / self.flushes if self.flushes else 0.0
+
+        return {
+            'votes buffered': str(self.votes),
+            'pending suggestions': str(len(self)),
+            'flushes': str(self.flushes),
+            'batch size': f'{average_batch:.1f} avg, {self.largest_batch} max',
+            'flush latency': f'{average_flush * 1000:.2f}ms avg, {self.longest_flush * 1000:.2f}ms max',
+        }
+
+    def add(self, idx: int, approval: bool, delta: int):
+        """Add a vote for a suggestion to the buffer."""
+        pending = self._pending.setdefault(idx, [0, 0])
+        pending[0 if approval else 1] += delta
+
+        self.votes += 1
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._flush_task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            log.exception('Failed to flush votes, retrying later:')
+
+            if self._pending and self._flush_task is None:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def flush(self):
+        """Write all buffered votes to the database."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+
+            # skip suggestions where the votes cancelled each other out
+            pending = {idx: votes for idx, votes in pending.items() if any(votes)}
+            if not pending:
+                return
+
+            try:
+                with Timer() as timer:
+                    records = await queries.FLUSH_VOTES.fetch(
+                        self.db,
+                        list(pending),
+                        [upvotes for upvotes, _ in pending.values()],
+                        [downvotes for _, downvotes in pending.values()],
+                    )
+            except Exception:
+                # put the votes back, so they aren't lost
+                for idx, (upvotes, downvotes) in pending.items():
+                    votes = self._pending.setdefault(idx, [0, 0])
+                    votes[0] += upvotes
+                    votes[1] += downvotes
+                raise
+
+            for record in records:
+                Suggestion.cache.put(Suggestion(record))
+
+            self.flushes += 1
+            self.flushed_suggestions += len(pending)
+            self.largest_batch = max(self.largest_batch, len(pending))
+            self.flush_time += timer.duration
+            self.longest_flush = max(self.longest_flush, timer.duration)
+
+            log.debug('Flushed votes for %d suggestions in %s.', len(pending), timer)
+
+    async def close(self):
+        """Stop waiting for more votes and write everything that is buffered."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            log.exception('Failed to flush votes on close, votes for %d suggestions were lost:', len(self))
@@ -0,0 +1,43 @@
+"""
+Versioned database migrations.
+
+``schema.sql`` always describes the full, current schema and is used to set up new databases. Changes to the schema
+of existing databases are made by the files in the ``migrations`` directory, which are named like
+``0001_description.sql`` and applied in order. Which migrations have been applied is recorded in the database.
+"""
+
+__all__ = ['migrate']
+
+import logging
+from pathlib import Path
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIRECTORY = Path(__file__).resolve().parent.parent / 'migrations'
+
+
+async def migrate(db: asyncpg.Pool, directory: Path = MIGRATIONS_DIRECTORY):
+    """Apply all migrations which haven't been applied to the database yet."""
+    async with db.acquire() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+            )
+        """)
+
+        applied = {record['version'] for record in await conn.fetch('SELECT version FROM schema_migrations')}
+
+        for file in sorted(directory.glob('*.sql')):
+            version = file.stem
+
+            if version in applied:
+                continue
+
+            logger.info('Applying migration %s.', version)
+
+            async with conn.transaction():
+                await conn.execute(file.read_text())
+                await conn.execute('INSERT INTO schema_migrations (version) VALUES ($1)', version)
@@ -0,0 +1,392 @@
+"""
+Every SQL statement used by the queue.
+
+Statements are declared once in this module, and run like ``await queries.GET_SUGGESTION.fetchrow(db, idx)``, where
+``db`` is the pool or an acquired connection. Each statement is prepared the first time it's run on a connection, and
+kept in asyncpg's statement cache of the connection, so that running it again skips parsing and planning.
+
+Queries are never built by formatting values into them, so that every statement has exactly one text.
+
+Each statement keeps track of how often it was run and how long that took.
+"""
+
+__all__ = ['Statement', 'create_pool', 'STATEMENTS', 'COLUMNS', 'SELECT_COLUMNS']
+
+import typing
+
+import asyncpg
+
+from queuebot.utils import Timer
+
+#: All statements, by name.
+STATEMENTS: typing.Dict[str, 'Statement'] = {}
+
+
+class Statement:
+    """A SQL statement, which is prepared once per connection."""
+
+    def __init__(self, name: str, query: str):
+        if name in STATEMENTS:
+            raise ValueError(f'A statement named {name!r} already exists.')
+
+        self.name = name
+        self.query = query
+
+        self.calls: int = 0
+        self.failures: int = 0
+        self.total_time: float = 0.0
+        self.max_time: float = 0.0
+
+        STATEMENTS[name] = self
+
+    def __repr__(self):
+        return f'<Statement name={self.name!r} calls={self.calls}>'
+
+    @property
+    def stats(self) -> str:
+        """A human-friendly summary of the runs of this statement."""
+        average = self.total_time / self.calls if self.calls else 0.0
+        summary = f'{self.calls} calls, {average * 1000:.2f}ms avg, {self.max_time * 1000:.2f}ms max'
+
+        if self.failures:
+            summary += f', {self.failures} failed'
+
+        return summary
+
+    async def fetch(self, db, *args) -> typing.List[asyncpg.Record]:
+        return await self._run(db.fetch, args)
+
+    async def fetchrow(self, db, *args) -> typing.Optional[asyncpg.Record]:
+        return await self._run(db.fetchrow, args)
+
+    async def fetchval(self, db, *args):
+        return await self._run(db.fetchval, args)
+
+    async def execute(self, db, *args) -> str:
+        """Run this statement, returning its status (like ``UPDATE 1``)."""
+        return await self._run(db.execute, args)
+
+    async def _run(self, method, args):
+        timer = Timer()
+
+        try:
+            with timer:
+                return await method(self.query, *args)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.calls += 1
+            self.total_time += timer.duration
+            self.max_time = max(self.max_time, timer.duration)
+
+
+async def create_pool(**credentials) -> asyncpg.Pool:
+    """Create the connection pool the statements are run on."""
+    return await asyncpg.create_pool(**credentials)
+
+
+def stats() -> typing.Dict[str, str]:
+    """Human-friendly statistics of the statements that have been run, slowest (in total) first."""
+    statements = sorted(STATEMENTS.values(), key=lambda statement: statement.total_time, reverse=True)
+    return {statement.name: statement.stats for statement in statements if statement.calls}
+
+
+#: The columns of the suggestions table that make up a suggestion.
+COLUMNS = (
+    'idx',
+    'user_id',
+    'council_message_id',
+    'public_message_id',
+    'suggestions_message_id',
+    'emoji_id',
+    'emoji_name',
+    'emoji_animated',
+    'note',
+    'upvotes',
+    'downvotes',
+    'submission_time',
+    'validation_time',
+    'council_approved',
+    'forced_reason',
+    'forced_by',
+    'revoked',
+    'perceptual_hash',
+    'file_hash',
+)
+
+#: Column list for selecting a full suggestion.
+SELECT_COLUMNS = ', '.join(f'suggestions.{column}' for column in COLUMNS)
+
+
+# Suggestions
+
+GET_SUGGESTION = Statement('get_suggestion', f"""
+    SELECT {SELECT_COLUMNS} FROM suggestions
+    WHERE idx = $1
+""")
+
+GET_SUGGESTIONS = Statement('get_suggestions', f"""
+    SELECT {SELECT_COLUMNS} FROM suggestions
+    WHERE idx = ANY($1::INT[])
+""")
+
+GET_SUGGESTION_BY_MESSAGE = Statement('get_suggestion_by_message', f"""
+    SELECT {SELECT_COLUMNS} FROM suggestion_messages
+    INNER JOIN suggestions ON suggestions.idx = suggestion_messages.suggestion_idx
+    WHERE suggestion_messages.message_id = $1
+""")
+
+CREATE_SUGGESTION = Statement('create_suggestion', f"""
+    WITH created AS (
+        INSERT INTO suggestions (
+            user_id,
+            emoji_id,
+            emoji_name,
+            submission_time,
+            suggestions_message_id,
+            emoji_animated,
+            note,
+            perceptual_hash,
+            file_hash
+        )
+        VALUES (
+            $1, $2, $3, $4 AT TIME ZONE 'UTC', $5, $6, $7, $8, $9
+        )
+        RETURNING {SELECT_COLUMNS}
+    ), linked AS (
+        INSERT INTO suggestion_messages (message_id, suggestion_idx, kind)
+        SELECT suggestions_message_id, idx, 'suggestions' FROM created
+        ON CONFLICT (message_id) DO NOTHING
+    )
+    SELECT * FROM created
+""")
+
+# Tally the vote, record it for council votes and find out whether a verdict has been reached in one statement, so
+# that the suggestion can't change in between these steps.
+PROCESS_VOTE = Statement('process_vote', f"""
+    WITH updated AS (
+        UPDATE suggestions
+        SET upvotes = upvotes + CASE WHEN $2::BOOLEAN THEN $3::INT ELSE 0 END,
+        downvotes = downvotes + CASE WHEN $2::BOOLEAN THEN 0 ELSE $3::INT END
+        WHERE idx = $1
+        RETURNING {SELECT_COLUMNS}
+    ), council_vote AS (
+        -- don't keep track of individual votes for suggestions in the public queue
+        INSERT INTO council_votes (suggestion_index, user_id, has_approved, has_denied)
+        SELECT idx, $4, $2::BOOLEAN AND $5::BOOLEAN, NOT $2::BOOLEAN AND $5::BOOLEAN
+        FROM updated
+        WHERE public_message_id IS NULL
+        ON CONFLICT (suggestion_index, user_id)
+        DO UPDATE SET
+        has_approved = CASE WHEN $2::BOOLEAN THEN $5::BOOLEAN ELSE council_votes.has_approved END,
+        has_denied = CASE WHEN $2::BOOLEAN THEN council_votes.has_denied ELSE $5::BOOLEAN END
+    )
+    SELECT updated.*, CASE
+        WHEN public_message_id IS NOT NULL OR council_approved IS NOT NULL THEN NULL
+        WHEN upvotes + downvotes < $6 THEN NULL
+        WHEN upvotes - downvotes >= $7 THEN 'approve'
+        WHEN downvotes - upvotes >= $7 THEN 'deny'
+    END AS verdict
+    FROM updated
+""")
+
+SET_COUNCIL_MESSAGE = Statement('set_council_message', f"""
+    WITH updated AS (
+        UPDATE suggestions
+        SET council_message_id = $1
+        WHERE idx = $2
+        RETURNING {SELECT_COLUMNS}
+    ), linked AS (
+        INSERT INTO suggestion_messages (message_id, suggestion_idx, kind)
+        SELECT council_message_id, idx, 'council' FROM updated
+        ON CONFLICT (message_id) DO NOTHING
+    )
+    SELECT * FROM updated
+""")
+
+UNLINK_COUNCIL_MESSAGE = Statement('unlink_council_message', f"""
+    WITH unlinked AS (
+        DELETE FROM suggestion_messages
+        WHERE suggestion_idx = $1 AND kind = 'council'
+    )
+    UPDATE suggestions
+    SET council_message_id = NULL
+    WHERE idx = $1
+    RETURNING {SELECT_COLUMNS}
+""")
+
+MOVE_TO_PUBLIC_QUEUE = Statement('move_to_public_queue', """
+    WITH updated AS (
+        UPDATE suggestions
+        SET public_message_id = $1,
+        council_approved = TRUE,
+        forced_reason = $2,
+        forced_by = $3,
+        validation_time = $4,
+        upvotes = 0,
+        downvotes = 0
+        WHERE idx = $5
+        RETURNING idx, public_message_id
+    )
+    INSERT INTO suggestion_messages (message_id, suggestion_idx, kind)
+    SELECT public_message_id, idx, 'public' FROM updated
+    ON CONFLICT (message_id) DO NOTHING
+""")
+
+DENY_SUGGESTION = Statement('deny_suggestion', f"""
+    UPDATE suggestions
+    SET council_approved = FALSE,
+    forced_reason = $1,
+    forced_by = $2,
+    validation_time = $3,
+    revoked = $4::BOOLEAN
+    WHERE idx = $5
+    RETURNING {SELECT_COLUMNS}
+""")
+
+UPDATE_NOTE = Statement('update_note', f"""
+    UPDATE suggestions SET note = $1 WHERE idx = $2 RETURNING {SELECT_COLUMNS}
+""")
+
+GET_DUPLICATE_SUGGESTION = Statement('get_duplicate_suggestion', f"""
+    SELECT {SELECT_COLUMNS} FROM suggestions
+    WHERE file_hash = $1
+    AND (council_approved IS NULL OR (council_approved = FALSE AND revoked IS NOT TRUE))
+    ORDER BY idx DESC
+    LIMIT 1
+""")
+
+# Taken by every transaction which creates a suggestion of a file, until it ends. Checking for a duplicate of the file
+# and creating the suggestion can't be interleaved with another suggestion of the same file being created that way.
+LOCK_FILE_HASH = Statement('lock_file_hash', """
+    SELECT pg_advisory_xact_lock(hashtext($1))
+""")
+
+MISSING_HASHES = Statement('missing_hashes', f"""
+    SELECT {SELECT_COLUMNS} FROM suggestions
+    WHERE perceptual_hash IS NULL AND emoji_id IS NOT NULL AND idx > $1
+    ORDER BY idx
+    LIMIT $2
+""")
+
+SET_HASHES = Statement('set_hashes', """
+    UPDATE suggestions
+    SET perceptual_hash = COALESCE(suggestions.perceptual_hash, hashes.perceptual_hash)
+    FROM unnest($1::INT[], $2::BIGINT[]) AS hashes (idx, perceptual_hash)
+    WHERE suggestions.idx = hashes.idx
+""")
+
+PERCEPTUAL_HASHES = Statement('perceptual_hashes', """
+    SELECT idx, perceptual_hash FROM suggestions
+    WHERE perceptual_hash IS NOT NULL
+""")
+
+PENDING_SUGGESTIONS_BY_USER = Statement('pending_suggestions_by_user', """
+    SELECT idx, emoji_name, submission_time FROM suggestions
+    WHERE user_id = $1 AND council_approved IS NULL
+""")
+
+RECENT_SUGGESTIONS = Statement('recent_suggestions', """
+    SELECT idx, user_id, emoji_name, upvotes, downvotes, council_approved FROM suggestions
+    ORDER BY idx DESC
+    LIMIT $1
+""")
+
+# Votes
+
+FLUSH_VOTES = Statement('flush_votes', f"""
+    UPDATE suggestions
+    SET upvotes = suggestions.upvotes + delta.upvotes,
+    downvotes = suggestions.downvotes + delta.downvotes
+    FROM unnest($1::INT[], $2::INT[], $3::INT[]) AS delta (idx, upvotes, downvotes)
+    WHERE suggestions.idx = delta.idx
+    RETURNING {SELECT_COLUMNS}
+""")
+
+COUNCIL_VOTES = Statement('council_votes', """
+    SELECT suggestion_index, user_id, has_approved, has_denied, vote_time FROM council_votes
+    WHERE $1::BIGINT IN (suggestion_index::BIGINT, user_id) AND TRUE IN (has_approved, has_denied)
+    ORDER BY vote_time DESC
+    LIMIT 20
+""")
+
+# Vote reconciliation
+
+GET_QUEUE_MESSAGES = Statement('get_queue_messages', """
+    SELECT suggestion_messages.message_id, suggestion_messages.kind, idx, upvotes, downvotes
+    FROM suggestion_messages
+    INNER JOIN suggestions ON suggestions.idx = suggestion_messages.suggestion_idx
+    WHERE suggestion_messages.message_id = ANY($1::BIGINT[])
+    AND kind IN ('council', 'public')
+""")
+
+SET_TALLIES = Statement('set_tallies', f"""
+    UPDATE suggestions
+    SET upvotes = tally.upvotes, downvotes = tally.downvotes
+    FROM unnest($1::INT[], $2::INT[], $3::INT[]) AS tally (idx, upvotes, downvotes)
+    WHERE suggestions.idx = tally.idx
+    AND (suggestions.upvotes, suggestions.downvotes) IS DISTINCT FROM (tally.upvotes, tally.downvotes)
+    RETURNING {SELECT_COLUMNS}
+""")
+
+# votes of users who no longer have a reaction
+REVOKE_MISSING_COUNCIL_VOTES = Statement('revoke_missing_council_votes', """
+    UPDATE council_votes
+    SET has_approved = FALSE, has_denied = FALSE
+    WHERE suggestion_index = ANY($1::INT[])
+    AND (has_approved OR has_denied)
+    AND (suggestion_index, user_id) NOT IN (SELECT * FROM unnest($2::INT[], $3::BIGINT[]))
+""")
+
+SET_COUNCIL_VOTES = Statement('set_council_votes', """
+    INSERT INTO council_votes (suggestion_index, user_id, has_approved, has_denied)
+    SELECT * FROM unnest($1::INT[], $2::BIGINT[], $3::BOOLEAN[], $4::BOOLEAN[])
+    ON CONFLICT (suggestion_index, user_id)
+    DO UPDATE SET
+    has_approved = EXCLUDED.has_approved,
+    has_denied = EXCLUDED.has_denied
+    WHERE (council_votes.has_approved, council_votes.has_denied)
+    IS DISTINCT FROM (EXCLUDED.has_approved, EXCLUDED.has_denied)
+""")
+
+# Submission jobs
+
+QUEUE_SUBMISSION = Statement('queue_submission', """
+    INSERT INTO submission_jobs (message_id, channel_id, user_id)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (message_id) DO NOTHING
+    RETURNING *
+""")
+
+SUBMISSION_JOBS = Statement('submission_jobs', """
+    SELECT * FROM submission_jobs ORDER BY message_id
+""")
+
+START_SUBMISSION = Statement('start_submission', """
+    UPDATE submission_jobs SET attempts = attempts + 1 WHERE message_id = $1 RETURNING attempts
+""")
+
+SET_SUBMISSION_EMOJI = Statement('set_submission_emoji', """
+    UPDATE submission_jobs SET emoji_id = $2 WHERE message_id = $1
+""")
+
+SUBMISSION_STEP_DONE = Statement('submission_step_done', """
+    UPDATE submission_jobs SET done = array_append(done, $2) WHERE message_id = $1
+""")
+
+FINISH_SUBMISSION = Statement('finish_submission', """
+    DELETE FROM submission_jobs WHERE message_id = $1
+""")
+
+# Catching up with the suggestions channel
+
+NEWEST_SUGGESTIONS_MESSAGE = Statement('newest_suggestions_message', """
+    SELECT max(suggestions_message_id) FROM suggestions
+""")
+
+KNOWN_SUGGESTIONS_MESSAGES = Statement('known_suggestions_messages', """
+    SELECT suggestions_message_id AS message_id FROM suggestions WHERE suggestions_message_id = ANY($1::BIGINT[])
+    UNION
+    SELECT message_id FROM submission_jobs WHERE message_id = ANY($1::BIGINT[])
+""")
@@ -2,7 +2,10 @@
 
 from time import monotonic as _monotonic
 
+from .bktree import *  # noqa: ignore=F401
 from .formatting import *  # noqa: ignore=F401
+from .histogram import *  # noqa: ignore=F401
+from .locks import *  # noqa: ignore=F401
 from .messages import *  # noqa: ignore=F401
 
 
@@ -0,0 +1,94 @@
+"""Nearest neighbour search over hashes."""
+
+__all__ = ['BKTree', 'hamming_distance']
+
+from typing import Dict, Generic, Hashable, List, Tuple, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """The amount of bits two non-negative integers differ in."""
+    return bin(a ^ b).count('1')
+
+
+class _Node:
+    __slots__ = ('key', 'values', 'children')
+
+    def __init__(self, key: int):
+        self.key = key
+        self.values: List = []
+
+        # distance to this node -> child
+        self.children: Dict[int, '_Node'] = {}
+
+
+class BKTree(Generic[T]):
+    """
+    A Burkhard-Keller tree of integer hashes, compared by their Hamming distance.
+
+    Finding all hashes within a small distance of another one only visits the branches which can hold them, rather
+    than comparing against every hash. Values are stored with the hash they were added with, and several values can
+    share a hash.
+
+    Usage::
+
+        tree = BKTree()
+        tree.add(0b1011, 'a')
+        tree.search(0b1001, 1)  # [(1, 'a')]
+    """
+
+    def __init__(self):
+        self._root: _Node = None
+        self._size: int = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key: int, value: T):
+        """Add a value with its hash."""
+        self._size += 1
+
+        if self._root is None:
+            self._root = _Node(key)
+            self._root.values.append(value)
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(key, node.key)
+
+            if distance == 0:
+                node.values.append(value)
+                return
+
+            child = node.children.get(distance)
+            if child is None:
+                child = node.children[distance] = _Node(key)
+                child.values.append(value)
+                return
+
+            node = child
+
+    def search(self, key: int, max_distance: int) -> List[Tuple[int, T]]:
+        """Find the values with a hash at most ``max_distance`` bits from ``key``, as (distance, value) pairs."""
+        if self._root is None:
+            return []
+
+        found = []
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(key, node.key)
+
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node.values)
+
+            # by the triangle inequality, matches can only be below children this far from the node
+            for child_distance, child in node.children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        found.sort(key=lambda match: match[0])
+        return found
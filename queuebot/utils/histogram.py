@@ -0,0 +1,69 @@
+"""Latency histograms."""
+
+__all__ = ['Histogram']
+
+import bisect
+from typing import Sequence
+
+#: The default bucket bounds, in seconds.
+BOUNDS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format(seconds: float) -> str:
+    return f'{seconds * 1000:.0f}ms' if seconds < 1 else f'{seconds:.3g}s'
+
+
+class Histogram:
+    """
+    Counts durations in buckets with fixed upper bounds, plus one for everything longer than the last bound.
+
+    Percentiles are read from the buckets, so they are reported as the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, bounds: Sequence[float] = BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration: float):
+        """Count a duration, in seconds."""
+        self.counts[bisect.bisect_left(self.bounds, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, fraction: float) -> float:
+        """The upper bound of the bucket which the given fraction of durations fall in or under."""
+        if not self.count:
+            return 0.0
+
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(bound, self.max)
+
+        return self.max
+
+    @property
+    def summary(self) -> str:
+        """The average, median, 90th and 99th percentile and longest duration."""
+        average = self.total / self.count if self.count else 0.0
+
+        return (
+            f'{_format(average)} avg, p50 {_format(self.percentile(0.5))}, p90 {_format(self.percentile(0.9))}, '
+            f'p99 {_format(self.percentile(0.99))}, max {_format(self.max)}'
+        )
+
+    def __str__(self):
+        buckets = [
+            f'≤{_format(bound)}: {count}' for bound, count in zip(self.bounds, self.counts) if count
+        ]
+
+        if self.counts[-1]:
+            buckets.append(f'>{_format(self.bounds[-1])}: {self.counts[-1]}')
+
+        return ', '.join(buckets) or 'empty'
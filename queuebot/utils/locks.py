@@ -0,0 +1,104 @@
+"""Locking utilities."""
+
+__all__ = ['KeyedLock']
+
+import asyncio
+import contextlib
+from time import monotonic as _monotonic
+from typing import Dict, Hashable, List
+
+
+class KeyedLock:
+    """
+    A registry of :class:`asyncio.Lock` objects, one per key.
+
+    Locks are created on demand the first time a key is acquired and dropped again as soon as nobody holds or waits
+    on them, so the registry only ever holds locks for keys which are in use. Waiters for the same key are woken up
+    in the order they started waiting.
+
+    Usage::
+
+        locks = KeyedLock()
+
+        async with locks(suggestion.idx):
+            ...
+    """
+
+    def __init__(self):
+        # key -> [lock, number of tasks holding or waiting on the lock]
+        self._entries: Dict[Hashable, List] = {}
+
+        #: How often a lock has been acquired.
+        self.acquisitions: int = 0
+
+        #: How often a lock was already held by someone else when trying to acquire it.
+        self.contentions: int = 0
+
+        #: Total and longest time spent waiting for a held lock, in seconds.
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+        #: The highest amount of keys that have been in use at once.
+        self.peak_keys: int = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def locked(self, key: Hashable) -> bool:
+        """Return whether the lock for a key is currently held."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0].locked()
+
+    @property
+    def stats(self) -> Dict[str, str]:
+        """Human-friendly contention statistics of this registry."""
+        rate = self.contentions / self.acquisitions if self.acquisitions else 0.0
+        average = self.total_wait / self.contentions if self.contentions else 0.0
+
+        return {
+            'acquisitions': str(self.acquisitions),
+            'contended': f'{self.contentions} ({rate:.1%})',
+            'average wait': f'{average * 1000:.2f}ms',
+            'longest wait': f'{self.max_wait * 1000:.2f}ms',
+            'keys in use': f'{len(self)} (peak {self.peak_keys})',
+        }
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key: Hashable):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0]
+            self.peak_keys = max(self.peak_keys, len(self._entries))
+
+        lock = entry[0]
+        entry[1] += 1
+
+        try:
+            if lock.locked():
+                self.contentions += 1
+
+                begin = _monotonic()
+                await lock.acquire()
+                waited = _monotonic() - begin
+
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            else:
+                await lock.acquire()
+
+            self.acquisitions += 1
+
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+
+            # reclaim the lock once nobody is using it anymore
+            if not entry[1]:
+                del self._entries[key]
@@ -8,23 +8,24 @@ __all__ = (
     'SUGGESTION_APPROVED',
     'SUGGESTION_DENIED',
     'SUGGESTION_TOO_LARGE',
+    'SUGGESTION_DUPLICATE',
     'UPLOADED_EMOJI_NOT_FOUND',
     'SUBMITTER_NOT_FOUND'
 )
 
 COUNCIL_QUEUE_MSG_NOT_FOUND = (
     "\N{WARNING SIGN} Couldn't delete the associated council queue message "
-    "(ID: `{suggestion[council_message_id]}`) for {suggestion[idx]}: {error}"
+    "(ID: `{suggestion.council_message_id}`) for {suggestion.idx}: {error}"
 )
 
 UPLOADED_EMOJI_NOT_FOUND = (
     "\N{WARNING SIGN} Cannot {action}, the uploaded emoji associated with this suggestion wasn't found. "
-    "(Suggestion ID: {suggestion[idx]})"
+    "(Suggestion ID: {suggestion.idx})"
 )
 
 SUBMITTER_NOT_FOUND = (
     "\N{WARNING SIGN} Warning during {action}: the user associated with this suggestion wasn't found. "
-    "Proceeding anyways. (Suggestion ID: {suggestion[idx]}, user ID: {suggestion[user_id]})"
+    "Proceeding anyways. (Suggestion ID: {suggestion.idx}, user ID: {suggestion.user_id})"
 )
 
 BAD_SUGGESTION_MSG = (
@@ -45,6 +46,13 @@ SUGGESTION_TOO_LARGE = (
     'and we\'ll be able to review it for you.'
 )
 
+SUGGESTION_DUPLICATE = (
+    'Hey there! Looks like you tried to submit an emoji, but the exact same '
+    'file was already suggested as {suggestion}, which is {state}. '
+    'If you\'d like it to be looked at again, please change it first and '
+    'then submit it again.'
+)
+
 SUGGESTION_RECEIVED = (
     'Thanks for your emoji submission ({suggestion}) to the '
     'Blob Emoji Server! It\'s been added to our internal vote queue, '
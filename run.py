@@ -8,6 +8,8 @@ import discord
 
 from queuebot.bot import Queuebot
 from queuebot.config import config_from_file
+from queuebot.migrations import migrate
+from queuebot.queries import create_pool
 
 try:
     import uvloop
@@ -36,13 +38,15 @@ async def main():
     config = config_from_file("config.yaml")
     while True:
         try:
-            db = await asyncpg.create_pool(**config.pg_credentials)
+            db = await create_pool(**config.pg_credentials)
         except (ConnectionRefusedError, asyncpg.CannotConnectNowError):
             logging.getLogger('run').exception('Cannot connect to Postgres, stalling:')
             await asyncio.sleep(2)
         else:
             break
 
+    await migrate(db)
+
     intents = discord.Intents(
         guilds=True,
         emojis=True,
@@ -68,4 +72,6 @@ async def main():
     await bot.start(config.token)
 
 
-asyncio.run(main())
+# render workers are spawned, and import this module again
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -34,9 +34,18 @@ CREATE TABLE IF NOT EXISTS suggestions (
     council_approved BOOLEAN, -- was the emoji approved by Council?
     forced_reason TEXT, -- reason for Council validation being forced.
     forced_by BIGINT, -- ID of the user who forced this. if not forced, this is NULL.
-    revoked BOOLEAN -- emoji was revoked by submitter
+    revoked BOOLEAN, -- emoji was revoked by submitter
+
+    -- difference hash of the emoji's first frame, to find near duplicates
+    perceptual_hash BIGINT,
+
+    -- SHA-256 of the emoji file in hex, to find exact duplicates
+    file_hash TEXT
 );
 
+CREATE INDEX IF NOT EXISTS suggestions_file_hash ON suggestions (file_hash);
+CREATE INDEX IF NOT EXISTS suggestions_suggestions_message_id ON suggestions (suggestions_message_id);
+
 CREATE TABLE IF NOT EXISTS council_votes (
     -- idx of the suggestion this vote is for
     suggestion_index INT REFERENCES suggestions ON DELETE CASCADE,
@@ -55,3 +64,39 @@ CREATE TABLE IF NOT EXISTS council_votes (
     -- time when this vote was made
     vote_time TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
 );
+
+CREATE TABLE IF NOT EXISTS suggestion_messages (
+    -- id of a message in #suggestions, #council-queue or #approval-queue
+    message_id BIGINT PRIMARY KEY,
+
+    -- idx of the suggestion this message belongs to
+    suggestion_idx INT NOT NULL REFERENCES suggestions ON DELETE CASCADE,
+
+    -- which channel the message is in
+    kind TEXT NOT NULL CHECK (kind IN ('suggestions', 'council', 'public'))
+);
+
+CREATE INDEX IF NOT EXISTS suggestion_messages_suggestion_idx ON suggestion_messages (suggestion_idx);
+
+CREATE TABLE IF NOT EXISTS submission_jobs (
+    -- id of the message in #suggestions to process
+    message_id BIGINT PRIMARY KEY,
+
+    -- channel the message is in
+    channel_id BIGINT NOT NULL,
+
+    -- user that posted the message
+    user_id BIGINT NOT NULL,
+
+    -- time when the message was queued
+    queued_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+
+    -- how often processing the message was started
+    attempts INT NOT NULL DEFAULT 0,
+
+    -- id of the emoji uploaded to a buffer guild for it, if any
+    emoji_id BIGINT,
+
+    -- steps that are done, so that they aren't repeated when the job is resumed
+    done TEXT[] NOT NULL DEFAULT '{}'
+);
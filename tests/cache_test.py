@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from queuebot import queries
+from queuebot.cogs.queue.suggestion import Suggestion, SuggestionCache
+
+
+def make_suggestion(idx, council_message_id=None, public_message_id=None, **kwargs):
+    return Suggestion({
+        'idx': idx,
+        'suggestions_message_id': idx * 10,
+        'council_message_id': council_message_id,
+        'public_message_id': public_message_id,
+        **kwargs,
+    })
+
+
+def test_suggestion_cache():
+    cache = SuggestionCache(max_size=2)
+
+    assert cache.get(1) is None
+    assert cache.misses == 1
+
+    cache.put(make_suggestion(1, council_message_id=11))
+    assert cache.get(1).idx == 1
+    assert cache.get_by_message(10).idx == 1
+    assert cache.get_by_message(11).idx == 1
+    assert cache.hits == 3
+
+    # moving a suggestion to the public queue forgets about the council message
+    cache.put(make_suggestion(1, public_message_id=12, upvotes=0))
+    assert cache.get_by_message(11) is None
+    assert cache.get_by_message(12).upvotes == 0
+
+    cache.put(make_suggestion(2))
+    cache.get(1)  # 1 is now the most recently used
+    cache.put(make_suggestion(3))
+
+    assert 2 not in cache
+    assert cache.get_by_message(20) is None
+    assert 1 in cache and 3 in cache
+    assert cache.evictions == 1
+
+    cache.discard(1)
+    assert cache.get_by_message(12) is None
+    assert len(cache) == 1
+
+    # changes to suggestions don't leak into the cache
+    suggestion = cache.get(3)
+    suggestion.upvotes = 100
+    assert cache.get(3).upvotes is None
+
+
+def test_missing_messages():
+    cache = SuggestionCache(max_missing=2)
+
+    cache.mark_missing(10)
+    assert cache.is_missing(10)
+    assert cache.missing_hits == 1
+
+    # creating a suggestion for a message clears it
+    cache.put(make_suggestion(1))
+    assert not cache.is_missing(10)
+
+    # suggestions that were created while being looked up aren't marked as missing
+    cache.mark_missing(10)
+    assert not cache.is_missing(10)
+
+    for message_id in (100, 200, 300):
+        cache.mark_missing(message_id)
+
+    assert not cache.is_missing(100)
+    assert cache.is_missing(200) and cache.is_missing(300)
+
+
+async def batch_lookup(db, suggestion_record):
+    Suggestion.cache.put(make_suggestion(1, council_approved=True))
+
+    db.on(queries.GET_SUGGESTIONS, lambda indexes: [
+        suggestion_record(idx=2, council_approved=False, revoked=True),
+        suggestion_record(idx=3, council_approved=False),
+    ])
+
+    suggestions = await Suggestion.get_many([1, 2, 3, 4])
+
+    # only the suggestions which aren't cached are fetched, in one query
+    assert db.called(queries.GET_SUGGESTIONS) == [([2, 3, 4],)]
+    assert [suggestions[idx].outcome for idx in sorted(suggestions)] == ['approved', 'revoked', 'denied']
+    assert Suggestion.cache.get(2).revoked
+
+
+def test_batch_lookup(db, suggestion_record, monkeypatch):
+    monkeypatch.setattr(Suggestion, 'db', db)
+    monkeypatch.setattr(Suggestion, 'cache', SuggestionCache())
+
+    # init_test relies on there being a current event loop, which asyncio.run would unset
+    loop = asyncio.new_event_loop()
+
+    try:
+        loop.run_until_complete(batch_lookup(db, suggestion_record))
+    finally:
+        loop.close()
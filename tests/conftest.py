@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import inspect
+
+import pytest
+
+from queuebot import queries
+
+
+class FakeDatabase:
+    """
+    Stands in for the connection pool (and the connections acquired from it) in tests.
+
+    A statement is answered by the handler set for it with :meth:`on`, which is called with the arguments of the
+    statement and may be a coroutine function. Statements without a handler return nothing. Every statement which is run
+    is recorded by name in ``calls``, and fails with :class:`ConnectionError` while ``fail`` is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+        self._handlers = {}
+        self._names = {statement.query: name for name, statement in queries.STATEMENTS.items()}
+
+    def on(self, statement: queries.Statement, handler):
+        self._handlers[statement.query] = handler
+
+    def called(self, statement: queries.Statement):
+        """The arguments of every run of a statement."""
+        return [args for name, args in self.calls if name == statement.name]
+
+    async def _run(self, query, args, default):
+        if self.fail:
+            raise ConnectionError
+
+        self.calls.append((self._names[query], args))
+
+        handler = self._handlers.get(query)
+        if handler is None:
+            return default
+
+        result = handler(*args)
+        return await result if inspect.isawaitable(result) else result
+
+    async def fetch(self, query, *args):
+        return await self._run(query, args, [])
+
+    async def fetchrow(self, query, *args):
+        return await self._run(query, args, None)
+
+    async def fetchval(self, query, *args):
+        return await self._run(query, args, None)
+
+    async def execute(self, query, *args):
+        return await self._run(query, args, 'UPDATE 0')
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def suggestion_record():
+    """Makes suggestion records, with every column missing from ``values`` set to None."""
+
+    def make(**values):
+        return {**dict.fromkeys(queries.COLUMNS), **values}
+
+    return make
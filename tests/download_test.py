@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from queuebot.cogs.queue.download import DownloadTooLarge, download
+
+DATA = bytes(range(256)) * 256
+
+
+async def stream(request):
+    # no Content-Length, so the limit has to be enforced while reading
+    response = web.StreamResponse()
+    await response.prepare(request)
+
+    for offset in range(0, len(DATA), 4096):
+        await response.write(DATA[offset:offset + 4096])
+
+    return response
+
+
+async def sized(request):
+    return web.Response(body=DATA)
+
+
+async def downloading():
+    app = web.Application()
+    app.router.add_get('/stream', stream)
+    app.router.add_get('/sized', sized)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+
+    url = f'http://127.0.0.1:{runner.addresses[0][1]}'
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            for path in ('/stream', '/sized'):
+                data, sha256 = await download(session, url + path, limit=None)
+                assert data == DATA
+                assert sha256 == hashlib.sha256(DATA).hexdigest()
+
+                with pytest.raises(DownloadTooLarge):
+                    await download(session, url + path, limit=len(DATA) - 1)
+    finally:
+        await runner.cleanup()
+
+
+def test_download():
+    # init_test relies on there being a current event loop, which asyncio.run would unset
+    loop = asyncio.new_event_loop()
+
+    try:
+        loop.run_until_complete(downloading())
+    finally:
+        loop.close()
@@ -2,14 +2,15 @@
 
 import asyncio
 import datetime
+import hashlib
 
 import aiohttp
-import asyncpg
 import discord
 from discord import raw_models
 
 from queuebot.bot import Queuebot
 from queuebot.config import config_from_file
+from queuebot.queries import create_pool
 
 try:
     import uvloop
@@ -25,7 +26,7 @@ async def main():
     assert config.get("pg_credentials")
     assert config.get("pg_credentials") == config.pg_credentials
 
-    db = await asyncpg.create_pool(**config.pg_credentials)
+    db = await create_pool(**config.pg_credentials)
 
     intents = discord.Intents(
         guilds=True,
@@ -78,34 +79,69 @@ async def main():
 
     idx = record["idx"]
     assert idx
-    from queuebot.cogs.queue.suggestion import Suggestion
 
-    suggestion = await Suggestion.get_from_id(idx)
-
-    assert repr(suggestion) == \
-        f"<Suggestion idx={idx} user_id=122122926760656896 upvotes=0 downvotes=0>"
-
-    queuecog = bot.get_cog("BlobQueue")
+    try:
+        await bot.db.execute(
+            """
+            INSERT INTO suggestion_messages (message_id, suggestion_idx, kind)
+            VALUES ($1, $2, 'council')
+            ON CONFLICT (message_id) DO UPDATE SET suggestion_idx = EXCLUDED.suggestion_idx
+            """,
+            294924538062569492,
+            idx
+        )
+        from queuebot.cogs.queue.suggestion import Suggestion
 
-    approve_name, approve_id = config.approve_emoji.split(':')
-    event = raw_models.RawReactionActionEvent(
-        {
-            'message_id': 294924538062569492,
-            'channel_id': config.council_queue,
-            'user_id': 69198249432449024,
-        },
-        discord.PartialEmoji(animated=False, name=approve_name, id=int(approve_id)),
-        'REACTION_ADD',
-    )
+        suggestion = await Suggestion.get_from_id(idx)
 
-    await queuecog.on_raw_reaction_add(event)
+        assert repr(suggestion) == \
+            f"<Suggestion idx={idx} user_id=122122926760656896 upvotes=0 downvotes=0>"
 
-    await suggestion.update_inplace()
+        queuecog = bot.get_cog("BlobQueue")
 
-    assert repr(suggestion) == \
-        f"<Suggestion idx={idx} user_id=122122926760656896 upvotes=1 downvotes=0>"
+        approve_name, approve_id = config.approve_emoji.split(':')
+        event = raw_models.RawReactionActionEvent(
+            {
+                'message_id': 294924538062569492,
+                'channel_id': config.council_queue,
+                'user_id': 69198249432449024,
+            },
+            discord.PartialEmoji(animated=False, name=approve_name, id=int(approve_id)),
+            'REACTION_ADD',
+        )
 
-    await bot.close()
+        await queuecog.on_raw_reaction_add(event)
+
+        await suggestion.update_inplace()
+
+        assert repr(suggestion) == \
+            f"<Suggestion idx={idx} user_id=122122926760656896 upvotes=1 downvotes=0>"
+
+        # only one of two suggestions of the same file that are created at once is created
+        file_hash = hashlib.sha256(b'blobsmile').hexdigest()
+        results = await asyncio.gather(*[
+            Suggestion.create(
+                user_id=122122926760656896,
+                emoji_id=396521731440771086 + n,
+                emoji_name="blobsmile",
+                submission_time=datetime.datetime.utcnow(),
+                suggestions_message_id=312640412474933249 + n,
+                emoji_animated=False,
+                file_hash=file_hash,
+            )
+            for n in range(2)
+        ], return_exceptions=True)
+
+        created = [result for result in results if isinstance(result, Suggestion)]
+        duplicates = [result for result in results if isinstance(result, Suggestion.Duplicate)]
+        assert len(created) == len(duplicates) == 1
+        assert duplicates[0].suggestion.idx == created[0].idx
+    finally:
+        # the suggestions' messages and votes go with them
+        await bot.db.execute(
+            "DELETE FROM suggestions WHERE idx = $1 OR file_hash = $2", idx, hashlib.sha256(b'blobsmile').hexdigest()
+        )
+        await bot.close()
 
 
 def test_virtual_queue():
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from queuebot.utils import KeyedLock
+
+
+async def keyed_lock():
+    locks = KeyedLock()
+    order = []
+
+    async def worker(key, label, delay):
+        async with locks(key):
+            order.append(f'{label} start')
+            await asyncio.sleep(delay)
+            order.append(f'{label} end')
+
+    await asyncio.gather(
+        worker(1, 'a', 0.02),
+        worker(1, 'b', 0),
+        worker(2, 'c', 0.01),
+    )
+
+    # 'c' runs concurrently with 'a', 'b' waits for 'a' to finish
+    assert order.index('c start') < order.index('a end')
+    assert order.index('a end') < order.index('b start')
+
+    # locks are reclaimed once they are unused
+    assert len(locks) == 0
+    assert 1 not in locks
+
+    assert locks.acquisitions == 3
+    assert locks.contentions == 1
+    assert locks.max_wait > 0
+    assert locks.peak_keys == 2
+
+
+async def keyed_lock_error():
+    locks = KeyedLock()
+
+    try:
+        async with locks('key'):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert not locks.locked('key')
+    assert len(locks) == 0
+
+
+def test_keyed_lock():
+    asyncio.run(keyed_lock())
+    asyncio.run(keyed_lock_error())
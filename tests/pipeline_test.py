@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from queuebot.cogs.queue.pipeline import Pipeline
+
+
+async def pipeline():
+    order = []
+    release = asyncio.Event()
+
+    async def step(label, *results):
+        order.append((label, results))
+        return label
+
+    async def slow(label):
+        await release.wait()
+        order.append((label, ()))
+        return label
+
+    async def fail():
+        raise RuntimeError('no permission')
+
+    pipeline = Pipeline()
+    pipeline.add('send', slow, 'message')
+    pipeline.add('react', step, 'reaction', after=['send'])
+    pipeline.add('log', step, 'log')
+    pipeline.add('dm', fail)
+    pipeline.add('after dm', step, 'skipped', after=['dm'])
+
+    # independent steps don't wait for the slow one
+    await asyncio.sleep(0)
+    assert order == [('log', ())]
+
+    release.set()
+    failures = await pipeline.wait()
+
+    assert order == [('log', ()), ('message', ()), ('reaction', ('message',))]
+    assert list(failures) == ['dm']
+    assert isinstance(failures['dm'], RuntimeError)
+
+
+def test_pipeline():
+    asyncio.run(pipeline())
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+
+from queuebot.cogs.queue.preview_cache import PreviewCache
+from queuebot.cogs.queue.render import Preview
+
+
+def preview(size: int) -> Preview:
+    return Preview(b'x' * size, 'png', 128, 128, 'PNG')
+
+
+async def memory_tier():
+    cache = PreviewCache(max_memory=250)
+
+    await cache.put('a', preview(100), source='https://example.com/a.png')
+    await cache.put('b', preview(100))
+    assert await cache.get('a') == preview(100)
+
+    # 'b' is the least recently used
+    await cache.put('c', preview(100))
+    assert await cache.get('b') is None
+    assert cache.evictions == 1
+
+    assert await cache.get_by_source('https://example.com/a.png') == preview(100)
+    assert await cache.get_by_source('https://example.com/b.png') is None
+
+
+async def disk_tier(directory):
+    cache = PreviewCache(max_memory=100, directory=directory, max_disk=250)
+
+    await cache.put('a', preview(100))
+    await cache.put('b', preview(100))
+    await cache.put('c', preview(100))
+
+    # 'a' was evicted from disk, 'b' from memory only
+    assert await cache.get('a') is None
+    assert await cache.get('b') == preview(100)
+    assert cache.disk_hits == 1
+
+    # previews survive a restart
+    cache = PreviewCache(max_memory=100, directory=directory)
+    assert await cache.get('c') == preview(100)
+    assert cache.disk_size == 200
+
+    # previews too large for memory which are put at once are only written once
+    await asyncio.gather(cache.put('d', preview(200)), cache.put('d', preview(200)))
+    assert cache.disk_size == 400
+    assert len(os.listdir(directory)) == 3
+
+    # the least recently used previews are deleted when the cache is smaller after a restart
+    cache = PreviewCache(directory=directory, max_disk=250)
+    assert cache.disk_size == 200
+    assert os.listdir(directory) == ['d.128x128.PNG.png']
+
+
+async def concurrent_misses(directory):
+    cache = PreviewCache(directory=directory)
+    renders = []
+
+    async def render():
+        renders.append(None)
+        await asyncio.sleep(0.01)
+        return preview(100)
+
+    # misses of a preview which is being rendered wait for that render
+    previews = await asyncio.gather(
+        cache.get_or_render('a', render), cache.get_or_render('a', render, source='https://example.com/a.png')
+    )
+    assert previews == [preview(100), preview(100)]
+    assert len(renders) == 1
+    assert os.listdir(directory) == ['a.128x128.PNG.png']
+    assert await cache.get_by_source('https://example.com/a.png') == preview(100)
+
+    async def fail():
+        renders.append(None)
+        await asyncio.sleep(0.01)
+        raise OSError
+
+    # a failed render fails everyone waiting for it, and is tried again by the next miss
+    results = await asyncio.gather(cache.get_or_render('b', fail), cache.get_or_render('b', fail),
+                                   return_exceptions=True)
+    assert all(isinstance(result, OSError) for result in results)
+    assert await cache.get_or_render('b', render) == preview(100)
+    assert len(renders) == 3
+
+
+def test_preview_cache(tmp_path):
+    asyncio.run(memory_tier())
+    asyncio.run(disk_tier(str(tmp_path / 'disk')))
+    asyncio.run(concurrent_misses(str(tmp_path / 'concurrent')))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from queuebot.cogs.queue.probe import MAX_EMOJI_SIZE, ProbeError, probe
+
+
+def encode(*frames: Image.Image, format: str) -> bytes:
+    buffer = BytesIO()
+    frames[0].save(buffer, format, save_all=len(frames) > 1, append_images=frames[1:], duration=50)
+    return buffer.getvalue()
+
+
+def test_probe():
+    static = probe(encode(Image.new('RGBA', (128, 96)), format='png'))
+    assert static == ('PNG', 128, 96, 1)
+    assert not static.animated
+
+    animated = probe(encode(Image.new('RGB', (64, 64), 'red'), Image.new('RGB', (64, 64), 'blue'), format='gif'))
+    assert animated == ('GIF', 64, 64, 2)
+    assert animated.animated
+
+
+def test_probe_rejects():
+    with pytest.raises(ProbeError):
+        probe(b'not an image')
+
+    with pytest.raises(ProbeError):
+        probe(encode(Image.new('RGB', (64, 64)), format='bmp'))
+
+    with pytest.raises(ProbeError):
+        probe(b'\0' * (MAX_EMOJI_SIZE + 1))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from types import SimpleNamespace
+
+from queuebot import queries
+from queuebot.cogs.queue.reconciliation import VoteReconciler
+from queuebot.cogs.queue.suggestion import Suggestion
+from queuebot.cogs.queue.votes import VoteBuffer
+from queuebot.utils import KeyedLock
+
+BOT_ID = 1
+APPROVE_ID = 2
+DENY_ID = 3
+APPROVAL_QUEUE = 4
+MESSAGE_ID = 5
+IDX = 6
+
+
+class FakeReaction:
+    def __init__(self, channel):
+        self.channel = channel
+        self.emoji = SimpleNamespace(id=APPROVE_ID)
+
+    async def users(self, limit):
+        await self.channel.on_fetch()
+
+        for user_id in [BOT_ID, *self.channel.voters]:
+            yield SimpleNamespace(id=user_id)
+
+        await self.channel.on_fetched()
+
+
+async def nothing():
+    pass
+
+
+class FakeChannel:
+    def __init__(self, voters):
+        self.voters = set(voters)
+
+        # called after the message was read, and before and after its reactions are fetched
+        self.on_read = self.on_fetch = self.on_fetched = nothing
+
+    async def history(self, limit):
+        yield SimpleNamespace(id=MESSAGE_ID, author=SimpleNamespace(id=BOT_ID), reactions=[FakeReaction(self)])
+        await self.on_read()
+
+
+class Reconciliation:
+    """An approval queue message with two voters, whose votes are only tallied in the database so far."""
+
+    def __init__(self, db, suggestion_record):
+        self.tally = suggestion_record(idx=IDX, upvotes=2, downvotes=0)
+        self.locks = KeyedLock()
+        self.buffer = VoteBuffer(db, delay=60)
+        self.channel = FakeChannel({10, 11})
+
+        bot = SimpleNamespace(
+            db=db,
+            user=SimpleNamespace(id=BOT_ID),
+            config=SimpleNamespace(
+                council_queue=None, approval_queue=APPROVAL_QUEUE, approve_emoji_id=APPROVE_ID, deny_emoji_id=DENY_ID,
+            ),
+            get_channel=lambda channel_id: self.channel if channel_id == APPROVAL_QUEUE else None,
+        )
+        self.reconciler = VoteReconciler(bot, locks=self.locks, buffer=self.buffer)
+
+        db.on(queries.GET_QUEUE_MESSAGES, self.queue_messages)
+        db.on(queries.FLUSH_VOTES, self.flush_votes)
+        db.on(queries.SET_TALLIES, self.set_tallies)
+
+    def queue_messages(self, message_ids):
+        return [{'message_id': MESSAGE_ID, 'kind': 'public', **self.tally}]
+
+    def flush_votes(self, indexes, upvotes, downvotes):
+        self.tally['upvotes'] += upvotes[0]
+        return []
+
+    def set_tallies(self, indexes, upvotes, downvotes):
+        self.tally['upvotes'] = upvotes[0]
+        return []
+
+    async def react(self, user_id, vote_type=Suggestion.VoteType.CAST):
+        """A live vote, as processed by the cog once Discord has the reaction."""
+        if vote_type is Suggestion.VoteType.CAST:
+            self.channel.voters.add(user_id)
+        else:
+            self.channel.voters.discard(user_id)
+
+        async with self.locks(IDX):
+            if not self.reconciler.counted(IDX, user_id, True, vote_type):
+                self.buffer.add(IDX, True, vote_type.delta)
+
+    async def run(self):
+        report = await self.reconciler.run()
+        await self.buffer.close()
+        return report
+
+
+async def vote_before_counting(db, suggestion_record):
+    reconciliation = Reconciliation(db, suggestion_record)
+
+    # after the page of history was read, but before the votes are counted
+    reconciliation.channel.on_read = lambda: reconciliation.react(12)
+
+    await reconciliation.run()
+    assert reconciliation.tally['upvotes'] == 3
+
+
+async def vote_while_counting(db, suggestion_record):
+    reconciliation = Reconciliation(db, suggestion_record)
+    events = []
+
+    async def on_fetch():
+        # Discord has these reactions by the time their users are fetched, but their events are only processed once
+        # the votes of the suggestion have been written
+        events.append(asyncio.ensure_future(reconciliation.react(12)))
+        events.append(asyncio.ensure_future(reconciliation.react(10, Suggestion.VoteType.REVOKE)))
+        await asyncio.sleep(0)
+
+    async def on_fetched():
+        # this one comes too late to be counted
+        events.append(asyncio.ensure_future(reconciliation.react(13)))
+        await asyncio.sleep(0)
+
+    reconciliation.channel.on_fetch = on_fetch
+    reconciliation.channel.on_fetched = on_fetched
+
+    report = await reconciliation.run()
+    assert all(event.done() for event in events)
+
+    # 11, 12 and 13 have voted, and only the vote of 13 is applied on top of what was counted
+    assert reconciliation.channel.voters == {11, 12, 13}
+    assert reconciliation.tally['upvotes'] == 3
+    assert report.already_counted == 2
+
+    # once the waiting votes are processed, votes aren't checked against what was counted anymore
+    assert not reconciliation.reconciler.counted(IDX, 11, True, Suggestion.VoteType.CAST)
+
+
+def test_reconciliation_keeps_live_votes(db, suggestion_record):
+    asyncio.run(vote_before_counting(db, suggestion_record))
+
+
+def test_reconciliation_ignores_counted_votes(db, suggestion_record):
+    asyncio.run(vote_while_counting(db, suggestion_record))
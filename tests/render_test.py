@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageChops
+
+from queuebot.cogs.queue.render import (OUTPUT_SIZE, composite_frame, composite_frames, normalize_frame, render_frames,
+                                        render_test_image, sample_frames)
+
+
+def encode(*frames: Image.Image, format: str) -> Image.Image:
+    buffer = BytesIO()
+    frames[0].save(buffer, format, save_all=True, append_images=frames[1:], duration=50, loop=0)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def test_render_static():
+    emoji = encode(Image.new('RGBA', (128, 96), (255, 0, 0, 255)), format='png')
+
+    buffer, extension = render_test_image(emoji)
+    assert extension == 'png'
+
+    with Image.open(buffer) as rendered:
+        assert rendered.size == OUTPUT_SIZE
+
+
+def test_render_animated():
+    emoji = encode(
+        Image.new('RGBA', (128, 128), (255, 0, 0, 255)),
+        Image.new('RGBA', (128, 128), (0, 0, 255, 255)),
+        format='gif',
+    )
+
+    buffer, extension = render_test_image(emoji)
+    assert extension == 'gif'
+
+    with Image.open(buffer) as rendered:
+        assert rendered.size == OUTPUT_SIZE
+        assert rendered.n_frames == 2
+
+
+def test_duplicate_frames():
+    red = Image.new('RGBA', (128, 128), (255, 0, 0, 255))
+    blue = Image.new('RGBA', (128, 128), (0, 0, 255, 255))
+
+    # GIF encoders merge identical frames, so write each frame with a different duration
+    buffer = BytesIO()
+    red.save(buffer, 'gif', save_all=True, append_images=[red, blue, red], duration=[50, 60, 70, 80], loop=0)
+    buffer.seek(0)
+
+    frames, durations = render_frames(Image.open(buffer))
+
+    assert durations == [110, 70, 80]
+    assert frames[0] is frames[2]
+
+
+def test_sample_frames():
+    assert sample_frames([10, 20, 30], budget=3) == [(0, 10), (1, 20), (2, 30)]
+
+    # resampled by time, the long frame is shown for longer
+    assert sample_frames([10, 10, 30, 10], budget=3) == [(0, 20), (2, 20), (2, 20)]
+
+    # without durations, frames are sampled evenly
+    assert sample_frames([0] * 10, budget=5) == [(0, 0), (2, 0), (4, 0), (6, 0), (8, 0)]
+
+
+def test_composite_frames():
+    numpy = pytest.importorskip('numpy')
+
+    boundings = [
+        normalize_frame(Image.new('RGBA', (128, 96), (255, 0, 0, 255))),
+        normalize_frame(Image.new('RGBA', (64, 64), (0, 0, 255, 128))),
+    ]
+
+    for vectorized, bounding in zip(composite_frames(boundings), boundings):
+        expected = numpy.asarray(composite_frame(bounding), dtype=numpy.int16)
+        assert numpy.abs(numpy.asarray(vectorized, dtype=numpy.int16) - expected).max() <= 2
+
+
+def test_shared_palette():
+    frames = []
+    for offset in range(0, 40, 10):
+        frame = Image.new('RGBA', (128, 128), (0, 0, 0, 0))
+        frame.paste((255, offset * 5, 0, 255), (offset, offset, offset + 48, offset + 48))
+        frames.append(frame)
+
+    emoji = encode(*frames, format='gif')
+    rendered, _ = render_frames(emoji)
+    assert len({tuple(frame.getpalette()) for frame in rendered}) == 1
+
+    emoji.seek(0)
+    buffer, _ = render_test_image(emoji)
+
+    # unchanged pixels are transparent in the GIF, but the decoded frames are the same as the rendered ones
+    with Image.open(buffer) as decoded:
+        for index, frame in enumerate(rendered):
+            decoded.seek(index)
+            assert ImageChops.difference(decoded.convert('RGB'), frame.convert('RGB')).getbbox() is None
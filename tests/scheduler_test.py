@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from queuebot.cogs.queue.scheduler import Priority, QueueFull, RenderScheduler
+
+
+async def scheduling():
+    scheduler = RenderScheduler(concurrency=1, max_queued=2)
+    order = []
+    positions = {}
+    release = asyncio.Event()
+
+    async def render(label, priority):
+        async def on_queued(position):
+            positions[label] = position
+
+        async with scheduler(priority, on_queued=on_queued):
+            order.append(label)
+            await release.wait()
+
+    running = asyncio.ensure_future(render('first', Priority.TEST))
+    await asyncio.sleep(0)
+
+    tests = [asyncio.ensure_future(render(label, Priority.TEST)) for label in ('a', 'b')]
+    await asyncio.sleep(0)
+
+    # the queue is full for tests, but submissions still go first
+    with pytest.raises(QueueFull):
+        await render('c', Priority.TEST)
+
+    submission = asyncio.ensure_future(render('submission', Priority.SUBMISSION))
+    await asyncio.sleep(0)
+
+    assert positions == {'a': 1, 'b': 2, 'submission': 1}
+
+    release.set()
+    await asyncio.gather(running, submission, *tests)
+
+    assert order == ['first', 'submission', 'a', 'b']
+    assert scheduler.running == 0
+    assert scheduler.rejected == 1
+    assert scheduler.wait_times.count == scheduler.run_times.count == 4
+
+
+async def cancellation():
+    scheduler = RenderScheduler(concurrency=1)
+
+    async with scheduler(Priority.TEST):
+        waiter = asyncio.ensure_future(scheduler(Priority.TEST).__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+
+    assert scheduler.waiting == 0
+    assert scheduler.running == 0
+
+
+async def failed_notification():
+    scheduler = RenderScheduler(concurrency=1)
+    rendered = []
+
+    async def on_queued(position):
+        raise ConnectionError
+
+    async def render():
+        async with scheduler(Priority.TEST, on_queued=on_queued):
+            rendered.append(True)
+
+    async with scheduler(Priority.TEST):
+        waiter = asyncio.ensure_future(render())
+        await asyncio.sleep(0)
+
+    # the render goes ahead without the notification
+    await waiter
+    assert rendered == [True]
+    assert scheduler.running == 0
+
+
+def test_scheduler():
+    asyncio.run(scheduling())
+    asyncio.run(cancellation())
+    asyncio.run(failed_notification())
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import random
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from queuebot.cogs.queue.similarity import SimilarityIndex, dhash, to_column
+from queuebot.utils import BKTree, hamming_distance
+
+
+def blob(color, *, dot: bool = False) -> bytes:
+    image = Image.new('RGBA', (128, 128), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((8, 16, 120, 120), fill=color)
+
+    if dot:
+        draw.ellipse((40, 50, 50, 60), fill=(0, 0, 0, 255))
+
+    buffer = BytesIO()
+    image.save(buffer, 'png')
+    return buffer.getvalue()
+
+
+def test_bk_tree():
+    rng = random.Random(0)
+    keys = [rng.getrandbits(64) for _ in range(500)]
+
+    tree = BKTree()
+    for index, key in enumerate(keys):
+        tree.add(key, index)
+
+    query = keys[42] ^ 0b101
+    expected = sorted((hamming_distance(query, key), index) for index, key in enumerate(keys)
+                      if hamming_distance(query, key) <= 12)
+
+    assert sorted(tree.search(query, 12)) == expected
+    assert tree.search(query, 12)[0] == (2, 42)
+
+
+def test_similarity_index():
+    original = dhash(blob((250, 200, 40, 255)))
+    edited = dhash(blob((250, 200, 40, 255), dot=True))
+
+    index = SimilarityIndex(max_distance=10)
+    index.add(1, to_column(original))
+
+    assert [suggestion for _, suggestion in index.search(edited)] == [1]
+    assert index.search(original ^ (1 << 64) - 1) == []
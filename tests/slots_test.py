@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+from queuebot.cogs.queue.slots import EmojiSlotAllocator
+
+BOT_ID = 1
+ids = itertools.count(100)
+
+
+def guild(owner_id=BOT_ID, static=0, animated=0):
+    emojis = [SimpleNamespace(id=next(ids), animated=False) for _ in range(static)]
+    emojis += [SimpleNamespace(id=next(ids), animated=True) for _ in range(animated)]
+    return SimpleNamespace(id=next(ids), owner_id=owner_id, emojis=emojis, emoji_limit=50)
+
+
+class FakeBot:
+    def __init__(self, guilds):
+        self.user = SimpleNamespace(id=BOT_ID)
+        self.guilds = guilds
+        self.created = []
+
+    async def create_guild(self, *, name):
+        await asyncio.sleep(0)
+        created = guild()
+        self.created.append(created)
+        return created
+
+
+async def allocation():
+    full, almost_full, other = guild(static=50, animated=10), guild(static=49), guild(owner_id=2)
+    bot = FakeBot([full, almost_full, other])
+    slots = EmojiSlotAllocator(bot)
+
+    assert slots.find(False) is almost_full
+    assert slots.find(True) is full
+
+    # only one of two concurrent uploads gets the last static slot
+    first, second = await asyncio.gather(slots.reserve(animated=False), slots.reserve(animated=False))
+    assert first.guild is almost_full
+    assert second.guild is bot.created[0]
+
+    # the new guild is used by later uploads rather than creating another one
+    third = await slots.reserve(animated=False)
+    assert third.guild is bot.created[0] and len(bot.created) == 1
+
+    with first:
+        emoji = SimpleNamespace(id=next(ids), animated=False, guild_id=almost_full.id)
+        slots.created(emoji)
+
+    # seeing the emoji in an update doesn't count it twice
+    slots.update(almost_full, almost_full.emojis + [emoji])
+    slots.created(emoji)
+    assert slots.used(almost_full.id, False) == 50
+    assert slots.find(False) is bot.created[0]
+
+    slots.deleted(emoji)
+    slots.deleted(emoji)
+    assert slots.used(almost_full.id, False) == 49
+    assert slots.free_slots(False) == 1 + 48
+
+    second.release()
+    third.release()
+    assert slots.used(bot.created[0].id, False) == 0
+
+
+def test_slot_allocator():
+    asyncio.run(allocation())
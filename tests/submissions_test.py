@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime
+import hashlib
+import io
+import itertools
+from types import SimpleNamespace
+
+from PIL import Image
+
+import queuebot.cogs.queue
+from queuebot import queries
+from queuebot.cogs.queue import BlobQueue
+from queuebot.cogs.queue.download import Download
+from queuebot.cogs.queue.submissions import SubmissionQueue
+from queuebot.config import Config
+
+BOT_ID = 1
+
+
+class FakeJobs:
+    """The submission_jobs table."""
+
+    def __init__(self, db):
+        self.jobs = {}
+
+        db.on(queries.QUEUE_SUBMISSION, self.add)
+        db.on(queries.SUBMISSION_JOBS, lambda: list(self.jobs.values()))
+        db.on(queries.START_SUBMISSION, self.start)
+        db.on(queries.SET_SUBMISSION_EMOJI, lambda message_id, emoji_id: self.set(message_id, 'emoji_id', emoji_id))
+        db.on(queries.SUBMISSION_STEP_DONE, lambda message_id, step: self.jobs[message_id]['done'].append(step))
+        db.on(queries.FINISH_SUBMISSION, lambda message_id: self.jobs.pop(message_id))
+
+    def add(self, message_id, channel_id, user_id):
+        if message_id in self.jobs:
+            return None
+
+        record = self.jobs[message_id] = {
+            'message_id': message_id, 'channel_id': channel_id, 'user_id': user_id, 'attempts': 0,
+            'emoji_id': None, 'done': [],
+        }
+        return record
+
+    def start(self, message_id):
+        self.jobs[message_id]['attempts'] += 1
+        return self.jobs[message_id]['attempts']
+
+    def set(self, message_id, column, value):
+        self.jobs[message_id][column] = value
+
+
+def message(message_id, user_id):
+    return SimpleNamespace(id=message_id, channel=SimpleNamespace(id=1), author=SimpleNamespace(id=user_id))
+
+
+async def fairness(db):
+    jobs = FakeJobs(db)
+    order = []
+    failed = set()
+
+    async def handler(job):
+        order.append(job.message_id)
+        await asyncio.sleep(0)
+
+        if job.message_id == 6 and job.message_id not in failed:
+            failed.add(job.message_id)
+            raise RuntimeError
+
+    queue = SubmissionQueue(db, handler, workers=1, retry_delay=0.01)
+
+    # a burst from one user doesn't hold up the others
+    for message_id, user_id in [(1, 10), (2, 10), (3, 10), (4, 20), (5, 30), (6, 20)]:
+        assert await queue.put(message(message_id, user_id))
+
+    assert not await queue.put(message(1, 10))
+    assert queue.depth == 6
+
+    await queue.start()
+
+    for _ in range(100):
+        if queue.processed == 6:
+            break
+
+        await asyncio.sleep(0.01)
+
+    await queue.close()
+
+    assert order == [1, 4, 5, 2, 6, 3, 6]
+    assert queue.failures == 1
+    assert not jobs.jobs
+
+
+async def resuming(db):
+    jobs = FakeJobs(db)
+    jobs.add(1, 1, 10)
+    jobs.add(2, 1, 10)
+    jobs.jobs[2]['attempts'] = 3
+
+    processed = []
+
+    async def handler(job):
+        processed.append(job.message_id)
+
+    queue = SubmissionQueue(db, handler, workers=2, max_attempts=3)
+    await queue.start()
+    await asyncio.sleep(0.01)
+    await queue.close()
+
+    # jobs which were tried too often are given up on
+    assert processed == [1]
+    assert queue.resumed == 1 and queue.dropped == 1
+    assert not jobs.jobs
+
+
+def test_submission_queue(db):
+    asyncio.run(fairness(db))
+    asyncio.run(resuming(db))
+
+
+class FakeChannel:
+    def __init__(self, channel_id, *, failures=0):
+        self.id = channel_id
+        self.sent = []
+        self.failures = failures
+
+    async def send(self, content=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise asyncio.TimeoutError
+
+        sent = FakeMessage(len(self.sent) + 100, self, content)
+        self.sent.append(sent)
+        return sent
+
+    async def fetch_message(self, message_id):
+        return next(sent for sent in self.sent if sent.id == message_id)
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel, content, *, author=None, attachments=()):
+        self.id = message_id
+        self.channel = channel
+        self.content = content
+        self.author = author
+        self.attachments = list(attachments)
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        if emoji not in self.reactions:
+            self.reactions.append(emoji)
+
+
+async def retrying(db, suggestion_record, monkeypatch):
+    config = Config({})
+    ids = itertools.count(1000)
+
+    image = io.BytesIO()
+    Image.new('RGBA', (64, 64), (255, 200, 0, 255)).save(image, 'PNG')
+    data = image.getvalue()
+
+    async def download(session, url):
+        return Download(data, hashlib.sha256(data).hexdigest())
+
+    monkeypatch.setattr(queuebot.cogs.queue, 'download', download)
+
+    # the first message to the council queue times out
+    channels = {
+        config.suggestions_channel: FakeChannel(config.suggestions_channel),
+        config.council_queue: FakeChannel(config.council_queue, failures=1),
+        config.suggestions_log: FakeChannel(config.suggestions_log),
+    }
+
+    emojis = {}
+
+    async def create_custom_emoji(*, name, image, reason):
+        emoji = SimpleNamespace(id=next(ids), name=name, guild_id=guild.id, animated=False)
+        emojis[emoji.id] = emoji
+        return emoji
+
+    guild = SimpleNamespace(
+        id=next(ids), owner_id=BOT_ID, emojis=[], emoji_limit=50, create_custom_emoji=create_custom_emoji
+    )
+
+    async def nothing(*args):
+        pass
+
+    bot = SimpleNamespace(
+        db=db, config=config, session=None, user=SimpleNamespace(id=BOT_ID), guilds=[guild],
+        get_channel=channels.get, get_emoji=lambda emoji_id: emojis.get(emoji_id), log=nothing,
+        wait_until_ready=nothing,
+    )
+
+    # the suggestions table
+    suggestions = {}
+
+    def duplicate(file_hash):
+        return next((record for record in reversed(suggestions.values()) if record['file_hash'] == file_hash), None)
+
+    def create(user_id, emoji_id, emoji_name, submission_time, suggestions_message_id, emoji_animated, note,
+               perceptual_hash, file_hash):
+        idx = len(suggestions) + 1
+        record = suggestions[idx] = suggestion_record(
+            idx=idx, user_id=user_id, emoji_id=emoji_id, emoji_name=emoji_name,
+            suggestions_message_id=suggestions_message_id, emoji_animated=emoji_animated, note=note, upvotes=0,
+            downvotes=0, perceptual_hash=perceptual_hash, file_hash=file_hash,
+        )
+        return record
+
+    def set_council_message(message_id, idx):
+        suggestions[idx]['council_message_id'] = message_id
+        return suggestions[idx]
+
+    db.on(queries.GET_DUPLICATE_SUGGESTION, duplicate)
+    db.on(queries.CREATE_SUGGESTION, create)
+    db.on(queries.SET_COUNCIL_MESSAGE, set_council_message)
+    jobs = FakeJobs(db)
+
+    cog = BlobQueue(bot)
+    cog.submissions.retry_delay = 0.01
+
+    author = SimpleNamespace(id=10, name='submitter', discriminator='0001', mention='<@10>', send=nothing)
+    attachment = SimpleNamespace(filename='blobsmile.png', size=len(data), url='https://example.com/blobsmile.png')
+    suggested = FakeMessage(next(ids), channels[config.suggestions_channel], 'blobsmile', author=author,
+                            attachments=[attachment])
+
+    await cog.submissions.start()
+    await cog.submissions.put(suggested)
+
+    for _ in range(500):
+        if cog.submissions.processed:
+            break
+
+        await asyncio.sleep(0.01)
+
+    await cog.submissions.close()
+
+    # the second attempt picked up where the first one stopped
+    assert cog.submissions.failures == 1 and cog.submissions.processed == 1
+    assert not jobs.jobs
+
+    assert len(suggestions) == 1 and len(emojis) == 1
+    assert len(channels[config.suggestions_log].sent) == 1
+
+    council_message, = channels[config.council_queue].sent
+    assert suggestions[1]['council_message_id'] == council_message.id
+    assert council_message.reactions == [config.approve_emoji, config.deny_emoji]
+
+
+def test_submission_retry(db, suggestion_record, monkeypatch):
+    asyncio.run(retrying(db, suggestion_record, monkeypatch))
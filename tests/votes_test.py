@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from queuebot import queries
+from queuebot.cogs.queue.votes import VoteBuffer
+
+
+async def vote_buffer(db):
+    buffer = VoteBuffer(db, delay=0.01)
+
+    buffer.add(1, True, 1)
+    buffer.add(1, True, 1)
+    buffer.add(1, False, 1)
+    buffer.add(2, True, 1)
+    buffer.add(2, True, -1)  # cancels out
+
+    await asyncio.sleep(0.05)
+
+    assert db.called(queries.FLUSH_VOTES) == [([1], [2], [1])]
+    assert buffer.flushes == 1
+    assert buffer.largest_batch == 1
+    assert len(buffer) == 0
+
+    # votes are kept when writing them fails
+    db.fail = True
+    buffer.add(3, False, 1)
+
+    try:
+        await buffer.flush()
+    except ConnectionError:
+        pass
+
+    assert len(buffer) == 1
+
+    db.fail = False
+    await buffer.close()
+
+    assert db.called(queries.FLUSH_VOTES)[-1] == ([3], [0], [1])
+    assert buffer.votes == 6
+
+
+def test_vote_buffer(db):
+    asyncio.run(vote_buffer(db))